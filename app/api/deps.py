@@ -0,0 +1,19 @@
+"""
+Dépendances FastAPI donnant accès aux services créés au démarrage
+"""
+from fastapi import Request
+from app.services.admission import AdmissionController
+from app.services.ingestion_jobs import IngestionQueue
+from app.services.llm_service import LLMService
+
+
+def get_llm_service(request: Request) -> LLMService:
+    return request.app.state.resources.llm_service
+
+
+def get_admission(request: Request) -> AdmissionController:
+    return request.app.state.resources.admission
+
+
+def get_ingestion_queue(request: Request) -> IngestionQueue:
+    return request.app.state.resources.ingestion_queue
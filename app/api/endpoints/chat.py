@@ -2,15 +2,39 @@
 Routes FastAPI pour le chatbot
 Inclut les endpoints du TP1 et du TP2
 """
+import asyncio
 import json
-from fastapi import APIRouter, File, HTTPException, Body, UploadFile, status
-from app.models.chat import ChatRequest,  ChatResponse, SessionResponse, RenameSessionRequest
+import math
+import os
+from fastapi import APIRouter, Depends, File, HTTPException, Body, Query, Request, UploadFile, status
+from app.core.config import settings
+from app.models.chat import (
+    BatchChatRequest,
+    ChatRequest,
+    ChatResponse,
+    HistoryPage,
+    RenameSessionRequest,
+    SessionPage,
+    SessionResponse,
+)
+from app.models.ingestion import IngestionJobResponse
+from app.services.admission import AdmissionController, AdmissionRejected
 from app.services.llm_service import LLMService
-from typing import Dict, List
+from app.services.ingestion_jobs import IngestionQueue
+from app.services.streaming import sse_stream
+from app.services.vector_collections import DEFAULT_COLLECTION, validate_collection_name
+from app.api.deps import get_admission, get_ingestion_queue, get_llm_service
+from typing import Dict, List, Optional
 from fastapi.responses import StreamingResponse
 
 router = APIRouter()
-llm_service = LLMService()
+
+# Taille des blocs lus lors de l'écriture d'un upload sur disque
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Taille par défaut et maximale des pages de sessions et d'historique
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
 
 
@@ -18,29 +42,142 @@ llm_service = LLMService()
     
 
 @router.post("/chat/rag")
-async def chat_with_rag(request: ChatRequest):
-    """Simplified streaming endpoint"""
+async def chat_with_rag(
+    request: ChatRequest,
+    http_request: Request,
+    llm_service: LLMService = Depends(get_llm_service),
+    admission: AdmissionController = Depends(get_admission)
+):
+    """
+    Réponse en flux Server-Sent Events : événements `sources`, `token`
+    (tokens regroupés en trames), puis `done` ou `error`.
+    Le contexte est cherché dans `collections` (par défaut la collection "default").
+    Quand toutes les places de génération sont prises, des événements `queued`
+    donnent la position dans la file d'attente ; au-delà des limites de débit
+    ou si la file est pleine, la requête est refusée (429 ou 503, avec Retry-After).
+    """
+    try:
+        for name in request.collections or []:
+            validate_collection_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        client_id = http_request.client.host if http_request.client else "unknown"
+        admission.check(request.session_id, client_id)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     return StreamingResponse(
-        llm_service.stream_response(request.message, request.session_id),
-        media_type="text/plain"
+        sse_stream(
+            admission.stream(
+                lambda: llm_service.stream_events(
+                    request.message, request.session_id, request.collections, request.nprobe
+                )
+            ),
+            http_request.is_disconnected,
+            max_chars=settings.stream_frame_max_chars,
+            max_delay=settings.stream_frame_max_delay,
+            queue_size=settings.stream_queue_size
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
+@router.get("/cache/stats")
+async def get_cache_stats(llm_service: LLMService = Depends(get_llm_service)) -> Dict[str, Dict]:
+    """Taux de hits des caches et occupation mémoire des historiques de session"""
+    return await llm_service.get_cache_stats()
+
+
+@router.post("/chat/batch")
+async def chat_batch(
+    request: BatchChatRequest,
+    http_request: Request,
+    llm_service: LLMService = Depends(get_llm_service),
+    admission: AdmissionController = Depends(get_admission)
+):
+    """
+    Réponses à un lot de questions, en NDJSON : une ligne par question, dans
+    l'ordre d'achèvement (`index` donne sa position dans le lot). Avec
+    `dry_run`, seule la recherche est faite (sources sans réponse).
+    Les générations prennent leurs places dans la même file que /chat/rag ;
+    chaque question consomme un jeton de la limite de débit du client (429
+    avec Retry-After, 413 au-delà de RATE_LIMIT_CLIENT_BURST questions).
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="No questions")
+    if len(request.questions) > settings.batch_max_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions (at most {settings.batch_max_questions} per batch)"
+        )
+    try:
+        for name in request.collections or []:
+            validate_collection_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        client_id = http_request.client.host if http_request.client else "unknown"
+        # One rate-limit token per generation; a retrieval-only batch costs one request
+        admission.check(None, client_id, cost=1 if request.dry_run else len(request.questions))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after else None
+        )
+
+    async def lines():
+        results = llm_service.answer_batch(
+            request.questions,
+            collections=request.collections,
+            nprobe=request.nprobe,
+            dry_run=request.dry_run,
+            concurrency=request.concurrency,
+            admission=admission
+        )
+        try:
+            async for result in results:
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+                if await http_request.is_disconnected():
+                    break
+        finally:
+            await results.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/admission/stats")
+async def get_admission_stats(admission: AdmissionController = Depends(get_admission)) -> Dict[str, float]:
+    """Générations en cours, requêtes en attente et limite de concurrence courante"""
+    return admission.stats()
+
+
 ### Sessions endpoints ###
 
     
-@router.get("/sessions")
-async def get_all_sessions() -> List[str]:
+@router.get("/sessions", response_model=SessionPage)
+async def list_sessions(
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    llm_service: LLMService = Depends(get_llm_service)
+):
     """
-    Récupération de toutes les sessions disponibles
+    Sessions de la plus récemment active à la plus ancienne, avec leurs
+    métadonnées ; passer `next_cursor` en `cursor` pour la page suivante
     """
     try:
-        return await llm_service.get_all_sessions()
+        return await llm_service.list_sessions(limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/sessions", response_model=SessionResponse, status_code=status.HTTP_201_CREATED)
-async def create_session():
+async def create_session(llm_service: LLMService = Depends(get_llm_service)):
     """Create a new empty chat session"""
     try:
         session_id = await llm_service.create_session()
@@ -51,7 +188,8 @@ async def create_session():
 @router.put("/sessions/{old_session_id}", response_model=SessionResponse)
 async def rename_session(
     old_session_id: str,
-    request: RenameSessionRequest
+    request: RenameSessionRequest,
+    llm_service: LLMService = Depends(get_llm_service)
 ):
     """Rename an existing session ID"""
     try:
@@ -71,7 +209,7 @@ async def rename_session(
 
 # Add endpoint for session deletion
 @router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_session(session_id: str):
+async def delete_session(session_id: str, llm_service: LLMService = Depends(get_llm_service)):
     """Permanently delete a chat session and its history"""
     try:
         success = await llm_service.delete_session(session_id)
@@ -81,11 +219,21 @@ async def delete_session(session_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/history/{session_id}")
-async def get_history(session_id: str) -> List[Dict[str, str]]:
-    """Récupération de l'historique d'une conversation"""
+@router.get("/history/{session_id}", response_model=HistoryPage)
+async def get_history(
+    session_id: str,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """
+    Derniers messages d'une conversation, en ordre chronologique ; passer
+    `next_cursor` en `cursor` pour les messages précédents
+    """
     try:
-        return await llm_service.get_conversation_history(session_id)
+        return await llm_service.get_history_page(session_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -93,40 +241,108 @@ async def get_history(session_id: str) -> List[Dict[str, str]]:
 ### Documents endpoints ###
 
     
-@router.post("/documents/upload_pdf")
+@router.post(
+    "/documents/upload_pdf",
+    response_model=IngestionJobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
 async def upload_pdf(
     file: UploadFile = File(...),
-    clear_existing: bool = Body(False)
-) -> dict:
+    clear_existing: bool = Body(False),
+    document_id: Optional[str] = Body(None),
+    collection: str = Body(DEFAULT_COLLECTION),
+    ingestion_queue: IngestionQueue = Depends(get_ingestion_queue)
+) -> IngestionJobResponse:
     """
-    Endpoint to upload and index a PDF document.
+    Endpoint to upload a PDF document and queue it for indexing.
 
     Args:
         file: The PDF file to be uploaded and indexed.
-        clear_existing: If True, clears existing vector store before indexing.
+        clear_existing: If True, clears the collection before indexing.
+        document_id: Identifier of the document, defaults to the file hash (two
+            files with the same name are distinct documents). Uploading a new
+            version under the same id only re-indexes changed pages.
+        collection: Name of the collection (tenant or document set) receiving the document.
 
     Returns:
-        Confirmation message upon successful indexing.
+        The id of the background indexing job, to poll on /documents/jobs/{job_id}.
     """
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF files are supported.")
+    try:
+        validate_collection_name(collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
+    file_path = ingestion_queue.new_upload_path()
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Pass the file content to the RAG service
-        await llm_service.rag_service.load_and_index_pdf(file_content, clear_existing)
-        
-        return {"message": "PDF document indexed successfully"}
+        # Copy the upload to disk chunk by chunk, the file I/O off the event loop
+        out = await asyncio.to_thread(open, file_path, "wb")
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(out.write, chunk)
+        finally:
+            await asyncio.to_thread(out.close)
+
+        job = await ingestion_queue.submit(file_path, file.filename, clear_existing, document_id, collection)
+        return IngestionJobResponse(job_id=job.job_id, status=job.status)
+    except Exception as e:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/documents/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, ingestion_queue: IngestionQueue = Depends(get_ingestion_queue)) -> dict:
+    """État d'une tâche d'indexation : pages lues, chunks indexés et débit"""
+    job = await ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.model_dump(exclude={"file_path"})
+
+@router.get("/collections")
+async def list_collections(llm_service: LLMService = Depends(get_llm_service)) -> List[str]:
+    """Liste des collections contenant des documents"""
+    return llm_service.rag_service.list_collections()
+
+@router.get("/documents")
+async def list_documents(
+    collection: str = Query(DEFAULT_COLLECTION),
+    llm_service: LLMService = Depends(get_llm_service)
+) -> List[dict]:
+    """Liste des documents indexés dans une collection"""
+    try:
+        return await llm_service.rag_service.list_documents(collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.delete("/documents/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_document(
+    document_id: str,
+    collection: str = Query(DEFAULT_COLLECTION),
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """Supprime un document et ses chunks sans toucher au reste de l'index"""
+    try:
+        deleted = await llm_service.rag_service.delete_document(document_id, collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document not found")
+
 @router.delete("/documents")
-async def clear_documents() -> dict:
-    """Endpoint pour supprimer tous les documents indexés"""
+async def clear_documents(
+    collection: str = Query(DEFAULT_COLLECTION),
+    llm_service: LLMService = Depends(get_llm_service)
+) -> dict:
+    """Endpoint pour supprimer tous les documents d'une collection"""
     try:
-        llm_service.rag_service.clear()
-        return {"message": "Vector store cleared successfully"}
+        await llm_service.rag_service.clear(collection)
+        return {"message": f"Collection {collection} cleared successfully"}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,15 @@
+"""
+Route d'exposition des métriques au format Prometheus
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import REGISTRY
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Histogrammes des étapes du RAG, compteurs de tokens, de requêtes et de cache, flux actifs"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
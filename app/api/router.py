@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import chat
+from app.api.endpoints import chat, metrics
 
 router = APIRouter()
 
@@ -7,4 +7,6 @@ router.include_router(
     chat.router, 
     prefix="/chat", 
     tags=["chat"]
-)
\ No newline at end of file
+)
+
+router.include_router(metrics.router, tags=["metrics"])
@@ -6,9 +6,152 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class Config:
-    """Classe de configuration pour MongoDB."""
+    """Classe de configuration pour MongoDB et le RAG."""
     mongodb_uri = os.getenv("MONGODB_URI", "")  # Valeur par défaut vide si non définie
     database_name = os.getenv("DATABASE_NAME", "default_db")  # Nom de base par défaut
     collection_name = os.getenv("COLLECTION_NAME", "default_db")  # Nom de base par défaut
 
+    # Pool de connexions MongoDB (client Motor partagé)
+    mongo_max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    mongo_min_pool_size = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+
+    # Clients HTTP partagés (keep-alive) pour les appels OpenAI
+    http_max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    http_max_keepalive_connections = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    http_keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))  # En secondes
+    http_timeout = float(os.getenv("HTTP_TIMEOUT", "60"))  # En secondes
+
+    # Nombre maximal de messages d'historique relus à chaque tour
+    history_max_messages = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+    # Budget en tokens des tours récents ; les plus anciens sont résumés
+    history_token_budget = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+    history_summary_min_messages = int(os.getenv("HISTORY_SUMMARY_MIN_MESSAGES", "4"))
+    summary_model = os.getenv("SUMMARY_MODEL", "gpt-4o-mini")
+
+    # Cache des embeddings de requêtes
+    embedding_cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+    embedding_cache_ttl = float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))  # En secondes
+    embedding_cache_on_disk = os.getenv("EMBEDDING_CACHE_ON_DISK", "false").lower() == "true"
+
+    # Historiques de session en mémoire ("memory", LRU par worker) ou partagés ("mongo")
+    session_store_backend = os.getenv("SESSION_STORE_BACKEND", "memory")
+    session_store_max_sessions = int(os.getenv("SESSION_STORE_MAX_SESSIONS", "1000"))
+    session_store_ttl = float(os.getenv("SESSION_STORE_TTL", "3600"))  # En secondes
+    session_store_max_bytes = int(os.getenv("SESSION_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+    session_store_max_messages = int(os.getenv("SESSION_STORE_MAX_MESSAGES", "100"))
+
+    # Cache des réponses (seuil de similarité cosinus des questions posées sur
+    # les mêmes chunks ; 0, par défaut, désactive la correspondance sémantique)
+    response_cache_size = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+    response_cache_ttl = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))  # En secondes
+    response_cache_semantic_threshold = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0"))
+
+    # Journalisation : niveau, et fraction des messages INFO/DEBUG conservés
+    # (les avertissements et erreurs le sont toujours)
+    log_level = os.getenv("LOG_LEVEL", "INFO")
+    log_sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+    # Fournisseurs de modèles (voir app/services/providers.py)
+    # LLM_PROVIDER : "openai", "openai_compatible" (LLM_BASE_URL) ou "fake"
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    llm_provider = os.getenv("LLM_PROVIDER", "openai")
+    llm_model = os.getenv("LLM_MODEL", "gpt-4o")
+    llm_base_url = os.getenv("LLM_BASE_URL", "")
+    llm_api_key = os.getenv("LLM_API_KEY", "")
+    # EMBEDDING_PROVIDER : "openai", "openai_compatible", "sentence_transformers" ou "hash".
+    # Changer de modèle d'embeddings impose de réindexer les documents.
+    embedding_provider = os.getenv("EMBEDDING_PROVIDER", "openai")
+    embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+    embedding_base_url = os.getenv("EMBEDDING_BASE_URL", "")
+    embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "384"))
+    # LLM simulé : débit, latence du premier token et longueur des réponses
+    fake_llm_tokens_per_second = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+    fake_llm_first_token_latency = float(os.getenv("FAKE_LLM_FIRST_TOKEN_LATENCY", "0.2"))
+    fake_llm_response_tokens = int(os.getenv("FAKE_LLM_RESPONSE_TOKENS", "100"))
+
+    # Recherche : "vector", "lexical" (BM25 local) ou "hybrid" (fusion RRF)
+    retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid")
+    rrf_vector_weight = float(os.getenv("RRF_VECTOR_WEIGHT", "1.0"))
+    rrf_lexical_weight = float(os.getenv("RRF_LEXICAL_WEIGHT", "1.0"))
+    rrf_k = int(os.getenv("RRF_K", "60"))
+    # Au-delà, la recherche hybride se contente des résultats lexicaux (en secondes)
+    embedding_timeout = float(os.getenv("EMBEDDING_TIMEOUT", "5"))
+
+    # Sélection du contexte : candidats sur-échantillonnés, dédoublonnés,
+    # diversifiés (MMR, 1 = pertinence seule) puis tassés dans un budget de tokens
+    retrieval_fetch_k = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+    retrieval_top_k = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+    retrieval_overlap_threshold = float(os.getenv("RETRIEVAL_OVERLAP_THRESHOLD", "0.5"))
+    mmr_lambda = float(os.getenv("MMR_LAMBDA", "0.7"))
+    context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+    # Cross-encoder sentence-transformers exécuté sur CPU (vide = désactivé)
+    reranker_model = os.getenv("RERANKER_MODEL", "")
+
+    # Streaming SSE : tokens regroupés par trame jusqu'à N caractères ou N secondes,
+    # file bornée entre le LLM et le client (contre-pression)
+    stream_frame_max_chars = int(os.getenv("STREAM_FRAME_MAX_CHARS", "64"))
+    stream_frame_max_delay = float(os.getenv("STREAM_FRAME_MAX_DELAY", "0.05"))
+    stream_queue_size = int(os.getenv("STREAM_QUEUE_SIZE", "32"))
+
+    # Admission des requêtes de chat : générations simultanées (réduites après
+    # un 429 du fournisseur), file d'attente bornée et limites de débit par
+    # session et par client (requêtes par minute, 0 = sans limite)
+    admission_max_concurrent = int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+    admission_min_concurrent = int(os.getenv("ADMISSION_MIN_CONCURRENT", "1"))
+    admission_max_queue = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+    admission_queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+    admission_backoff = float(os.getenv("ADMISSION_BACKOFF", "1"))
+    admission_max_backoff = float(os.getenv("ADMISSION_MAX_BACKOFF", "30"))
+    rate_limit_session_per_minute = float(os.getenv("RATE_LIMIT_SESSION_PER_MINUTE", "20"))
+    rate_limit_session_burst = int(os.getenv("RATE_LIMIT_SESSION_BURST", "5"))
+    rate_limit_client_per_minute = float(os.getenv("RATE_LIMIT_CLIENT_PER_MINUTE", "60"))
+    rate_limit_client_burst = int(os.getenv("RATE_LIMIT_CLIENT_BURST", "20"))
+
+    # Pool de threads pour les appels bloquants du RAG (Chroma, PyMuPDF, embeddings) ;
+    # au moins 2, les indexations en laissant toujours un aux recherches
+    rag_max_workers = int(os.getenv("RAG_MAX_WORKERS", "8"))
+    rag_max_concurrent_ingestions = int(os.getenv("RAG_MAX_CONCURRENT_INGESTIONS", "2"))
+
+    # Extraction du texte des PDF : processus (1 = sans pool ; par défaut au plus 4,
+    # chacun important PyMuPDF et langchain) et pages par tâche
+    pdf_parse_workers = int(os.getenv("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+    pdf_pages_per_task = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+    # Tables nutritionnelles extraites des PDF : réponses directes aux questions
+    # de composition (« calories pour 100 g de X »), sans appel au LLM
+    answer_cards = os.getenv("ANSWER_CARDS", "true").lower() == "true"
+
+    # Chat par lots (/chat/batch) : questions par requête, questions recherchées
+    # ensemble (un appel d'embeddings) et générations simultanées
+    batch_max_questions = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+    batch_retrieval_size = int(os.getenv("BATCH_RETRIEVAL_SIZE", "64"))
+    batch_concurrency = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+    # Collections nommées ouvertes en mémoire (LRU, borné en nombre et en octets
+    # estimés) et limite mémoire des index vectoriels de Chroma (0 = sans limite)
+    collection_pool_max_open = int(os.getenv("COLLECTION_POOL_MAX_OPEN", "16"))
+    collection_pool_max_bytes = int(os.getenv("COLLECTION_POOL_MAX_BYTES", str(256 * 1024 * 1024)))
+    vector_memory_limit_bytes = int(os.getenv("VECTOR_MEMORY_LIMIT_BYTES", "0"))
+
+    # Stockage des vecteurs : "chroma" ou "numpy" (fichier projeté en mémoire,
+    # embeddings en "float32" ou quantifiés en "int8")
+    vector_backend = os.getenv("VECTOR_BACKEND", "chroma")
+    vector_dtype = os.getenv("VECTOR_DTYPE", "float32")
+    # Index IVF du backend "numpy" (python -m app.services.ann_index build) :
+    # listes parcourues par requête, 0 = recherche exacte
+    ann_nprobe = int(os.getenv("ANN_NPROBE", "8"))
+
+    # Pipeline d'indexation : taille des lots et requêtes d'embeddings simultanées
+    embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    embedding_concurrency = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+    embedding_max_retries = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+
+    # Tâches d'indexation en arrière-plan ("memory", "sqlite" ou "mongo")
+    ingestion_workers = int(os.getenv("INGESTION_WORKERS", "2"))
+    ingestion_job_backend = os.getenv("INGESTION_JOB_BACKEND", "sqlite")
+    ingestion_job_db = os.getenv("INGESTION_JOB_DB", "./data/ingestion_jobs.sqlite3")
+    # Délai sans signe de vie au-delà duquel une tâche en cours est considérée abandonnée
+    ingestion_heartbeat_timeout = float(os.getenv("INGESTION_HEARTBEAT_TIMEOUT", "60"))
+    upload_dir = os.getenv("UPLOAD_DIR", "./data/uploads")
+
 settings = Config()
\ No newline at end of file
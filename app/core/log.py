@@ -0,0 +1,39 @@
+# core/log.py
+"""
+Journalisation de l'application : niveau configurable et échantillonnage des
+messages fréquents (chemin des requêtes)
+"""
+import logging
+import random
+
+from app.core.config import settings
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Ne garde qu'une fraction `rate` des messages de niveau inférieur à
+    WARNING ; les avertissements et erreurs sont toujours journalisés
+    """
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+def configure_logging() -> None:
+    """Configure le logger "app" selon LOG_LEVEL et LOG_SAMPLE_RATE"""
+    logger = logging.getLogger("app")
+    logger.setLevel(settings.log_level.upper())
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        handler.addFilter(SamplingFilter(settings.log_sample_rate))
+        logger.addHandler(handler)
+    logger.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger d'un module de l'application (ex. get_logger(__name__))"""
+    return logging.getLogger(name if name.startswith("app") else f"app.{name}")
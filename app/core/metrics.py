@@ -0,0 +1,199 @@
+# core/metrics.py
+"""
+Métriques au format texte Prometheus et mesure de la durée des étapes d'une requête
+"""
+import bisect
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Bornes (en secondes) des histogrammes de latence
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """Métrique avec des séries par valeurs d'étiquettes"""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return super().render() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per series: counts per bucket (non cumulative), sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            series = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Toutes les métriques au format texte d'exposition Prometheus"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_duration_seconds", "Duration of each stage of the RAG pipeline", ["stage"]
+))
+REQUESTS = REGISTRY.register(Counter(
+    "rag_requests_total", "Chat requests by outcome", ["outcome"]
+))
+TOKENS = REGISTRY.register(Counter(
+    "rag_llm_tokens_total", "LLM tokens sent (in) and generated (out)", ["direction"]
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "rag_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"]
+))
+ACTIVE_STREAMS = REGISTRY.register(Gauge(
+    "rag_active_streams", "Responses currently being streamed"
+))
+ADMISSIONS = REGISTRY.register(Counter(
+    "rag_admissions_total", "Chat requests by admission decision", ["result"]
+))
+ADMISSION_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "rag_admission_queue_depth", "Chat requests waiting for a generation slot"
+))
+ADMISSION_LIMIT = REGISTRY.register(Gauge(
+    "rag_admission_concurrency_limit", "Current limit of concurrent generations"
+))
+
+
+# Durées des étapes de la requête en cours (None hors requête tracée)
+_current_trace: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "rag_trace", default=None
+)
+
+
+@contextmanager
+def trace() -> Iterator[Dict[str, float]]:
+    """
+    Démarre la trace d'une requête : les étapes mesurées par `span` dans ce
+    contexte (y compris dans les threads lancés avec le contexte copié) y
+    ajoutent leur durée
+    """
+    stages: Dict[str, float] = {}
+    token = _current_trace.set(stages)
+    try:
+        yield stages
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # Async generator closed from another task: its context is discarded anyway
+            pass
+
+
+def record(stage: str, seconds: float) -> None:
+    """Enregistre la durée d'une étape dans l'histogramme et la trace courante"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    stages = _current_trace.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Mesure la durée d'un bloc (synchrone ou contenant des await)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
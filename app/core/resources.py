@@ -0,0 +1,106 @@
+# core/resources.py
+"""
+Ressources partagées de l'application, créées au démarrage et fermées à l'arrêt
+"""
+from typing import Optional
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.core.log import get_logger
+from app.services.admission import AdmissionController, build_admission_controller
+from app.services.ingestion_jobs import IngestionQueue, build_job_store
+from app.services.llm_service import LLMService
+from app.services.memory import build_session_store
+from app.services.mongo_service import MongoService
+from app.services.rag_service import RAGService
+
+logger = get_logger(__name__)
+
+
+class Resources:
+    """
+    Conteneur des clients partagés : un client Motor (pool de connexions),
+    des clients HTTP keep-alive pour OpenAI, le vector store et les services.
+
+    Une instance est créée par processus dans le lifespan de FastAPI, ce qui
+    reste correct avec plusieurs workers uvicorn.
+    """
+    def __init__(self):
+        self.mongo_client: Optional[AsyncIOMotorClient] = None
+        self.http_client: Optional[httpx.Client] = None
+        self.http_async_client: Optional[httpx.AsyncClient] = None
+
+        self.mongo_service: Optional[MongoService] = None
+        self.rag_service: Optional[RAGService] = None
+        self.llm_service: Optional[LLMService] = None
+        self.ingestion_queue: Optional[IngestionQueue] = None
+        self.admission: Optional[AdmissionController] = None
+
+    async def startup(self) -> None:
+        """Crée les clients et services, puis les prépare avant d'accepter du trafic"""
+        limits = httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry
+        )
+        self.http_client = httpx.Client(limits=limits, timeout=settings.http_timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=settings.http_timeout)
+
+        # Créé dans la boucle asyncio du serveur : pas de conflit de boucle
+        self.mongo_client = AsyncIOMotorClient(
+            settings.mongodb_uri,
+            maxPoolSize=settings.mongo_max_pool_size,
+            minPoolSize=settings.mongo_min_pool_size
+        )
+        self.mongo_service = MongoService(self.mongo_client)
+
+        self.rag_service = RAGService(
+            http_client=self.http_client,
+            http_async_client=self.http_async_client
+        )
+        self.llm_service = LLMService(
+            self.mongo_service,
+            self.rag_service,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+            session_store=build_session_store(self.mongo_service)
+        )
+        self.admission = build_admission_controller()
+        self.ingestion_queue = IngestionQueue(
+            self.rag_service,
+            build_job_store(self.mongo_service),
+            workers=settings.ingestion_workers,
+            upload_dir=settings.upload_dir,
+            heartbeat_timeout=settings.ingestion_heartbeat_timeout
+        )
+
+        await self.warm_up()
+        await self.ingestion_queue.start()
+
+    async def warm_up(self) -> None:
+        """Ouvre les connexions et charge les index avant les premières requêtes"""
+        try:
+            await self.mongo_service.ping()
+            logger.info("Pinged your deployment. You successfully connected to MongoDB!")
+        except Exception as e:
+            logger.error("MongoDB ping failed: %s", e)
+        await self.mongo_service.ensure_indexes()
+        await self.llm_service.conversation_store.ensure_indexes()
+        await self.rag_service.warm_up()
+
+    async def shutdown(self) -> None:
+        """Arrête les workers et ferme les clients"""
+        if self.ingestion_queue is not None:
+            await self.ingestion_queue.stop()
+        if self.llm_service is not None:
+            await self.llm_service.close()
+        if self.rag_service is not None:
+            self.rag_service.close()
+        if self.http_async_client is not None:
+            await self.http_async_client.aclose()
+        if self.http_client is not None:
+            self.http_client.close()
+        if self.mongo_client is not None:
+            self.mongo_client.close()
@@ -1,30 +1,55 @@
+from contextlib import asynccontextmanager
+from typing import Callable
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.router import router as api_router
-from app.services.llm_service import LLMService
-from app.services.mongo_service import mongo_service
+from app.core.log import configure_logging
+from app.core.resources import Resources
 import uvicorn
 
 load_dotenv()
 
-app = FastAPI(
-    title="Agent conversationnel",
-    description="API pour un agent conversationnel donné lors du TP1",
-    version="1.0",
-)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def create_app(resources_factory: Callable[[], Resources] = Resources) -> FastAPI:
+    """
+    Crée l'application ; `resources_factory` permet de substituer les
+    ressources partagées (ex. services locaux pour les benchmarks)
+    """
+    configure_logging()
 
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        """Crée les clients partagés au démarrage du worker et les ferme à l'arrêt"""
+        resources = resources_factory()
+        await resources.startup()
+        app.state.resources = resources
+        try:
+            yield
+        finally:
+            await resources.shutdown()
 
-# Inclure les routes
-app.include_router(api_router)
+    app = FastAPI(
+        title="Agent conversationnel",
+        description="API pour un agent conversationnel donné lors du TP1",
+        version="1.0",
+        lifespan=lifespan,
+    )
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Inclure les routes
+    app.include_router(api_router)
+    return app
+
+
+app = create_app()
 
 
 if __name__ == "__main__":
@@ -3,8 +3,9 @@
 Modèles Pydantic pour la validation des données
 Inclut les modèles du TP1 et les nouveaux modèles pour le TP2
 """
+from datetime import datetime
 from typing import Dict, List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class ChatResponse(BaseModel):
@@ -15,6 +16,16 @@ class ChatRequest(BaseModel):
     """Requête de base pour une conversation sans contexte"""
     message: str
     session_id: str  # Ajouté pour supporter les deux versions
+    collections: Optional[List[str]] = None  # Collections interrogées (par défaut "default")
+    nprobe: Optional[int] = None  # Listes de l'index IVF parcourues (par défaut ANN_NPROBE, 0 = exact)
+
+class BatchChatRequest(BaseModel):
+    """Lot de questions indépendantes (évaluation, réponses en masse)"""
+    questions: List[str]
+    collections: Optional[List[str]] = None
+    nprobe: Optional[int] = None
+    dry_run: bool = False  # Recherche seulement, sans génération
+    concurrency: Optional[int] = Field(None, ge=1)  # Générations simultanées (BATCH_CONCURRENCY au plus)
 
 class ChatMessage(BaseModel):
     """Structure d'un message individuel dans l'historique"""
@@ -28,5 +39,24 @@ class ChatHistory(BaseModel):
 class SessionResponse(BaseModel):
     session_id: str
 
+class SessionSummary(BaseModel):
+    """Métadonnées d'une session, tenues à jour à chaque message"""
+    session_id: str
+    title: Optional[str] = None
+    message_count: int = 0
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None  # Dernière activité
+
+class SessionPage(BaseModel):
+    """Page de sessions ; `next_cursor` est absent sur la dernière page"""
+    items: List[SessionSummary]
+    next_cursor: Optional[str] = None
+
+class HistoryPage(BaseModel):
+    """Page de l'historique en ordre chronologique ; `next_cursor` donne les messages précédents"""
+    items: List[Dict]
+    next_cursor: Optional[str] = None
+    message_count: int = 0
+
 class RenameSessionRequest(BaseModel):
     new_session_id: str
\ No newline at end of file
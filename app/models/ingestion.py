@@ -0,0 +1,54 @@
+# models/ingestion.py
+"""
+Modèles Pydantic pour les tâches d'indexation de documents
+"""
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, Field, computed_field
+
+
+class IngestionJob(BaseModel):
+    """État d'une tâche d'indexation de PDF en arrière-plan"""
+    job_id: str
+    filename: Optional[str] = None
+    document_id: Optional[str] = None
+    collection: str = "default"
+    file_path: str
+    clear_existing: bool = False
+    status: str = "queued"  # "queued", "running", "done" ou "failed"
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_skipped: int = 0  # Chunks déjà indexés, non recalculés
+    error: Optional[str] = None
+    owner: Optional[str] = None  # Processus qui exécute la tâche ("hôte:pid")
+    heartbeat_at: Optional[datetime] = None  # Dernier signe de vie de ce processus
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @computed_field
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at or datetime.utcnow()
+        return max((end - self.started_at).total_seconds(), 0.0)
+
+    @computed_field
+    @property
+    def pages_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.pages_parsed / elapsed if elapsed else 0.0
+
+    @computed_field
+    @property
+    def chunks_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.chunks_embedded / elapsed if elapsed else 0.0
+
+
+class IngestionJobResponse(BaseModel):
+    """Réponse renvoyée à la création d'une tâche d'indexation"""
+    job_id: str
+    status: str
@@ -0,0 +1,299 @@
+# services/admission.py
+"""
+Contrôle d'admission des requêtes de chat : limites de débit par session et par
+client, nombre borné de générations simultanées, file d'attente bornée et
+réduction de la concurrence quand le fournisseur du LLM renvoie des 429
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Optional
+
+from app.core.config import settings
+from app.core.log import get_logger
+from app.core.metrics import ADMISSIONS, ADMISSION_LIMIT, ADMISSION_QUEUE_DEPTH
+from app.services.streaming import StreamEvent
+
+logger = get_logger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Requête refusée : `status_code` 429 (débit), 413 (lot au-delà de la réserve) ou 503 (file pleine)"""
+    def __init__(self, message: str, status_code: int, retry_after: float):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Seau à jetons : `rate` jetons par seconde, au plus `capacity` en réserve"""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: int = 1) -> float:
+        """Prend `cost` jetons ; renvoie 0 si accordés, sinon le délai avant qu'ils soient disponibles"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Seaux à jetons par clé, les moins récemment utilisés oubliés au-delà de `max_keys`"""
+    def __init__(self, per_minute: float, burst: int, max_keys: int = 10000):
+        self.rate = per_minute / 60
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def take(self, key: str, cost: int = 1) -> float:
+        if not self.enabled:
+            return 0.0
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(cost)
+
+
+class AdmissionController:
+    """
+    Admission des générations devant LLMService.stream_events.
+
+    Au plus `limit` générations tournent en même temps ; les suivantes
+    attendent dans une file bornée (position communiquée au client) pendant au
+    plus `queue_timeout` secondes. La limite suit un AIMD : divisée par deux et
+    admissions suspendues à chaque 429 du fournisseur, puis réaugmentée
+    progressivement à chaque réponse générée par le fournisseur (pas celles
+    servies par le cache ou les tables nutritionnelles), jusqu'à `max_concurrent`.
+    """
+    def __init__(self,
+                 max_concurrent: int = 16,
+                 min_concurrent: int = 1,
+                 max_queue: int = 64,
+                 queue_timeout: float = 30.0,
+                 position_interval: float = 1.0,
+                 session_limiter: Optional[RateLimiter] = None,
+                 client_limiter: Optional[RateLimiter] = None,
+                 backoff: float = 1.0,
+                 max_backoff: float = 30.0):
+        self.max_concurrent = max_concurrent
+        self.min_concurrent = max(1, min(min_concurrent, max_concurrent))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.position_interval = position_interval
+        self.session_limiter = session_limiter
+        self.client_limiter = client_limiter
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.limit = float(max_concurrent)
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._paused_until = 0.0
+        self._consecutive_rate_limits = 0
+        ADMISSION_LIMIT.set(self.limit)
+
+    def check(self, session_id: Optional[str], client_id: str, cost: int = 1) -> None:
+        """
+        Limites de débit et place dans la file, vérifiées avant d'ouvrir le flux
+        (sans limite par session quand `session_id` est None, pour les lots).
+        Une requête demandant `cost` générations prend autant de jetons.
+
+        Raises:
+            AdmissionRejected: débit dépassé (429), plus de générations que la
+                réserve n'en permet (413) ou file pleine (503)
+        """
+        for limiter, key, scope in ((self.session_limiter, session_id, "session"),
+                                    (self.client_limiter, client_id, "client")):
+            if limiter is None or key is None:
+                continue
+            if limiter.enabled and cost > limiter.burst:
+                ADMISSIONS.inc(result=f"rate_limited_{scope}")
+                raise AdmissionRejected(f"At most {limiter.burst} generations per request for this {scope}", 413, 0)
+            wait = limiter.take(key, cost)
+            if wait > 0:
+                ADMISSIONS.inc(result=f"rate_limited_{scope}")
+                raise AdmissionRejected(f"Too many requests for this {scope}", 429, wait)
+        if len(self._waiters) >= self.max_queue:
+            ADMISSIONS.inc(result="queue_full")
+            raise AdmissionRejected("Server busy, please retry", 503, self._retry_after())
+
+    async def stream(self, events: Callable[[], AsyncIterator[StreamEvent]]) -> AsyncIterator[StreamEvent]:
+        """
+        Attend une place (en émettant des événements "queued" avec la position
+        dans la file) puis relaie le flux produit par `events`
+        """
+        loop = asyncio.get_running_loop()
+        if self._can_admit(loop.time()) and not self._waiters:
+            self.active += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                ADMISSIONS.inc(result="queue_full")
+                yield "error", {"message": "Server busy, please retry", "retry_after": self._retry_after()}
+                return
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+            admitted = False
+            try:
+                deadline = loop.time() + self.queue_timeout
+                position = None
+                while not waiter.done():
+                    current = self._waiters.index(waiter) + 1
+                    if current != position:
+                        position = current
+                        yield "queued", {"position": position}
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    await asyncio.wait({waiter}, timeout=min(remaining, self.position_interval))
+                admitted = waiter.done()
+            finally:
+                if not admitted:
+                    # Timed out or cancelled: leave the queue, or give back a place granted meanwhile
+                    if waiter.done():
+                        self._release()
+                    else:
+                        waiter.cancel()
+                        self._waiters.remove(waiter)
+                        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+            if not admitted:
+                ADMISSIONS.inc(result="timeout")
+                yield "error", {"message": "Server busy, please retry", "retry_after": self._retry_after()}
+                return
+
+        ADMISSIONS.inc(result="admitted")
+        stream = events()
+        try:
+            async for event, data in stream:
+                if event == "error" and data.get("status") == 429:
+                    self._on_rate_limited()
+                elif event == "done" and not data.get("cached") and not data.get("card"):
+                    # Only answers generated by the provider say anything about its capacity
+                    self._on_success()
+                yield event, data
+        finally:
+            self._release()
+            # Closing the stream stops the LLM call when the client went away
+            await stream.aclose()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Place de génération hors flux SSE (chat par lots), prise dans la même
+        file que les requêtes de chat ; l'attente n'est pas limitée. Une erreur
+        429 du fournisseur levée dans le bloc réduit la concurrence comme pour
+        les flux.
+        """
+        loop = asyncio.get_running_loop()
+        if self._can_admit(loop.time()) and not self._waiters:
+            self.active += 1
+        else:
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+            admitted = False
+            try:
+                # Waiting on the future without awaiting it: cancelling the caller leaves it intact
+                await asyncio.wait({waiter})
+                admitted = True
+            finally:
+                if not admitted:
+                    if waiter.done():
+                        self._release()
+                    else:
+                        waiter.cancel()
+                        self._waiters.remove(waiter)
+                        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+        ADMISSIONS.inc(result="admitted")
+        try:
+            yield
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                self._on_rate_limited()
+            raise
+        else:
+            self._on_success()
+        finally:
+            self._release()
+
+    def _can_admit(self, now: float) -> bool:
+        return now >= self._paused_until and self.active < int(self.limit)
+
+    def _release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._waiters and self._can_admit(loop.time()):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.active += 1
+            waiter.set_result(None)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+    def _retry_after(self) -> float:
+        loop = asyncio.get_running_loop()
+        return max(self._paused_until - loop.time(), self.backoff)
+
+    def _on_rate_limited(self) -> None:
+        """429 du fournisseur : décroissance multiplicative et pause exponentielle"""
+        loop = asyncio.get_running_loop()
+        self._consecutive_rate_limits += 1
+        self.limit = max(float(self.min_concurrent), self.limit / 2)
+        pause = min(self.backoff * 2 ** (self._consecutive_rate_limits - 1), self.max_backoff)
+        self._paused_until = max(self._paused_until, loop.time() + pause)
+        loop.call_later(pause, self._wake)
+        ADMISSION_LIMIT.set(self.limit)
+        logger.warning(
+            "LLM provider rate limit: concurrency limit lowered to %d, admissions paused for %.1fs",
+            int(self.limit), pause
+        )
+
+    def _on_success(self) -> None:
+        """Réponse réussie : croissance additive de la limite"""
+        self._consecutive_rate_limits = 0
+        if self.limit < self.max_concurrent:
+            self.limit = min(float(self.max_concurrent), self.limit + 1 / self.limit)
+            ADMISSION_LIMIT.set(self.limit)
+            self._wake()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": self.active,
+            "queued": len(self._waiters),
+            "limit": int(self.limit),
+            "max_concurrent": self.max_concurrent,
+        }
+
+
+def build_admission_controller() -> AdmissionController:
+    """Contrôleur d'admission configuré par les variables ADMISSION_* et RATE_LIMIT_*"""
+    return AdmissionController(
+        max_concurrent=settings.admission_max_concurrent,
+        min_concurrent=settings.admission_min_concurrent,
+        max_queue=settings.admission_max_queue,
+        queue_timeout=settings.admission_queue_timeout,
+        session_limiter=RateLimiter(settings.rate_limit_session_per_minute, settings.rate_limit_session_burst),
+        client_limiter=RateLimiter(settings.rate_limit_client_per_minute, settings.rate_limit_client_burst),
+        backoff=settings.admission_backoff,
+        max_backoff=settings.admission_max_backoff
+    )
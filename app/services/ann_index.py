@@ -0,0 +1,264 @@
+# services/ann_index.py
+"""
+Index approximatif (IVF) des vecteurs du backend "numpy"
+
+Les vecteurs sont répartis en `nlist` listes par un k-means sphérique ; une
+requête ne calcule les scores que des lignes des `nprobe` listes dont le
+centroïde est le plus proche. Les centroïdes et l'affectation de chaque ligne
+sont persistés à côté des vecteurs et projetés en mémoire à l'ouverture ; les
+lignes ajoutées ensuite sont affectées à la volée. Le fichier des centroïdes est
+écrit en dernier : sa présence marque un index complet.
+
+Usage :
+    python -m app.services.ann_index build --collection default --nlist 256
+    python -m app.services.ann_index eval --collection default --nprobe 1 2 4 8 16 32
+"""
+import argparse
+import json
+import os
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class IVFIndex:
+    CENTROIDS = "ivf_centroids.npy"
+    # One int32 per row: index of its list + 1 (0 = not assigned)
+    ASSIGNMENTS = "ivf_assignments.i32"
+
+    def __init__(self, directory: str, centroids: np.ndarray):
+        self.directory = directory
+        self.centroids = centroids
+        self.capacity = 0
+        self._assignments: Optional[np.memmap] = None
+        self._map(max(os.path.getsize(self._path(self.ASSIGNMENTS)) // 4, 0)
+                  if os.path.exists(self._path(self.ASSIGNMENTS)) else 0)
+        self._lists = self._build_lists()
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return cls.stamp(directory) is not None
+
+    @classmethod
+    def stamp(cls, directory: str) -> Optional[Tuple[int, int]]:
+        """Identifie la version de l'index sur disque (None s'il n'y en a pas)"""
+        try:
+            stat = os.stat(os.path.join(directory, cls.CENTROIDS))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    @classmethod
+    def load(cls, directory: str) -> "IVFIndex":
+        return cls(directory, np.load(os.path.join(directory, cls.CENTROIDS), mmap_mode="r"))
+
+    @classmethod
+    def build(cls,
+              directory: str,
+              blocks: Iterator[Tuple[np.ndarray, np.ndarray]],
+              nlist: int,
+              iterations: int = 20,
+              sample_size: int = 100000,
+              seed: int = 0) -> "IVFIndex":
+        """
+        Construit l'index à partir des lignes existantes, fournies par blocs
+        (lignes, vecteurs normalisés). Le k-means est appris sur un échantillon.
+        """
+        rows_list, vectors_list = [], []
+        for rows, vectors in blocks:
+            rows_list.append(rows)
+            vectors_list.append(np.asarray(vectors, dtype=np.float32))
+        rows = np.concatenate(rows_list) if rows_list else np.zeros(0, dtype=np.int64)
+        vectors = np.concatenate(vectors_list) if vectors_list else np.zeros((0, 0), dtype=np.float32)
+        if len(rows) < nlist:
+            raise ValueError(f"Not enough vectors ({len(rows)}) for {nlist} lists")
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)]
+        centroids = _spherical_kmeans(sample, nlist, iterations, rng)
+
+        for name in (cls.CENTROIDS, cls.ASSIGNMENTS):
+            if os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+        index = cls(directory, centroids)
+        index.add(rows, vectors)
+        index.flush()
+        # Written last: another process only sees the index once it is complete
+        tmp_path = os.path.join(directory, "ivf_centroids.tmp.npy")
+        np.save(tmp_path, centroids)
+        os.replace(tmp_path, os.path.join(directory, cls.CENTROIDS))
+        return index
+
+    def _map(self, capacity: int) -> None:
+        if self._assignments is not None:
+            self._assignments.flush()
+        size = capacity * 4
+        with open(self._path(self.ASSIGNMENTS), "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self.capacity = capacity
+        self._assignments = (
+            np.memmap(self._path(self.ASSIGNMENTS), dtype=np.int32, mode="r+", shape=(capacity,))
+            if capacity else None
+        )
+
+    def _build_lists(self) -> List[np.ndarray]:
+        """Lignes de chaque liste, triées"""
+        if self._assignments is None:
+            return [np.zeros(0, dtype=np.int64) for _ in range(self.nlist)]
+        assignments = np.asarray(self._assignments)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=self.nlist + 1)
+        # Skip unassigned rows (0), then split by list
+        bounds = np.cumsum(counts)
+        return [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(self.nlist)]
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(np.asarray(vectors, dtype=np.float32) @ np.asarray(self.centroids).T, axis=1)
+
+    def unassigned(self, rows: np.ndarray) -> np.ndarray:
+        """Lignes parmi `rows` qui ne sont dans aucune liste"""
+        rows = np.asarray(rows, dtype=np.int64)
+        assigned = np.zeros(len(rows), dtype=bool)
+        inside = rows < self.capacity
+        if self._assignments is not None:
+            assigned[inside] = np.asarray(self._assignments)[rows[inside]] > 0
+        return rows[~assigned]
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Affecte des lignes (nouvelles ou modifiées) à leur liste"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        if rows.max() >= self.capacity:
+            capacity = max(self.capacity, 1024)
+            while capacity <= rows.max():
+                capacity *= 2
+            self._map(capacity)
+        new = self.assign(vectors).astype(np.int32) + 1
+        old = np.asarray(self._assignments[rows])
+        changed = old != new
+        for list_index in np.unique(old[changed & (old > 0)]):
+            moved = rows[changed & (old == list_index)]
+            self._lists[list_index - 1] = np.setdiff1d(self._lists[list_index - 1], moved, assume_unique=True)
+        for list_index in np.unique(new[changed]):
+            added = rows[changed & (new == list_index)]
+            self._lists[list_index - 1] = np.union1d(self._lists[list_index - 1], added)
+        self._assignments[rows] = new
+
+    def candidates(self, queries: np.ndarray, nprobe: int) -> List[np.ndarray]:
+        """Lignes (triées) des `nprobe` listes les plus proches de chaque requête"""
+        nprobe = max(1, min(nprobe, self.nlist))
+        scores = queries @ np.asarray(self.centroids).T
+        probes = np.argpartition(-scores, nprobe - 1, axis=1)[:, :nprobe]
+        return [np.sort(np.concatenate([self._lists[i] for i in probe])) for probe in probes]
+
+    def flush(self) -> None:
+        if self._assignments is not None:
+            self._assignments.flush()
+
+    def stats(self) -> dict:
+        sizes = [len(rows) for rows in self._lists]
+        return {"nlist": self.nlist, "rows": int(sum(sizes)), "largest_list": max(sizes, default=0)}
+
+
+def _spherical_kmeans(sample: np.ndarray, nlist: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """k-means sur la sphère : affectation par produit scalaire, centroïdes renormalisés"""
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Reseed empty lists with random points
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+### Ligne de commande ###
+
+
+def _open_vectors(args: argparse.Namespace):
+    from app.services.vector_backends import NumpyStorage, collection_directory
+
+    storage = NumpyStorage(args.persist_dir)
+    if args.collection not in storage.list_collections():
+        raise SystemExit(f"No numpy vectors for collection {args.collection} in {args.persist_dir}")
+    return storage.open(args.collection, collection_directory(args.persist_dir, args.collection))
+
+
+def _build(args: argparse.Namespace) -> dict:
+    vectors = _open_vectors(args)
+    nlist = args.nlist or max(1, int(4 * np.sqrt(vectors.count())))
+    start = time.perf_counter()
+    index = vectors.build_ann_index(nlist, iterations=args.iterations, sample_size=args.sample_size)
+    return dict(index.stats(), seconds=time.perf_counter() - start)
+
+
+def _evaluate(args: argparse.Namespace) -> dict:
+    """Recall@k et latence de l'index par rapport à la recherche exacte, par valeur de nprobe"""
+    vectors = _open_vectors(args)
+    if vectors.ann is None:
+        raise SystemExit("No ANN index: run the build command first")
+    # Stored chunks are the queries; each one is removed from its own results
+    rng = np.random.default_rng(args.seed)
+    ids = [chunk_id for batch, _ in vectors.iter_documents() for chunk_id in batch]
+    sample = [ids[i] for i in rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False)]
+    queries = np.asarray([r["embedding"] for r in vectors.get(sample, include_embeddings=True)], dtype=np.float32)
+
+    def run(nprobe: int) -> Tuple[List[set], List[float]]:
+        found, latencies = [], []
+        for chunk_id, query in zip(sample, queries):
+            start = time.perf_counter()
+            records = vectors.query([query], args.k + 1, nprobe=nprobe)[0]
+            latencies.append(time.perf_counter() - start)
+            found.append(set([r["id"] for r in records if r["id"] != chunk_id][:args.k]))
+        return found, latencies
+
+    def summary(latencies: List[float]) -> dict:
+        ordered = sorted(latencies)
+        return {
+            "mean_ms": float(np.mean(ordered)) * 1000,
+            "p95_ms": ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)] * 1000,
+        }
+
+    exact, exact_latencies = run(0)
+    report = {"k": args.k, "queries": len(sample), "index": vectors.ann.stats(),
+              "exact": summary(exact_latencies), "nprobe": []}
+    for nprobe in args.nprobe:
+        found, latencies = run(nprobe)
+        recall = np.mean([len(f & e) / max(len(e), 1) for f, e in zip(found, exact)])
+        report["nprobe"].append(dict(summary(latencies), nprobe=nprobe, recall=float(recall)))
+    return report
+
+
+if __name__ == "__main__":
+    from app.core.config import settings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "eval"])
+    parser.add_argument("--persist-dir", default="./data/vectorstore")
+    parser.add_argument("--collection", default="default")
+    parser.add_argument("--nlist", type=int, default=None, help="listes (par défaut 4·√N)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--sample-size", type=int, default=100000)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.retrieval_fetch_k)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(_build(args) if args.command == "build" else _evaluate(args), indent=2))
@@ -0,0 +1,194 @@
+# services/bm25_index.py
+"""
+Index lexical BM25 des chunks, construit en même temps que la collection Chroma
+"""
+import json
+import math
+import os
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from app.core.log import get_logger
+from app.services.normalization import normalize_text
+
+logger = get_logger(__name__)
+
+# Mots vides ignorés (les nombres, unités et codes comme "b12" ou "e330" sont conservés)
+STOPWORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "combien", "d", "dans", "de", "des", "du",
+    "elle", "en", "est", "et", "il", "je", "l", "la", "le", "les", "leur", "mais", "ne",
+    "nous", "on", "ou", "par", "pas", "plus", "pour", "qu", "que", "quel", "quelle",
+    "qui", "sa", "se", "ses", "son", "sont", "sur", "un", "une", "vous", "y",
+    "and", "how", "in", "is", "of", "the", "to", "what",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Termes d'un texte pour l'index lexical"""
+    return [token for token in normalize_text(text).split() if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Index inversé BM25 tenu à jour de façon incrémentale (ajout et suppression
+    de chunks) et persisté en JSON : un instantané et un journal des
+    modifications, réécrit dans l'instantané quand il devient trop long. Il ne
+    stocke que les ids et les termes : le texte des chunks reste dans Chroma.
+    """
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_length: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._total_length = 0
+        self._total_postings = 0
+        self._lock = threading.Lock()
+        # Changes not saved yet (lines of the log) and records of the log on disk
+        self._pending: List[str] = []
+        self._log_records = 0
+        self._rewrite = False
+
+        if os.path.exists(self.path):
+            self._load()
+        self._replay()
+
+    @property
+    def _log_path(self) -> str:
+        return f"{self.path}.log"
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def memory_bytes(self) -> int:
+        """Estimation de la mémoire occupée (entrées des postings et des documents)"""
+        return 200 * len(self._doc_terms) + 150 * self._total_postings
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]) -> None:
+        """Indexe (ou réindexe) des chunks"""
+        with self._lock:
+            for chunk_id, text in zip(ids, texts):
+                self._remove(chunk_id)
+                terms = dict(Counter(tokenize(text)))
+                self._insert(chunk_id, terms)
+                self._pending.append(json.dumps({"op": "put", "id": chunk_id, "terms": terms}) + "\n")
+
+    def remove(self, ids: Iterable[str]) -> None:
+        """Retire des chunks de l'index"""
+        with self._lock:
+            for chunk_id in ids:
+                if self._remove(chunk_id):
+                    self._pending.append(json.dumps({"op": "delete", "id": chunk_id}) + "\n")
+
+    def _insert(self, chunk_id: str, terms: Dict[str, int]) -> None:
+        self._doc_terms[chunk_id] = terms
+        self._doc_length[chunk_id] = sum(terms.values())
+        self._total_length += self._doc_length[chunk_id]
+        self._total_postings += len(terms)
+        for term, tf in terms.items():
+            self._postings[term][chunk_id] = tf
+
+    def _remove(self, chunk_id: str) -> bool:
+        terms = self._doc_terms.pop(chunk_id, None)
+        if terms is None:
+            return False
+        self._total_length -= self._doc_length.pop(chunk_id)
+        self._total_postings -= len(terms)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        return True
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        """Les `k` chunks de meilleur score BM25 pour la requête"""
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_length[chunk_id] / avg_length)
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._doc_terms.clear()
+            self._doc_length.clear()
+            self._postings.clear()
+            self._total_length = 0
+            self._total_postings = 0
+            self._pending = []
+            self._rewrite = True
+        self.save()
+
+    def save(self) -> None:
+        """
+        Persiste les modifications de l'index : ajoutées au journal, ou
+        instantané complet (écriture atomique) quand le journal est surtout obsolète
+        """
+        with self._lock:
+            if self._rewrite or self._log_records + len(self._pending) > 2 * len(self._doc_terms) + 1000:
+                self._write_snapshot()
+            elif self._pending:
+                with open(self._log_path, "a", encoding="utf-8") as f:
+                    f.write("".join(self._pending))
+                self._log_records += len(self._pending)
+            self._pending = []
+            self._rewrite = False
+
+    def _write_snapshot(self) -> None:
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self._doc_terms, f)
+        os.replace(f"{self.path}.tmp", self.path)
+        # Replaying the log over a newer snapshot is harmless if this truncation is lost
+        with open(self._log_path, "w", encoding="utf-8"):
+            pass
+        self._log_records = 0
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                doc_terms = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Error loading BM25 index: %s", e)
+            return
+        for chunk_id, terms in doc_terms.items():
+            self._insert(chunk_id, terms)
+
+    def _replay(self) -> None:
+        """Applique le journal des modifications postérieures à l'instantané"""
+        try:
+            f = open(self._log_path, "r+b")
+        except FileNotFoundError:
+            return
+        with f:
+            end = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    logger.error("Error replaying BM25 index log: %s", e)
+                    break
+                end += len(line)
+                self._log_records += 1
+                self._remove(record["id"])
+                if record["op"] == "put":
+                    self._insert(record["id"], record["terms"])
+            if f.seek(0, os.SEEK_END) > end:
+                # Partial write of an interrupted save: dropped before new records are appended
+                f.truncate(end)
@@ -0,0 +1,106 @@
+# services/document_manifest.py
+"""
+Manifestes des documents indexés (hash du fichier, hash des pages, ids des chunks)
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+def hash_text(text: str) -> str:
+    """Hash stable d'un texte"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Hash d'un fichier, lu par blocs"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(document_id: str, page_hash: str, text: str) -> str:
+    """
+    Id Chroma d'un chunk, dérivé de son contenu et de celui de sa page (pas de
+    son numéro : une page qui se déplace garde ses chunks)
+    """
+    return hash_text(f"{document_id}\x00{page_hash}\x00{text}")
+
+
+class ManifestStore:
+    """
+    Un fichier JSON par document indexé :
+
+        {"document_id", "filename", "file_hash", "indexed_at",
+         "pages": {"<page>": {"hash": ..., "chunk_ids": [...]}}}
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, document_id: str) -> str:
+        return os.path.join(self.directory, f"{hash_text(document_id)[:32]}.json")
+
+    def get(self, document_id: str) -> Optional[Dict]:
+        """Manifeste d'un document, ou None s'il n'est pas indexé"""
+        path = self._path(document_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, document_id: str, filename: Optional[str], file_hash: str,
+             pages: Dict[str, Dict]) -> Dict:
+        """Écrit le manifeste d'un document"""
+        manifest = {
+            "document_id": document_id,
+            "filename": filename,
+            "file_hash": file_hash,
+            "indexed_at": datetime.utcnow().isoformat(),
+            "pages": pages,
+        }
+        path = self._path(document_id)
+        with self._lock:
+            # Écriture atomique : un manifeste n'est jamais lu à moitié écrit
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(f"{path}.tmp", path)
+        return manifest
+
+    def delete(self, document_id: str) -> bool:
+        """Supprime le manifeste d'un document"""
+        path = self._path(document_id)
+        with self._lock:
+            if not os.path.exists(path):
+                return False
+            os.remove(path)
+            return True
+
+    def list(self) -> List[Dict]:
+        """Tous les manifestes"""
+        manifests = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    manifests.append(json.load(f))
+        return manifests
+
+    def find_by_file_hash(self, file_hash: str) -> Optional[Dict]:
+        """Manifeste d'un document dont le fichier est identique, s'il existe"""
+        for manifest in self.list():
+            if manifest["file_hash"] == file_hash:
+                return manifest
+        return None
+
+    def clear(self) -> None:
+        """Supprime tous les manifestes"""
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
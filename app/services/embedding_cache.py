@@ -0,0 +1,149 @@
+# services/embedding_cache.py
+"""
+Cache des embeddings de requêtes (LRU en mémoire avec TTL, niveau disque optionnel)
+"""
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.core.log import get_logger
+from app.services.normalization import normalize_text
+
+logger = get_logger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Cache borné des embeddings de requêtes, indexé par le texte normalisé.
+
+    Le niveau mémoire est un LRU avec expiration (TTL). Si un dossier est fourni,
+    un second niveau SQLite conserve les embeddings entre deux redémarrages.
+    """
+    def __init__(self,
+                 max_size: int = 1024,
+                 ttl: float = 3600.0,
+                 persist_dir: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        self._entries: "OrderedDict[str, tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db_path = None
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+            self._db_path = os.path.join(persist_dir, "embedding_cache.sqlite3")
+            self._execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, created_at REAL NOT NULL, embedding BLOB NOT NULL)"
+            )
+
+    def _execute(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        """Exécute une requête sur le niveau disque et retourne la première ligne"""
+        conn = sqlite3.connect(self._db_path, timeout=5)
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchone()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(query: str) -> str:
+        """Clé de cache d'une requête"""
+        return normalize_text(query)
+
+    def get(self, query: str) -> Optional[List[float]]:
+        """Retourne l'embedding en cache pour la requête, ou None"""
+        key = self.make_key(query)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, embedding = entry
+                if now - created_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+
+        embedding = self._disk_get(key)
+        with self._lock:
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._put_memory(key, embedding, now)
+        return embedding
+
+    def peek(self, query: str) -> Optional[List[float]]:
+        """
+        Embedding en cache pour la requête, sans compter de hit ni de miss ni
+        changer l'ordre LRU (relecture d'un embedding calculé pour la même requête)
+        """
+        key = self.make_key(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                return entry[1]
+        return self._disk_get(key)
+
+    def put(self, query: str, embedding: List[float]) -> None:
+        """Ajoute un embedding au cache"""
+        key = self.make_key(query)
+        with self._lock:
+            self._put_memory(key, embedding, time.monotonic())
+        self._disk_put(key, embedding)
+
+    def _put_memory(self, key: str, embedding: List[float], created_at: float) -> None:
+        self._entries[key] = (created_at, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        if not self._db_path:
+            return None
+        try:
+            row = self._execute(
+                "SELECT created_at, embedding FROM query_embeddings WHERE key = ?", (key,)
+            )
+        except sqlite3.Error as e:
+            logger.error("Error reading embedding cache: %s", e)
+            return None
+        # Le niveau disque utilise l'horloge murale (valable entre deux redémarrages)
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return array("f", row[1]).tolist()
+
+    def _disk_put(self, key: str, embedding: List[float]) -> None:
+        if not self._db_path:
+            return
+        try:
+            self._execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, created_at, embedding) VALUES (?, ?, ?)",
+                (key, time.time(), array("f", embedding).tobytes())
+            )
+        except sqlite3.Error as e:
+            logger.error("Error writing embedding cache: %s", e)
+
+    def stats(self) -> Dict[str, float]:
+        """Compteurs de hits/misses du cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
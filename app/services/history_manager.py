@@ -0,0 +1,155 @@
+# services/history_manager.py
+"""
+Fenêtre d'historique bornée en tokens, avec résumé glissant des anciens échanges
+"""
+import asyncio
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+import tiktoken
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from app.core.log import get_logger
+from app.services.mongo_service import MongoService
+
+logger = get_logger(__name__)
+
+SUMMARY_PROMPT = (
+    "Tu résumes une conversation entre un utilisateur et un assistant nutrition. "
+    "Conserve les faits utiles pour la suite : objectifs, préférences, allergies, "
+    "aliments et chiffres évoqués. Réponds uniquement par le résumé, en français, "
+    "en quelques phrases."
+)
+
+
+# Mots et signes de ponctuation, pour le comptage approximatif
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenCounter:
+    """
+    Comptage local des tokens avec le tokenizer du modèle.
+
+    tiktoken télécharge son vocabulaire à la première utilisation (mis en cache
+    sous TIKTOKEN_CACHE_DIR) ; s'il est indisponible, par exemple sur une
+    machine sans réseau, le comptage est approximé (≈ 4 caractères par token).
+    """
+    def __init__(self, model_name: str = "gpt-4o"):
+        self.encoding = None
+        try:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning("Tokenizer for %s unavailable (%s), using an approximate token count", model_name, e)
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return sum(-(-len(word) // 4) for word in _WORDS.findall(text))
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def count_messages(self, messages: List[BaseMessage]) -> int:
+        # ~4 tokens de structure par message dans le format chat d'OpenAI
+        return sum(self.count(str(m.content)) + 4 for m in messages)
+
+
+class HistoryManager:
+    """
+    Construit l'historique envoyé au LLM : les tours les plus récents tenant dans
+    `token_budget`, précédés d'un résumé des tours plus anciens.
+
+    Le résumé est persisté dans le document de conversation (`summary`,
+    `summarized_count`) et mis à jour en arrière-plan, hors du chemin de la requête.
+    """
+    def __init__(self,
+                 mongo_service: MongoService,
+                 summarizer: BaseChatModel,
+                 token_counter: TokenCounter,
+                 token_budget: int = 2000,
+                 summary_min_messages: int = 4):
+        self.mongo_service = mongo_service
+        self.summarizer = summarizer
+        self.token_counter = token_counter
+        self.token_budget = token_budget
+        self.summary_min_messages = summary_min_messages
+
+        self._summarizing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def build_window(self, session_id: str, conversation: Dict) -> Tuple[List[BaseMessage], int]:
+        """
+        Historique à injecter dans le prompt pour une conversation renvoyée par
+        `append_message_and_get_history` (dont le dernier message est la question).
+
+        Returns:
+            (messages d'historique, nombre de tokens de cet historique)
+        """
+        fetched = conversation.get("messages", [])[:-1]
+        # Index absolu du premier message relu (les plus anciens ne sont pas relus)
+        first_index = conversation.get("message_count", len(fetched) + 1) - 1 - len(fetched)
+        summarized_count = conversation.get("summarized_count", 0)
+        summary = conversation.get("summary")
+
+        # Les tours les plus récents, dans la limite du budget
+        window: List[BaseMessage] = []
+        tokens = 0
+        start = len(fetched)
+        for msg in reversed(fetched):
+            if first_index + start - 1 < summarized_count:
+                break
+            message = self._to_message(msg)
+            if message is None:
+                start -= 1
+                continue
+            cost = self.token_counter.count_messages([message])
+            if tokens + cost > self.token_budget:
+                break
+            window.insert(0, message)
+            tokens += cost
+            start -= 1
+
+        # Les messages sortis de la fenêtre et pas encore résumés le seront en arrière-plan
+        window_start = first_index + start
+        if window_start - summarized_count >= self.summary_min_messages:
+            self._schedule_summary(session_id, summary or "", summarized_count, window_start)
+
+        if summary:
+            summary_message = SystemMessage(content=f"Résumé de la conversation précédente : {summary}")
+            window.insert(0, summary_message)
+            tokens += self.token_counter.count_messages([summary_message])
+        return window, tokens
+
+    @staticmethod
+    def _to_message(msg: Dict) -> Optional[BaseMessage]:
+        role = msg.get("role")
+        content = msg.get("content")
+        if role == "user":
+            return HumanMessage(content=content)
+        if role == "assistant":
+            return AIMessage(content=content)
+        return None
+
+    def _schedule_summary(self, session_id: str, summary: str, start: int, end: int) -> None:
+        if session_id in self._summarizing:
+            return
+        self._summarizing.add(session_id)
+        task = asyncio.create_task(self._update_summary(session_id, summary, start, end))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update_summary(self, session_id: str, summary: str, start: int, end: int) -> None:
+        """Intègre les messages [start, end) au résumé de la conversation"""
+        try:
+            messages = await self.mongo_service.get_messages_range(session_id, start, end - start)
+            transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+            response = await self.summarizer.ainvoke([
+                SystemMessage(content=SUMMARY_PROMPT),
+                HumanMessage(content=f"Résumé actuel :\n{summary or '(aucun)'}\n\nNouveaux échanges :\n{transcript}")
+            ])
+            await self.mongo_service.update_summary(session_id, response.content, start, end)
+        except Exception as e:
+            logger.error("Error updating conversation summary: %s", e)
+        finally:
+            self._summarizing.discard(session_id)
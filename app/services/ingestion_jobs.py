@@ -0,0 +1,362 @@
+# services/ingestion_jobs.py
+"""
+File de tâches d'indexation de PDF exécutées en arrière-plan
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.log import get_logger
+from app.models.ingestion import IngestionJob
+from app.services.mongo_service import MongoService
+from app.services.rag_service import RAGService
+
+logger = get_logger(__name__)
+
+INTERRUPTED = "Interrupted by a server restart"
+
+
+def _abandoned(job: IngestionJob, owner: str, expired_before: datetime) -> bool:
+    """Tâche en cours de `owner` (redémarré) ou d'un processus sans signe de vie récent"""
+    return job.owner == owner or job.heartbeat_at is None or job.heartbeat_at < expired_before
+
+
+def _mark_interrupted(job: IngestionJob) -> None:
+    job.status = "failed"
+    job.error = INTERRUPTED
+    job.finished_at = datetime.utcnow()
+
+
+class JobStore(ABC):
+    """Stockage persistant de l'état des tâches d'indexation"""
+
+    @abstractmethod
+    async def save(self, job: IngestionJob) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[IngestionJob]:
+        ...
+
+    @abstractmethod
+    async def list_by_status(self, statuses: List[str]) -> List[IngestionJob]:
+        ...
+
+    @abstractmethod
+    async def claim(self, job: IngestionJob) -> bool:
+        """
+        Enregistre `job` (passé à "running") seulement si la tâche est encore
+        en file : un seul processus obtient une tâche donnée
+        """
+
+    @abstractmethod
+    async def fail_abandoned(self, owner: str, expired_before: datetime) -> int:
+        """
+        Marque en échec les tâches en cours de `owner` ou dont le dernier signe
+        de vie précède `expired_before` ; renvoie leur nombre
+        """
+
+
+class InMemoryJobStore(JobStore):
+    """Stockage en mémoire, perdu au redémarrage"""
+    def __init__(self):
+        self._jobs: Dict[str, IngestionJob] = {}
+
+    async def save(self, job: IngestionJob) -> None:
+        self._jobs[job.job_id] = job.model_copy()
+
+    async def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    async def list_by_status(self, statuses: List[str]) -> List[IngestionJob]:
+        return [job for job in self._jobs.values() if job.status in statuses]
+
+    async def claim(self, job: IngestionJob) -> bool:
+        stored = self._jobs.get(job.job_id)
+        if stored is not None and stored.status != "queued":
+            return False
+        self._jobs[job.job_id] = job.model_copy()
+        return True
+
+    async def fail_abandoned(self, owner: str, expired_before: datetime) -> int:
+        jobs = [job for job in self._jobs.values()
+                if job.status == "running" and _abandoned(job, owner, expired_before)]
+        for job in jobs:
+            _mark_interrupted(job)
+        return len(jobs)
+
+
+class SQLiteJobStore(JobStore):
+    """Stockage dans un fichier SQLite local"""
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS ingestion_jobs ("
+            "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    async def save(self, job: IngestionJob) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO ingestion_jobs (job_id, status, data) VALUES (?, ?, ?)",
+            (job.job_id, job.status, job.model_dump_json())
+        )
+
+    async def get(self, job_id: str) -> Optional[IngestionJob]:
+        rows = await asyncio.to_thread(
+            self._execute, "SELECT data FROM ingestion_jobs WHERE job_id = ?", (job_id,)
+        )
+        return IngestionJob(**json.loads(rows[0][0])) if rows else None
+
+    async def list_by_status(self, statuses: List[str]) -> List[IngestionJob]:
+        placeholders = ", ".join("?" for _ in statuses)
+        rows = await asyncio.to_thread(
+            self._execute,
+            f"SELECT data FROM ingestion_jobs WHERE status IN ({placeholders})",
+            tuple(statuses)
+        )
+        return [IngestionJob(**json.loads(row[0])) for row in rows]
+
+    def _claim(self, job: IngestionJob) -> bool:
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE ingestion_jobs SET status = ?, data = ? WHERE job_id = ? AND status = 'queued'",
+                    (job.status, job.model_dump_json(), job.job_id)
+                )
+                return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    async def claim(self, job: IngestionJob) -> bool:
+        return await asyncio.to_thread(self._claim, job)
+
+    def _fail_abandoned(self, owner: str, expired_before: datetime) -> int:
+        # Read and update in one write transaction: no other process changes these jobs meanwhile
+        conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute("SELECT data FROM ingestion_jobs WHERE status = 'running'").fetchall()
+                jobs = [IngestionJob(**json.loads(row[0])) for row in rows]
+                jobs = [job for job in jobs if _abandoned(job, owner, expired_before)]
+                for job in jobs:
+                    _mark_interrupted(job)
+                    conn.execute(
+                        "UPDATE ingestion_jobs SET status = ?, data = ? WHERE job_id = ?",
+                        (job.status, job.model_dump_json(), job.job_id)
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return len(jobs)
+        finally:
+            conn.close()
+
+    async def fail_abandoned(self, owner: str, expired_before: datetime) -> int:
+        return await asyncio.to_thread(self._fail_abandoned, owner, expired_before)
+
+
+class MongoJobStore(JobStore):
+    """Stockage dans une collection MongoDB"""
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def save(self, job: IngestionJob) -> None:
+        await self.collection.replace_one({"job_id": job.job_id}, job.model_dump(), upsert=True)
+
+    async def get(self, job_id: str) -> Optional[IngestionJob]:
+        document = await self.collection.find_one({"job_id": job_id}, {"_id": 0})
+        return IngestionJob(**document) if document else None
+
+    async def list_by_status(self, statuses: List[str]) -> List[IngestionJob]:
+        cursor = self.collection.find({"status": {"$in": statuses}}, {"_id": 0})
+        return [IngestionJob(**document) async for document in cursor]
+
+    async def claim(self, job: IngestionJob) -> bool:
+        result = await self.collection.replace_one({"job_id": job.job_id, "status": "queued"}, job.model_dump())
+        return result.modified_count == 1
+
+    async def fail_abandoned(self, owner: str, expired_before: datetime) -> int:
+        result = await self.collection.update_many(
+            {
+                "status": "running",
+                "$or": [{"owner": owner}, {"heartbeat_at": None}, {"heartbeat_at": {"$lt": expired_before}}]
+            },
+            {"$set": {"status": "failed", "error": INTERRUPTED, "finished_at": datetime.utcnow()}}
+        )
+        return result.modified_count
+
+
+def build_job_store(mongo_service: MongoService) -> JobStore:
+    """Instancie le stockage des tâches choisi dans la configuration"""
+    backend = settings.ingestion_job_backend
+    if backend == "memory":
+        return InMemoryJobStore()
+    if backend == "sqlite":
+        return SQLiteJobStore(settings.ingestion_job_db)
+    if backend == "mongo":
+        return MongoJobStore(mongo_service.db["ingestion_jobs"])
+    raise ValueError(f"Unknown ingestion job backend: {backend}")
+
+
+class IngestionQueue:
+    """
+    File asyncio de tâches d'indexation traitées par un pool de workers.
+
+    Les fichiers sont déposés sur disque par l'endpoint d'upload ; l'état des
+    tâches (pages, chunks, débit) est persisté dans le JobStore. Plusieurs
+    processus (workers uvicorn) partagent le même store : chacun réclame une
+    tâche avant de l'exécuter et signale périodiquement qu'il est en vie.
+    """
+    def __init__(self,
+                 rag_service: RAGService,
+                 store: JobStore,
+                 workers: int = 2,
+                 upload_dir: str = "./data/uploads",
+                 progress_interval: float = 1.0,
+                 heartbeat_timeout: float = 60.0):
+        self.rag_service = rag_service
+        self.store = store
+        self.workers = workers
+        self.upload_dir = upload_dir
+        self.progress_interval = progress_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        # Stable across a restart of the same process slot: its interrupted jobs are failed at once
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Tâches en cours : état plus récent que celui du store
+        self._active: Dict[str, IngestionJob] = {}
+
+    def new_upload_path(self) -> str:
+        """Chemin où déposer un fichier avant sa mise en file"""
+        return os.path.join(self.upload_dir, f"{uuid.uuid4()}.pdf")
+
+    async def start(self) -> None:
+        """Démarre les workers et reprend les tâches restées en file"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+
+        # Une tâche interrompue en cours de route est marquée en échec ; celles
+        # d'autres processus encore en vie sont laissées à leur propriétaire
+        expired_before = datetime.utcnow() - timedelta(seconds=self.heartbeat_timeout)
+        failed = await self.store.fail_abandoned(self.owner, expired_before)
+        if failed:
+            logger.warning("Marked %d interrupted ingestion jobs as failed", failed)
+        # Every process queues them: the first to claim a job runs it
+        for job in await self.store.list_by_status(["queued"]):
+            if os.path.exists(job.file_path):
+                self._queue.put_nowait(job)
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Arrête les workers"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def submit(self, file_path: str, filename: Optional[str] = None,
+                     clear_existing: bool = False,
+                     document_id: Optional[str] = None,
+                     collection: str = "default") -> IngestionJob:
+        """Enregistre une tâche pour un fichier déjà déposé sur disque"""
+        await self.start()
+        job = IngestionJob(
+            job_id=str(uuid.uuid4()),
+            filename=filename,
+            document_id=document_id,
+            collection=collection,
+            file_path=file_path,
+            clear_existing=clear_existing
+        )
+        await self.store.save(job)
+        self._queue.put_nowait(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[IngestionJob]:
+        """État courant d'une tâche"""
+        if job_id in self._active:
+            return self._active[job_id]
+        return await self.store.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception as e:
+                # A store failure must not stop the worker
+                logger.error("Error running ingestion job %s: %s", job.job_id, e)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: IngestionJob) -> None:
+        job.status = "running"
+        job.owner = self.owner
+        job.started_at = job.heartbeat_at = datetime.utcnow()
+        if not await self.store.claim(job):
+            # Already taken by another process
+            return
+        self._active[job.job_id] = job
+
+        def progress(counter: str, increment: int) -> None:
+            # Appelé depuis le pool de threads du RAG
+            setattr(job, counter, getattr(job, counter) + increment)
+
+        reporter = asyncio.create_task(self._report_progress(job))
+        try:
+            await self.rag_service.index_pdf_file(
+                job.file_path,
+                job.clear_existing,
+                progress,
+                document_id=job.document_id,
+                filename=job.filename,
+                collection=job.collection
+            )
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            reporter.cancel()
+            job.finished_at = datetime.utcnow()
+            self._active.pop(job.job_id, None)
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            await self.store.save(job)
+
+    async def _report_progress(self, job: IngestionJob) -> None:
+        """Persiste périodiquement l'avancement d'une tâche, qui sert de signe de vie"""
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            job.heartbeat_at = datetime.utcnow()
+            try:
+                await self.store.save(job)
+            except Exception as e:
+                logger.warning("Error saving the progress of ingestion job %s: %s", job.job_id, e)
@@ -0,0 +1,115 @@
+# services/ingestion_pipeline.py
+"""
+Pipeline d'indexation en flux : embeddings par lots, en parallèle, avec reprise
+"""
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Set
+
+import openai
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.core.log import get_logger
+
+logger = get_logger(__name__)
+
+# Écrit un lot de chunks et leurs embeddings dans le vector store
+BatchWriter = Callable[[List[Document], List[List[float]]], None]
+
+# Erreurs transitoires de l'API d'embeddings justifiant une nouvelle tentative
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)
+
+
+def batched(items: Iterable[Document], size: int) -> Iterator[List[Document]]:
+    """Regroupe un flux de chunks en lots de taille fixe"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class IngestionPipeline:
+    """
+    Calcule les embeddings d'un flux de chunks par lots, avec au plus
+    `concurrency` requêtes simultanées, et écrit chaque lot dès qu'il est prêt.
+
+    La mémoire occupée est bornée par batch_size * concurrency chunks,
+    quelle que soit la taille du document.
+    """
+    def __init__(self,
+                 embeddings: Embeddings,
+                 batch_size: int = 64,
+                 concurrency: int = 4,
+                 max_retries: int = 5,
+                 retry_base_delay: float = 1.0):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+
+    def run(self,
+            chunks: Iterable[Document],
+            write: BatchWriter,
+            progress: Callable[[str, int], None]) -> Dict[str, float]:
+        """
+        Indexe un flux de chunks.
+
+        Returns:
+            Statistiques de l'indexation (chunks, lots, durée, chunks/seconde)
+        """
+        start = time.perf_counter()
+        in_flight: Dict[Future, List[Document]] = {}
+        chunk_count = 0
+        batch_count = 0
+
+        def drain(pending: Set[Future]) -> None:
+            nonlocal chunk_count
+            for future in pending:
+                batch = in_flight.pop(future)
+                write(batch, future.result())
+                chunk_count += len(batch)
+                progress("chunks_embedded", len(batch))
+
+        try:
+            for batch in batched(chunks, self.batch_size):
+                if len(in_flight) >= self.concurrency:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    drain(done)
+                texts = [doc.page_content for doc in batch]
+                in_flight[self._executor.submit(self._embed_with_retry, texts)] = batch
+                batch_count += 1
+            drain(set(wait(in_flight).done))
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+        elapsed = time.perf_counter() - start
+        return {
+            "chunks": chunk_count,
+            "batches": batch_count,
+            "seconds": elapsed,
+            "chunks_per_second": chunk_count / elapsed if elapsed else 0.0,
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings d'un lot, avec backoff exponentiel sur les limites de débit"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_base_delay * (2 ** attempt) * (1 + random.random())
+                logger.warning("Embedding batch failed (%s), retrying in %.1fs", e.__class__.__name__, delay)
+                time.sleep(delay)
@@ -1,44 +1,90 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from app.services.memory import InMemoryHistory
+from app.services.admission import AdmissionController
+from app.services.memory import SessionStore, build_session_store
+import httpx
 import os
-from typing import AsyncGenerator, List, Dict, Optional, Any
-from app.services.mongo_service import MongoService, mongo_service
+from typing import AsyncGenerator, AsyncIterator, Awaitable, List, Dict, Optional, Any, Tuple, TypeVar
+from app.services.mongo_service import MongoService
 import asyncio
+import contextlib
+import functools
+import logging
+import time
 from app.services.rag_service import RAGService
+from app.services.response_cache import ResponseCache
+from app.services.retrieval import pack_context
+from app.services.streaming import StreamEvent
+from app.services.providers import build_chat_model
+from app.services.history_manager import HistoryManager, TokenCounter
+from app.core.config import settings
+from app.core.log import get_logger
+from app.core.metrics import CACHE_LOOKUPS, REQUESTS, TOKENS, record, span, trace
+
+T = TypeVar("T")
+
+logger = get_logger(__name__)
 
 
 class LLMService:
     """
     Service LLM unifié supportant à la fois les fonctionnalités du TP1 et du TP2
     """
-    def __init__(self):
-        self.rag_service = RAGService()
-        
+    def __init__(self,
+                 mongo_service: MongoService,
+                 rag_service: RAGService,
+                 http_client: Optional[httpx.Client] = None,
+                 http_async_client: Optional[httpx.AsyncClient] = None,
+                 session_store: Optional[SessionStore] = None):
+        """
+        Args:
+            mongo_service: Service MongoDB partagé
+            rag_service: Service RAG partagé
+            http_client, http_async_client: Clients HTTP (keep-alive) partagés
+                pour les appels à l'API OpenAI
+            session_store: Stockage des historiques de session (par défaut selon la configuration)
+        """
+        self.rag_service = rag_service
         self.mongo_service = mongo_service
-        # Send a ping to confirm a successful connection to MongoDB
-        try:
-            self.mongo_service.client.admin.command('ping')
-            print("Pinged your deployment. You successfully connected to MongoDB!")
-        except Exception as e:
-            print(e)
 
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY n'est pas définie")
-        
-        # Configuration commune
-        self.llm = ChatOpenAI(
+        # Configuration commune (fournisseur selon LLM_PROVIDER)
+        self.llm = build_chat_model(
+            settings.llm_model,
             temperature=0.7,
-            model_name="gpt-4o",
-            api_key=api_key,
-            streaming=True
+            streaming=True,
+            http_client=http_client,
+            http_async_client=http_async_client
         )
         
-        self.conversation_store = {}
+        # Historiques de session bornés (LRU/TTL) ou partagés entre workers
+        self.conversation_store = session_store or build_session_store(mongo_service)
+
+        # Écritures MongoDB en arrière-plan, par session (la dernière en cours)
+        self._pending_writes: Dict[str, asyncio.Task] = {}
+
+        # Cache des réponses aux questions répétées
+        self.response_cache = ResponseCache(
+            max_size=settings.response_cache_size,
+            ttl=settings.response_cache_ttl,
+            semantic_threshold=settings.response_cache_semantic_threshold
+        )
+
+        # Historique borné en tokens ; les anciens tours sont résumés en arrière-plan
+        self.token_counter = TokenCounter(settings.llm_model)
+        self.history_manager = HistoryManager(
+            self.mongo_service,
+            build_chat_model(
+                settings.summary_model,
+                temperature=0,
+                http_client=http_client,
+                http_async_client=http_async_client
+            ),
+            self.token_counter,
+            token_budget=settings.history_token_budget,
+            summary_min_messages=settings.history_summary_min_messages
+        )
         
         self.prompt = ChatPromptTemplate.from_messages([
             (
@@ -71,9 +117,7 @@ class LLMService:
     
     def _get_session_history(self, session_id: str) -> BaseChatMessageHistory:
         """Récupère l'historique d'une session"""
-        if session_id not in self.conversation_store:
-            self.conversation_store[session_id] = InMemoryHistory()
-        return self.conversation_store[session_id]
+        return self.conversation_store.get(session_id)
     
     async def generate_response(self, 
                                 message: str, 
@@ -86,23 +130,14 @@ class LLMService:
         """
         # Build a RAG context if requested
         rag_context = ""
-        if use_rag and self.rag_service.vector_store:
-            # similarity_search now returns a list of dict with text + metadata
-            relevant_docs = await self.rag_service.similarity_search(message)
-            rag_context_parts = []
-            for d in relevant_docs:
-                chunk_text = d["text"]
-                page_num = d["metadata"].get("page", "??")
-                print(f"Metadata: {d['metadata']}")
-                print(page_num)
-                print(chunk_text)
-                # Combine chunk text with a source reference
-                rag_context_parts.append(f"{chunk_text}\n(Source: page {page_num})")
-            rag_context = "\n\n".join(rag_context_parts)
+        if use_rag and self.rag_service.has_documents():
+            _, rag_context = await self._build_context(message)
         
         # Reconstruct the conversation so far from Mongo
         history_messages = []
-        mongo_history = await self.mongo_service.get_conversation_history(session_id)
+        mongo_history = await self.mongo_service.get_conversation_history(
+            session_id, limit=settings.history_max_messages
+        )
         for msg in mongo_history:
             role = msg.get("role")
             content = msg.get("content")
@@ -128,11 +163,11 @@ class LLMService:
         # Save user and assistant messages to Mongo
         try:
             await self.mongo_service.save_message(session_id, "user", message)
-            print(f"Message saved: {message}")
+            logger.debug("Message saved: %s", message)
             await self.mongo_service.save_message(session_id, "assistant", response_text)
-            print(f"Assistant response saved: {response_text}")
+            logger.debug("Assistant response saved: %s", response_text)
         except Exception as e:
-            print(f"Exception Raised: {e}")
+            logger.error("Error saving messages for session %s: %s", session_id, e)
           
         return response_text
             
@@ -140,9 +175,13 @@ class LLMService:
         """Récupère l'historique depuis MongoDB"""
         return await self.mongo_service.get_conversation_history(session_id)
     
-    async def get_all_sessions(self) -> List[str]:
-        """Récupère tous les IDs de session depuis MongoDB"""
-        return await self.mongo_service.get_all_sessions()
+    async def get_history_page(self, session_id: str, limit: int, cursor: Optional[str] = None) -> Dict:
+        """Page de l'historique depuis MongoDB (les messages les plus récents d'abord)"""
+        return await self.mongo_service.get_history_page(session_id, limit, cursor)
+
+    async def list_sessions(self, limit: int, cursor: Optional[str] = None) -> Dict:
+        """Page des sessions depuis MongoDB, par activité récente"""
+        return await self.mongo_service.list_sessions(limit, cursor)
     
     async def create_session(self) -> str:
         """Create a new conversation session without initial message"""
@@ -150,7 +189,7 @@ class LLMService:
         session_id = str(uuid.uuid4())
         
         # Initialize empty history
-        self.conversation_store[session_id] = InMemoryHistory()
+        await self.conversation_store.create(session_id)
         
         # Create empty conversation document in MongoDB
         await self.mongo_service.create_empty_session(session_id)
@@ -160,8 +199,7 @@ class LLMService:
     async def delete_session(self, session_id: str) -> bool:
         """Delete a conversation session and its history"""
         # Delete from memory store
-        if session_id in self.conversation_store:
-            del self.conversation_store[session_id]
+        await self.conversation_store.delete(session_id)
         
         # Delete from MongoDB
         return await self.mongo_service.delete_conversation(session_id)
@@ -176,71 +214,360 @@ class LLMService:
         mongo_success = await self.mongo_service.rename_session(old_session_id, new_session_id)
         
         # Update in-memory store
-        if old_session_id in self.conversation_store:
-            self.conversation_store[new_session_id] = self.conversation_store.pop(old_session_id)
+        await self.conversation_store.rename(old_session_id, new_session_id)
         
         return mongo_success
     
     async def stream_response(self, message: str, session_id: str) -> AsyncGenerator[str, None]:
-        """Stream response from LLM with RAG context"""
-        full_response = ""
-        # Save user message first
-        await self.mongo_service.save_message(session_id, "user", message)
-        print(f"User message saved: {message}")
+        """Stream response from LLM with RAG context (plain text)"""
+        async for event, data in self.stream_events(message, session_id):
+            if event == "token":
+                yield data
+            elif event == "error":
+                yield f"\n\nError: {data['message']}"
 
-        rag_context = ""
-        if self.rag_service.vector_store:
-            # similarity_search now returns a list of dict with text + metadata
-            relevant_docs = await self.rag_service.similarity_search(message)
-            rag_context_parts = []
-            for d in relevant_docs:
-                chunk_text = d["text"]
-                page_num = d["metadata"].get("page", "??")
-                print(f"Metadata: {d['metadata']}")
-                print(page_num)
-                print(chunk_text)
-                # Combine chunk text with a source reference
-                rag_context_parts.append(f"{chunk_text}\n(Source: page {page_num})")
-            rag_context = "\n\n".join(rag_context_parts)
+    async def stream_events(self,
+                            message: str,
+                            session_id: str,
+                            collections: Optional[List[str]] = None,
+                            nprobe: Optional[int] = None) -> AsyncGenerator[StreamEvent, None]:
+        """
+        Réponse en flux d'événements : "sources" (chunks du contexte), "token"
+        (texte généré), puis "done" ou "error". Le contexte est cherché dans
+        `collections` (par défaut la collection par défaut) ; `nprobe` règle la
+        recherche approximative (voir RAGService.similarity_search).
 
-        # Reconstruct the conversation so far from Mongo
-        history_messages = []
-        mongo_history = await self.mongo_service.get_conversation_history(session_id)
-        for msg in mongo_history:
-            role = msg.get("role")
-            content = msg.get("content")
-            if role == "user":
-                history_messages.append(HumanMessage(content=content))
-            elif role == "assistant":
-                history_messages.append(AIMessage(content=content))
+        Si le flux est fermé avant la fin (client déconnecté), l'appel au LLM
+        est interrompu et la réponse partielle n'est ni enregistrée ni mise en cache.
+        La durée de chaque étape est mesurée (métriques et trace de la requête).
+        """
+        outcome = "cancelled"
+        start = time.perf_counter()
+        with trace() as stages:
+            try:
+                # The previous answer of this session must be stored before the new question
+                await self._wait_for_pending_write(session_id)
 
-        # Add the new user message to the local (in-process) history
-        history_messages.append(HumanMessage(content=message))
-        
-        # Create streaming version of the chain
-        chain = self.prompt | self.llm
+                # Composition lookups ("calories pour 100 g de X") are answered from the
+                # nutrient tables extracted at ingestion, without retrieval nor LLM call
+                if settings.answer_cards:
+                    with span("answer_card"):
+                        card = await self.rag_service.answer_card(message, collections)
+                    CACHE_LOOKUPS.inc(cache="answer_card", result="miss" if card is None else "hit")
+                    if card is not None:
+                        await self._timed("history", self.mongo_service.append_message_and_get_history(
+                            session_id, "user", message, limit=1
+                        ))
+                        yield "sources", [{"id": None, "document_id": card["document_id"], "page": card["page"]}]
+                        self._save_in_background(session_id, "assistant", card["text"])
+                        record("ttft", time.perf_counter() - start)
+                        yield "token", card["text"]
+                        outcome = "card"
+                        yield "done", {"cached": False, "card": True}
+                        return
+
+                # Independent I/O runs concurrently: saving the user message (which also
+                # reads the recent history in the same round-trip) and retrieval
+                has_documents = self.rag_service.has_documents(collections)
+                context_step = self._build_context(message, collections, nprobe) if has_documents else self._no_context()
+                versions = self.rag_service.collection_versions(collections)
+                conversation, (relevant_docs, rag_context) = await asyncio.gather(
+                    self._timed("history", self.mongo_service.append_message_and_get_history(
+                        session_id, "user", message, limit=settings.history_max_messages + 1
+                    )),
+                    context_step
+                )
+                logger.debug("User message saved for session %s: %s", session_id, message)
+                yield "sources", [self._source(d) for d in relevant_docs]
+
+                # Recent turns within the token budget, preceded by the rolling summary;
+                # the new user message is passed separately as the question. The prompt
+                # build time (window and formatting) is recorded once per request
+                prompt_start = time.perf_counter()
+                history_messages, history_tokens = self.history_manager.build_window(session_id, conversation)
+                prompt_seconds = time.perf_counter() - prompt_start
 
+                # Repeated questions are answered from the response cache, unless the
+                # question refers to earlier turns of the conversation
+                chunk_ids = [d["id"] for d in relevant_docs]
+                query_embedding = None
+                cacheable = not self.response_cache.is_context_dependent(message, bool(history_messages))
+                if not cacheable:
+                    self.response_cache.record_bypass()
+                    CACHE_LOOKUPS.inc(cache="response", result="bypass")
+                else:
+                    if (self.response_cache.semantic_threshold > 0 and has_documents
+                            and settings.retrieval_mode != "lexical"):
+                        try:
+                            query_embedding = await self.rag_service.embed_query(message)
+                        except Exception as e:
+                            # Exact-match lookup only when the embeddings API is unavailable
+                            logger.warning("Query embedding unavailable for the response cache: %s", e)
+                    cached_answer = self.response_cache.get(
+                        message, chunk_ids, versions, query_embedding
+                    )
+                    CACHE_LOOKUPS.inc(cache="response", result="miss" if cached_answer is None else "hit")
+                    if cached_answer is not None:
+                        self._save_in_background(session_id, "assistant", cached_answer)
+                        logger.debug("Assistant response served from cache: %s", cached_answer)
+                        record("ttft", time.perf_counter() - start)
+                        yield "token", cached_answer
+                        outcome = "cached"
+                        yield "done", {"cached": True}
+                        return
+
+                prompt_start = time.perf_counter()
+                prompt_inputs = {
+                    "question": message,
+                    "context": rag_context,
+                    "history": history_messages
+                }
+                prompt_tokens = self.token_counter.count_messages(self.prompt.format_messages(**prompt_inputs))
+                record("prompt_build", prompt_seconds + time.perf_counter() - prompt_start)
+                TOKENS.inc(prompt_tokens, direction="in")
+                logger.info(
+                    "Prompt tokens: %d (history: %d, %d messages)",
+                    prompt_tokens, history_tokens, len(history_messages)
+                )
+
+                # Stream response chunks
+                parts = []
+                generation_start = time.perf_counter()
+                async for chunk in (self.prompt | self.llm).astream(prompt_inputs):
+                    if isinstance(chunk, AIMessage) and chunk.content:
+                        if not parts:
+                            record("ttft", time.perf_counter() - start)
+                        parts.append(chunk.content)
+                        yield "token", chunk.content
+                record("generation", time.perf_counter() - generation_start)
+                full_response = "".join(parts)
+                TOKENS.inc(self.token_counter.count(full_response), direction="out")
+
+                # Save complete assistant response after streaming finishes, off the response path
+                self._save_in_background(session_id, "assistant", full_response)
+
+                if cacheable:
+                    self.response_cache.put(
+                        message, chunk_ids, versions, full_response, query_embedding
+                    )
+                outcome = "done"
+                yield "done", {"cached": False}
+
+            except Exception as e:
+                outcome = "error"
+                logger.error("Error streaming response for session %s: %s", session_id, e)
+                error = {"message": str(e)}
+                if getattr(e, "status_code", None) == 429:
+                    # Provider rate limit, used by the admission controller to back off
+                    error["status"] = 429
+                yield "error", error
+            finally:
+                REQUESTS.inc(outcome=outcome)
+                logger.info(
+                    "Request %s in %.0f ms: %s", outcome, (time.perf_counter() - start) * 1000,
+                    ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in stages.items())
+                )
+
+    async def answer_batch(self,
+                           questions: List[str],
+                           collections: Optional[List[str]] = None,
+                           nprobe: Optional[int] = None,
+                           dry_run: bool = False,
+                           concurrency: Optional[int] = None,
+                           admission: Optional[AdmissionController] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Réponses à un lot de questions indépendantes (sans historique ni
+        session), rendues dans leur ordre d'achèvement.
+
+        Les questions sont traitées par tranches de BATCH_RETRIEVAL_SIZE : un
+        seul appel d'embeddings et une requête vectorielle par lots par tranche
+        (RAGService.retrieve_many), puis au plus `concurrency` générations
+        simultanées (BATCH_CONCURRENCY au plus). La tranche suivante n'est
+        recherchée que lorsque des places de génération se libèrent.
+        Les questions de composition sont servies par les tables nutritionnelles.
+
+        Args:
+            dry_run: Recherche seulement, sans génération (débit de la recherche)
+            admission: Contrôleur d'admission partagé avec /chat/rag ; chaque
+                génération y prend une place, en file avec les requêtes de chat
+
+        Yields:
+            {"index", "question", "answer", "sources", "card", "seconds"}, ou
+            {"index", "question", "error"} pour une question en échec
+        """
+        limit = max(1, settings.batch_concurrency)
+        slots = asyncio.Semaphore(max(1, min(concurrency or limit, limit)))
+        results: asyncio.Queue = asyncio.Queue()
+        has_documents = self.rag_service.has_documents(collections)
+
+        async def answer(index: int, question: str, candidates: List[dict], start: float) -> None:
+            try:
+                relevant_docs, rag_context = self._pack_context(candidates)
+                result = {
+                    "index": index,
+                    "question": question,
+                    "answer": None,
+                    "sources": [self._source(d) for d in relevant_docs],
+                    "card": False,
+                }
+                if not dry_run:
+                    prompt_inputs = {"question": question, "context": rag_context, "history": []}
+                    TOKENS.inc(
+                        self.token_counter.count_messages(self.prompt.format_messages(**prompt_inputs)),
+                        direction="in"
+                    )
+                    async with admission.slot() if admission is not None else contextlib.nullcontext():
+                        response = await (self.prompt | self.llm).ainvoke(prompt_inputs)
+                    result["answer"] = response.content
+                    TOKENS.inc(self.token_counter.count(response.content), direction="out")
+                result["seconds"] = time.perf_counter() - start
+                results.put_nowait(result)
+            except Exception as e:
+                logger.error("Error answering batch question %d: %s", index, e)
+                results.put_nowait({"index": index, "question": question, "error": str(e)})
+            finally:
+                slots.release()
+
+        async def produce() -> None:
+            tasks = []
+            size = max(1, settings.batch_retrieval_size)
+            try:
+                for offset in range(0, len(questions), size):
+                    start = time.perf_counter()
+                    pending = list(enumerate(questions[offset:offset + size], start=offset))
+                    if settings.answer_cards and not dry_run and has_documents:
+                        cards = await asyncio.gather(
+                            *(self.rag_service.answer_card(question, collections) for _, question in pending),
+                            return_exceptions=True
+                        )
+                        # A failed lookup falls back to retrieval and generation
+                        cards = [card if isinstance(card, dict) else None for card in cards]
+                        CACHE_LOOKUPS.inc(sum(card is not None for card in cards), cache="answer_card", result="hit")
+                        CACHE_LOOKUPS.inc(sum(card is None for card in cards), cache="answer_card", result="miss")
+                        for (index, question), card in zip(pending, cards):
+                            if card is not None:
+                                results.put_nowait({
+                                    "index": index,
+                                    "question": question,
+                                    "answer": card["text"],
+                                    "sources": [{"id": None, "document_id": card["document_id"], "page": card["page"]}],
+                                    "card": True,
+                                    "seconds": time.perf_counter() - start,
+                                })
+                        pending = [item for item, card in zip(pending, cards) if card is None]
+                    if not pending:
+                        continue
+
+                    try:
+                        with span("retrieval"):
+                            retrieved = await self.rag_service.retrieve_many(
+                                [question for _, question in pending], collections=collections, nprobe=nprobe
+                            ) if has_documents else [[] for _ in pending]
+                    except Exception as e:
+                        logger.error("Error retrieving batch questions %d-%d: %s", offset, offset + size - 1, e)
+                        for index, question in pending:
+                            results.put_nowait({"index": index, "question": question, "error": str(e)})
+                        continue
+                    for (index, question), candidates in zip(pending, retrieved):
+                        await slots.acquire()
+                        tasks.append(asyncio.create_task(answer(index, question, candidates, start)))
+                await asyncio.gather(*tasks)
+            finally:
+                # Cancelled by the consumer: generations still running are stopped too
+                for task in tasks:
+                    task.cancel()
+
+        producer = asyncio.create_task(produce())
+        producer.add_done_callback(lambda _: results.put_nowait(None))
         try:
-        
-            
-            # Stream response chunks
-            async for chunk in chain.astream({
-                "question": message,
-                "context": rag_context,
-                "history": history_messages
-            }):
-                if isinstance(chunk, AIMessage):
-                    full_response += chunk.content
-                    yield chunk.content
-                    await asyncio.sleep(0.01)  # Smooth streaming
-
-            # Save complete assistant response after streaming finishes
-            await self.mongo_service.save_message(session_id, "assistant", full_response)
-            print(f"Assistant response saved: {full_response}")
-            
-        except Exception as e:
-            yield f"\n\nError: {str(e)}"
+            while (result := await results.get()) is not None:
+                yield result
+            # Surfaces an unexpected error of the producer
+            await producer
+        finally:
+            # The consumer went away: pending retrieval and generations are cancelled
+            producer.cancel()
 
-            
+    @staticmethod
+    async def _timed(stage: str, awaitable: Awaitable[T]) -> T:
+        with span(stage):
+            return await awaitable
+
+    @staticmethod
+    def _source(chunk: dict) -> Dict[str, Any]:
+        """Référence d'un chunk du contexte, envoyée au client avant la réponse"""
+        return {
+            "id": chunk["id"],
+            "document_id": chunk["metadata"].get("document_id"),
+            "page": chunk["metadata"].get("page"),
+        }
+
+    def _save_in_background(self, session_id: str, role: str, content: str) -> None:
+        """Enregistre un message sans attendre MongoDB ; les erreurs sont signalées"""
+        task = asyncio.create_task(self._timed("mongo_write", self.mongo_service.save_message(session_id, role, content)))
+        self._pending_writes[session_id] = task
+        task.add_done_callback(functools.partial(self._on_write_done, session_id))
+
+    def _on_write_done(self, session_id: str, task: asyncio.Task) -> None:
+        if self._pending_writes.get(session_id) is task:
+            del self._pending_writes[session_id]
+        if task.cancelled():
+            logger.warning("Message write cancelled for session %s", session_id)
+        elif task.exception() is not None:
+            logger.error("Error saving message for session %s: %s", session_id, task.exception())
+        else:
+            logger.debug("Message saved in background for session %s", session_id)
+
+    async def _wait_for_pending_write(self, session_id: str) -> None:
+        task = self._pending_writes.get(session_id)
+        if task is not None:
+            # Errors are reported by the done callback
+            await asyncio.wait([task])
+
+    async def close(self) -> None:
+        """Attend la fin des écritures en arrière-plan"""
+        if self._pending_writes:
+            await asyncio.wait(list(self._pending_writes.values()))
+
+    @staticmethod
+    async def _no_context() -> Tuple[List[dict], str]:
+        return [], ""
+
+    async def _build_context(self,
+                             message: str,
+                             collections: Optional[List[str]] = None,
+                             nprobe: Optional[int] = None) -> Tuple[List[dict], str]:
+        """
+        Chunks retenus pour la question et texte du contexte, borné à
+        CONTEXT_TOKEN_BUDGET tokens
+        """
+        # Packing the context is part of the retrieval stage
+        with span("retrieval"):
+            candidates = await self.rag_service.retrieve(message, collections=collections, nprobe=nprobe)
+            return self._pack_context(candidates)
+
+    def _pack_context(self, candidates: List[dict]) -> Tuple[List[dict], str]:
+        relevant_docs, rag_context = pack_context(
+            candidates,
+            self._format_chunk,
+            self.token_counter.count,
+            settings.context_token_budget
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            pages = [d["metadata"].get("page", "??") for d in relevant_docs]
+            logger.debug("Context: %d/%d chunks (pages %s)", len(relevant_docs), len(candidates), pages)
+        return relevant_docs, rag_context
+
+    @staticmethod
+    def _format_chunk(chunk: dict) -> str:
+        # Combine chunk text with a source reference
+        return f"{chunk['text']}\n(Source: page {chunk['metadata'].get('page', '??')})"
 
-        
\ No newline at end of file
+    async def get_cache_stats(self) -> Dict[str, Dict]:
+        """Statistiques des caches, des historiques et des collections en mémoire"""
+        return {
+            "embedding_cache": self.rag_service.embedding_cache.stats(),
+            "collections": self.rag_service.collections.stats(),
+            "response_cache": self.response_cache.stats(),
+            "session_store": await self.conversation_store.stats(),
+        }
@@ -2,22 +2,307 @@
 """
 Gestion de la mémoire des conversations
 """
+import functools
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.messages import BaseMessage
-from typing import List
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from app.core.config import settings
+from app.services.mongo_service import MongoService
+
+_MESSAGE_TYPES = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+
+
+class CompactMessage:
+    """Message stocké sous forme compacte (rôle + contenu)"""
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+    @classmethod
+    def from_message(cls, message: BaseMessage) -> "CompactMessage":
+        return cls(message.type, str(message.content))
+
+    def to_message(self) -> BaseMessage:
+        return _MESSAGE_TYPES.get(self.role, HumanMessage)(content=self.content)
+
+    def size_bytes(self) -> int:
+        """Empreinte mémoire approximative du message"""
+        return sys.getsizeof(self) + sys.getsizeof(self.content)
+
 
 class InMemoryHistory(BaseChatMessageHistory):
     """
     Implémentation simple du stockage en mémoire de l'historique des conversations.
-    Pour un environnement de production, considérer une solution persistante comme Redis.
+    Les messages sont conservés sous forme compacte et leur taille est suivie ;
+    `on_resize` reçoit chaque variation de taille (en octets).
     """
-    def __init__(self):
-        self.messages: List[BaseMessage] = []
-    
-    def add_messages(self, messages: List[BaseMessage]) -> None:
+    def __init__(self, on_resize: Optional[Callable[[int], None]] = None):
+        self._records: List[CompactMessage] = []
+        self.size_bytes = 0
+        self.on_resize = on_resize
+
+    def _resized(self, delta: int) -> None:
+        if delta and self.on_resize is not None:
+            self.on_resize(delta)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return [record.to_message() for record in self._records]
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
         """Ajoute une série de messages à l'historique"""
-        self.messages.extend(messages)
-    
+        added = 0
+        for message in messages:
+            record = CompactMessage.from_message(message)
+            self._records.append(record)
+            added += record.size_bytes()
+        self.size_bytes += added
+        self._resized(added)
+
     def clear(self) -> None:
         """Réinitialise l'historique de la conversation"""
-        self.messages = []
\ No newline at end of file
+        removed = self.size_bytes
+        self._records = []
+        self.size_bytes = 0
+        self._resized(-removed)
+
+    # In-process history: the async variants do not need a thread
+    async def aget_messages(self) -> List[BaseMessage]:
+        return self.messages
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.add_messages(messages)
+
+    async def aclear(self) -> None:
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+class SessionStore(ABC):
+    """Stockage des historiques de session"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> BaseChatMessageHistory:
+        """Historique d'une session, créé s'il n'existe pas (sans accès au stockage)"""
+
+    async def create(self, session_id: str) -> BaseChatMessageHistory:
+        """Crée un historique vide pour une session"""
+        history = self.get(session_id)
+        await history.aclear()
+        return history
+
+    async def ensure_indexes(self) -> None:
+        """Prépare le stockage au démarrage"""
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def rename(self, old_session_id: str, new_session_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, float]:
+        ...
+
+
+class LRUSessionStore(SessionStore):
+    """
+    Historiques en mémoire du processus, bornés en nombre de sessions et en
+    octets ; les sessions inactives depuis plus de `ttl` secondes sont évincées.
+    La taille totale est tenue à jour à chaque ajout de message.
+    """
+    def __init__(self, max_sessions: int = 1000, ttl: float = 3600.0, max_bytes: int = 64 * 1024 * 1024):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+
+        self._sessions: "OrderedDict[str, InMemoryHistory]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+    def get(self, session_id: str) -> InMemoryHistory:
+        now = time.monotonic()
+        with self._lock:
+            history = self._sessions.get(session_id)
+            if history is None or now - self._last_access[session_id] > self.ttl:
+                if history is not None:
+                    self._untrack(history)
+                history = InMemoryHistory()
+                history.on_resize = functools.partial(self._resized, history)
+                self._sessions[session_id] = history
+            self._sessions.move_to_end(session_id)
+            self._last_access[session_id] = now
+            self._evict(now)
+            return history
+
+    async def delete(self, session_id: str) -> None:
+        with self._lock:
+            history = self._sessions.pop(session_id, None)
+            if history is not None:
+                self._untrack(history)
+            self._last_access.pop(session_id, None)
+
+    async def rename(self, old_session_id: str, new_session_id: str) -> None:
+        with self._lock:
+            if old_session_id in self._sessions:
+                self._sessions[new_session_id] = self._sessions.pop(old_session_id)
+                self._last_access[new_session_id] = self._last_access.pop(old_session_id)
+
+    def _resized(self, history: InMemoryHistory, delta: int) -> None:
+        with self._lock:
+            # An evicted or deleted history no longer counts
+            if history.on_resize is not None:
+                self._bytes += delta
+
+    def _untrack(self, history: InMemoryHistory) -> None:
+        """Retire un historique du total (sous le verrou)"""
+        history.on_resize = None
+        self._bytes -= history.size_bytes
+
+    def _evict(self, now: float) -> None:
+        """Évince les sessions expirées puis les moins récemment utilisées"""
+        # Les sessions les plus anciennes sont en tête ; la plus récente est conservée
+        while len(self._sessions) > 1:
+            session_id = next(iter(self._sessions))
+            expired = now - self._last_access[session_id] > self.ttl
+            if not expired and len(self._sessions) <= self.max_sessions and self._bytes <= self.max_bytes:
+                break
+            self._untrack(self._sessions.popitem(last=False)[1])
+            del self._last_access[session_id]
+            self.evictions += 1
+
+    async def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "messages": sum(len(history) for history in self._sessions.values()),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+class MongoHistory(BaseChatMessageHistory):
+    """
+    Historique d'une session stocké dans une collection MongoDB partagée (Motor).
+    Les variantes asynchrones sont celles utilisées par l'application ; les
+    méthodes synchrones passent par la collection pymongo sous-jacente du même
+    client, pour les appels hors de la boucle asyncio.
+    """
+    def __init__(self, collection, session_id: str, max_messages: int):
+        self.collection = collection
+        self.session_id = session_id
+        self.max_messages = max_messages
+
+    @staticmethod
+    def _to_messages(document: Optional[dict]) -> List[BaseMessage]:
+        records = document.get("messages", []) if document else []
+        return [CompactMessage(r["role"], r["content"]).to_message() for r in records]
+
+    def _push(self, messages: Sequence[BaseMessage]) -> dict:
+        """Ajout des messages en ne conservant que les `max_messages` derniers"""
+        records = [{"role": m.type, "content": str(m.content)} for m in messages]
+        return {
+            "$push": {"messages": {"$each": records, "$slice": -self.max_messages}},
+            "$set": {"updated_at": datetime.utcnow()}
+        }
+
+    @staticmethod
+    def _reset() -> dict:
+        return {"$set": {"messages": [], "updated_at": datetime.utcnow()}}
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self._to_messages(
+            self.collection.delegate.find_one({"session_id": self.session_id}, {"_id": 0, "messages": 1})
+        )
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        return self._to_messages(
+            await self.collection.find_one({"session_id": self.session_id}, {"_id": 0, "messages": 1})
+        )
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.collection.delegate.update_one({"session_id": self.session_id}, self._push(messages), upsert=True)
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        await self.collection.update_one({"session_id": self.session_id}, self._push(messages), upsert=True)
+
+    def clear(self) -> None:
+        self.collection.delegate.update_one({"session_id": self.session_id}, self._reset(), upsert=True)
+
+    async def aclear(self) -> None:
+        await self.collection.update_one({"session_id": self.session_id}, self._reset(), upsert=True)
+
+
+class MongoSessionStore(SessionStore):
+    """
+    Historiques partagés entre les workers, dans une collection MongoDB
+    du client Motor de l'application.
+
+    Chaque historique est tronqué à `max_messages` et un index TTL supprime
+    les sessions inactives depuis plus de `ttl` secondes.
+    """
+    def __init__(self, collection, ttl: float = 3600.0, max_messages: int = 100):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_messages = max_messages
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("session_id", unique=True)
+        await self.collection.create_index("updated_at", expireAfterSeconds=int(self.ttl))
+
+    def get(self, session_id: str) -> MongoHistory:
+        return MongoHistory(self.collection, session_id, self.max_messages)
+
+    async def delete(self, session_id: str) -> None:
+        await self.collection.delete_one({"session_id": session_id})
+
+    async def rename(self, old_session_id: str, new_session_id: str) -> None:
+        await self.collection.update_one({"session_id": old_session_id}, {"$set": {"session_id": new_session_id}})
+
+    async def stats(self) -> Dict[str, float]:
+        return {
+            "backend": "mongo",
+            "sessions": await self.collection.estimated_document_count(),
+            "max_messages": self.max_messages,
+        }
+
+
+def build_session_store(mongo_service: MongoService) -> SessionStore:
+    """
+    Instancie le stockage des historiques choisi dans la configuration
+    (backend "mongo" : collection `session_histories` du client Motor partagé)
+    """
+    backend = settings.session_store_backend
+    if backend == "memory":
+        return LRUSessionStore(
+            max_sessions=settings.session_store_max_sessions,
+            ttl=settings.session_store_ttl,
+            max_bytes=settings.session_store_max_bytes
+        )
+    if backend == "mongo":
+        return MongoSessionStore(
+            mongo_service.db["session_histories"],
+            ttl=settings.session_store_ttl,
+            max_messages=settings.session_store_max_messages
+        )
+    raise ValueError(f"Unknown session store backend: {backend}")
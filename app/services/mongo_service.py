@@ -1,18 +1,62 @@
+import base64
+import binascii
+import json
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import PyMongoError
 from datetime import datetime
 from typing import Any, List, Dict, Optional
 from app.models.conversation import Conversation, Message
 from app.core.config import settings
-import asyncio
+from app.core.log import get_logger
+
+logger = get_logger(__name__)
+
+# Longueur maximale du titre d'une session (tiré de son premier message)
+TITLE_MAX_CHARS = 60
+
+# Champs renvoyés par la liste des sessions (sans les messages)
+SESSION_FIELDS = {"_id": 1, "session_id": 1, "title": 1, "message_count": 1, "created_at": 1, "updated_at": 1}
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Curseur de pagination opaque"""
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, binascii.Error):
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(position, dict):
+        raise ValueError("Invalid pagination cursor")
+    return position
+
+
+def session_title(content: str) -> str:
+    """Titre d'une session : début de son premier message, sur une ligne"""
+    title = " ".join(content.split())
+    if len(title) > TITLE_MAX_CHARS:
+        title = title[:TITLE_MAX_CHARS - 1].rstrip() + "…"
+    return title
 
 
 class MongoService:
-    def __init__(self):
-        self.client = AsyncIOMotorClient(settings.mongodb_uri)
-        # Add the following to avoid attached to a different loop error
-        self.client.get_io_loop = asyncio.get_event_loop
+    def __init__(self, client: AsyncIOMotorClient):
+        """
+        Args:
+            client: Client Motor partagé, créé au démarrage de l'application
+        """
+        self.client = client
         self.db = self.client[settings.database_name]
         self.conversations = self.db[settings.collection_name]
+
+    async def ping(self) -> None:
+        """Vérifie la connexion à MongoDB (ouvre les connexions du pool)"""
+        await self.client.admin.command("ping")
         
     async def save_message(self, session_id: str, role: str, content: str) -> bool:
         """Sauvegarde un nouveau message dans une conversation"""
@@ -22,7 +66,8 @@ class MongoService:
             {
                 "$push": {"messages": message.model_dump()},
                 "$set": {"updated_at": datetime.utcnow()},
-                "$setOnInsert": {"created_at": datetime.utcnow()}
+                "$setOnInsert": self._on_insert(role, content),
+                "$inc": {"message_count": 1}
             },
             
             upsert=True
@@ -30,29 +75,198 @@ class MongoService:
         
         return result.modified_count > 0 or result.upserted_id is not None
 
+    async def append_message_and_get_history(self,
+                                             session_id: str,
+                                             role: str,
+                                             content: str,
+                                             limit: int) -> Dict:
+        """
+        Ajoute un message et renvoie, en un seul aller-retour atomique, la
+        conversation réduite à ses `limit` derniers messages (message ajouté compris)
+        avec `message_count`, `summary`, `summarized_count` et `title`
+        """
+        message = Message(role=role, content=content)
+        conversation = await self.conversations.find_one_and_update(
+            {"session_id": session_id},
+            {
+                "$push": {"messages": message.model_dump()},
+                "$set": {"updated_at": datetime.utcnow()},
+                "$setOnInsert": self._on_insert(role, content),
+                "$inc": {"message_count": 1}
+            },
+            projection={
+                "_id": 0,
+                "messages": {"$slice": -limit},
+                "message_count": 1,
+                "summary": 1,
+                "summarized_count": 1,
+                "title": 1
+            },
+            return_document=ReturnDocument.AFTER,
+            upsert=True
+        )
+        if role == "user" and not conversation.get("title"):
+            # Session created empty: titled once, by its first question
+            conversation["title"] = session_title(content)
+            await self.conversations.update_one(
+                {"session_id": session_id, "title": {"$in": [None, ""]}},
+                {"$set": {"title": conversation["title"]}}
+            )
+        conversation["messages"] = self._serialize_messages(conversation.get("messages", []))
+        return conversation
+
+    @staticmethod
+    def _on_insert(role: str, content: str) -> Dict[str, Any]:
+        fields = {"created_at": datetime.utcnow()}
+        if role == "user":
+            fields["title"] = session_title(content)
+        return fields
+
+    async def get_messages_range(self, session_id: str, skip: int, limit: int) -> List[Dict]:
+        """Récupère `limit` messages à partir de l'index `skip`"""
+        if limit <= 0:
+            return []
+        conversation = await self.conversations.find_one(
+            {"session_id": session_id},
+            {"_id": 0, "messages": {"$slice": [skip, limit]}}
+        )
+        if conversation:
+            return self._serialize_messages(conversation.get("messages", []))
+        return []
+
+    async def update_summary(self, session_id: str, summary: str,
+                             previous_count: int, summarized_count: int) -> bool:
+        """
+        Enregistre le résumé des `summarized_count` premiers messages, sauf si
+        un autre worker l'a mis à jour entre-temps
+        """
+        filter_ = {"session_id": session_id}
+        if previous_count:
+            filter_["summarized_count"] = previous_count
+        else:
+            filter_["summarized_count"] = {"$in": [0, None]}
+        result = await self.conversations.update_one(
+            filter_,
+            {"$set": {"summary": summary, "summarized_count": summarized_count}}
+        )
+        return result.modified_count > 0
     
-    async def get_conversation_history(self, session_id: str) -> List[Dict]:
-        """Récupère l'historique d'une conversation"""
-        conversation = await self.conversations.find_one({"session_id": session_id})
+    async def get_conversation_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Récupère l'historique d'une conversation (les `limit` derniers messages si précisé)"""
+        projection = {"_id": 0, "messages": 1}
+        if limit is not None:
+            projection["messages"] = {"$slice": -limit}
+        conversation = await self.conversations.find_one({"session_id": session_id}, projection)
         if conversation:
-            messages = conversation.get("messages", [])
-            # Convert datetime objects to strings ISO format, to avoid response validation error
-            for message in messages:
-                if "timestamp" in message and isinstance(message["timestamp"], datetime):
-                    message["timestamp"] = message["timestamp"].isoformat()
-            return messages
+            return self._serialize_messages(conversation.get("messages", []))
         return []
+
+    async def get_history_page(self, session_id: str, limit: int, cursor: Optional[str] = None) -> Dict:
+        """
+        Page de l'historique, du plus récent au plus ancien : les `limit`
+        messages précédant le curseur (les derniers sans curseur), en ordre
+        chronologique. Les messages étant seulement ajoutés en fin de
+        conversation, leur position sert de curseur.
+        """
+        projection = {"_id": 0, "message_count": 1}
+        if cursor is None:
+            projection["messages"] = {"$slice": -limit}
+        else:
+            before = decode_cursor(cursor).get("b")
+            if not isinstance(before, int) or before < 0:
+                raise ValueError("Invalid pagination cursor")
+            start = max(before - limit, 0)
+            # Past the first message: no messages left, only the count is read
+            if before > start:
+                projection["messages"] = {"$slice": [start, before - start]}
+
+        conversation = await self.conversations.find_one({"session_id": session_id}, projection)
+        if not conversation:
+            return {"items": [], "next_cursor": None, "message_count": 0}
+        messages = self._serialize_messages(conversation.get("messages", []))
+        message_count = conversation.get("message_count", len(messages))
+        if cursor is None:
+            start = max(message_count - len(messages), 0)
+        return {
+            "items": messages,
+            "next_cursor": encode_cursor({"b": start}) if start > 0 else None,
+            "message_count": message_count,
+        }
+
+    @staticmethod
+    def _serialize_messages(messages: List[Dict]) -> List[Dict]:
+        """Convert datetime objects to strings ISO format, to avoid response validation error"""
+        for message in messages:
+            if "timestamp" in message and isinstance(message["timestamp"], datetime):
+                message["timestamp"] = message["timestamp"].isoformat()
+        return messages
+
+    async def ensure_indexes(self) -> None:
+        """Crée les index nécessaires et complète les documents antérieurs"""
+        try:
+            await self.conversations.create_index("session_id", unique=True)
+            # Liste des sessions par activité récente (pagination par curseur)
+            await self.conversations.create_index([("updated_at", DESCENDING), ("_id", DESCENDING)])
+            # Compteur de messages pour les conversations créées avant son introduction
+            await self.conversations.update_many(
+                {"message_count": {"$exists": False}},
+                [{"$set": {"message_count": {"$size": {"$ifNull": ["$messages", []]}}}}]
+            )
+            # Date d'activité et titre des conversations créées avant leur introduction
+            await self.conversations.update_many(
+                {"updated_at": {"$exists": False}},
+                [{"$set": {"updated_at": {"$ifNull": ["$created_at", datetime.utcnow()]}}}]
+            )
+            await self.conversations.update_many(
+                {"title": {"$exists": False}, "messages.role": "user"},
+                [{"$set": {"title": {"$let": {
+                    "vars": {"first": {"$arrayElemAt": [
+                        {"$filter": {"input": "$messages", "cond": {"$eq": ["$$this.role", "user"]}}}, 0
+                    ]}},
+                    "in": {"$substrCP": ["$$first.content", 0, TITLE_MAX_CHARS]}
+                }}}}]
+            )
+        except PyMongoError as e:
+            logger.error("Error creating MongoDB indexes: %s", e)
     
     async def delete_conversation(self, session_id: str) -> bool:
         """Supprime une conversation"""
         result = await self.conversations.delete_one({"session_id": session_id})
         return result.deleted_count > 0
     
-    async def get_all_sessions(self) -> List[str]:
-        """Récupère tous les IDs de session"""
-        cursor = self.conversations.find({}, {"session_id": 1})
-        sessions = await cursor.to_list(length=None)
-        return [session["session_id"] for session in sessions]
+    async def list_sessions(self, limit: int, cursor: Optional[str] = None) -> Dict:
+        """
+        Page des sessions, de la plus récemment active à la plus ancienne,
+        avec leurs métadonnées (sans les messages). Le curseur est la position
+        (updated_at, _id) de la dernière session de la page précédente.
+        """
+        filter_: Dict[str, Any] = {}
+        if cursor is not None:
+            position = decode_cursor(cursor)
+            try:
+                updated_at = datetime.fromisoformat(position["u"])
+                last_id = ObjectId(position["i"])
+            except (KeyError, TypeError, ValueError, InvalidId):
+                raise ValueError("Invalid pagination cursor")
+            filter_ = {"$or": [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "_id": {"$lt": last_id}},
+            ]}
+
+        # One extra document tells whether there is a next page
+        sessions = await self.conversations.find(filter_, SESSION_FIELDS) \
+            .sort([("updated_at", DESCENDING), ("_id", DESCENDING)]) \
+            .limit(limit + 1) \
+            .to_list(length=limit + 1)
+        next_cursor = None
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            last = sessions[-1]
+            next_cursor = encode_cursor({"u": last["updated_at"].isoformat(), "i": str(last["_id"])})
+        for session in sessions:
+            del session["_id"]
+            session.setdefault("message_count", 0)
+        return {"items": sessions, "next_cursor": next_cursor}
     
     async def create_empty_session(self, session_id: str) -> bool:
         """Create an empty session document"""
@@ -62,7 +276,8 @@ class MongoService:
                 "$set": {
                     "created_at": datetime.utcnow(),
                     "updated_at": datetime.utcnow(),
-                    "messages": []
+                    "messages": [],
+                    "message_count": 0
                 }
             },
             upsert=True
@@ -75,7 +290,4 @@ class MongoService:
             {"session_id": old_session_id},
             {"$set": {"session_id": new_session_id}}
         )
-        return result.modified_count > 0
-
-# Singleton
-mongo_service = MongoService()
\ No newline at end of file
+        return result.modified_count > 0
\ No newline at end of file
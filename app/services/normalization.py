@@ -0,0 +1,24 @@
+# services/normalization.py
+"""
+Normalisation du texte des questions utilisateur
+"""
+import re
+import unicodedata
+
+# Ligatures non décomposées par NFKD
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae", "ß": "ss"})
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalise une question pour servir de clé de cache :
+    minuscules, sans accents ni ligatures, ponctuation et espaces réduits.
+
+    "Combien de protéines dans un œuf ?" -> "combien de proteines dans un oeuf"
+    """
+    text = text.translate(_LIGATURES)
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _NON_WORD.sub(" ", text.lower())
+    return " ".join(text.split())
@@ -0,0 +1,310 @@
+# services/nutrient_facts.py
+"""
+Tables de composition nutritionnelle extraites des PDF à l'indexation
+
+Les tableaux dont l'en-tête nomme des nutriments (protéines, lipides, énergie…)
+sont enregistrés sous forme de faits (aliment × nutriment, page) dans un fichier
+SQLite par collection. Les questions du type « calories et protéines pour 100 g
+de X » y trouvent une réponse directe, sans recherche ni appel au LLM.
+"""
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.bm25_index import tokenize
+from app.services.normalization import normalize_text
+
+# Nutriment : (libellé, unité par défaut, expressions normalisées qui le désignent)
+NUTRIENTS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "energie_kcal": ("énergie", "kcal", ("valeur energetique", "apport energetique", "energie", "calories",
+                                          "calorie", "kcal")),
+    "energie_kj": ("énergie", "kJ", ("kj",)),
+    "eau": ("eau", "g", ("eau",)),
+    "proteines": ("protéines", "g", ("proteines", "proteine", "protides", "proteins", "protein")),
+    "glucides": ("glucides", "g", ("hydrates de carbone", "glucides", "glucide", "carbohydrates")),
+    "sucres": ("sucres", "g", ("sucres", "sucre", "sugars")),
+    "acides_gras_satures": ("acides gras saturés", "g", ("acides gras satures", "ag satures")),
+    "lipides": ("lipides", "g", ("matieres grasses", "lipides", "lipide", "graisses", "fat")),
+    "fibres": ("fibres", "g", ("fibres alimentaires", "fibres", "fibre", "fiber")),
+    "sel": ("sel", "g", ("sel", "salt")),
+    "sodium": ("sodium", "mg", ("sodium",)),
+    "calcium": ("calcium", "mg", ("calcium",)),
+    "fer": ("fer", "mg", ("fer", "iron")),
+    "magnesium": ("magnésium", "mg", ("magnesium",)),
+    "potassium": ("potassium", "mg", ("potassium",)),
+    "cholesterol": ("cholestérol", "mg", ("cholesterol",)),
+    "vitamine_c": ("vitamine C", "mg", ("vitamine c", "vit c", "vitamin c")),
+}
+
+# Nutriments d'une question sur les « valeurs nutritionnelles » d'un aliment
+MAIN_NUTRIENTS = ("energie_kcal", "proteines", "glucides", "lipides")
+
+# Mots d'une page qui justifient d'y chercher des tableaux (extraction coûteuse)
+TABLE_KEYWORDS = ("proteines", "lipides", "glucides", "kcal", "energie")
+
+# (expression normalisée, nutriment), les plus longues d'abord
+_ALIASES = sorted(
+    ((alias, key) for key, (_, _, aliases) in NUTRIENTS.items() for alias in aliases),
+    key=lambda item: -len(item[0])
+)
+_GENERIC = ("valeurs nutritionnelles", "valeur nutritionnelle", "composition nutritionnelle", "apports nutritionnels")
+_UNIT = re.compile(r"\b(kcal|kj|mg|µg|ug|g)\b", re.IGNORECASE)
+_VALUE = re.compile(r"^(?:[<>≤]\s*)?\d+(?:[.,]\d+)?$|^traces?$", re.IGNORECASE)
+# Reference quantity of a table ("pour 100 g", "100 ml", "/100g")
+_BASIS = re.compile(r"\b100 ?(g|gr|grammes?|ml)\b")
+# Words of a table header or caption giving values per portion
+_PORTION_BASIS = re.compile(r"\b(portions?|parts?|serving|par unite|par piece)\b")
+# A quantity other than 100 g (or 100 ml): the table does not answer it
+_QUANTITY = re.compile(r"\b(\d+(?: \d+)?) ?(g|gr|grammes?|kg|mg|ml|cl|l|litres?)\b")
+_PORTIONS = {"portion", "portions", "part", "parts", "tranche", "tranches", "cuillere", "cuilleres",
+             "verre", "verres", "bol", "pot", "pots", "piece", "pieces", "assiette", "tasse", "jour"}
+# Words of a lookup question that do not name the food
+_LOOKUP_WORDS = {"apporte", "apportent", "apport", "contient", "contiennent", "contenu", "teneur", "quantite",
+                 "taux", "valeur", "valeurs", "nutritionnelle", "nutritionnelles", "nutritionnels",
+                 "composition", "apports", "g", "gr", "gramme", "grammes", "100", "ml", "il", "donne",
+                 "moi", "svp", "quels", "quelles", "sont", "ya", "as", "t", "c", "cb", "total", "totale"}
+MAX_EXTRA_TOKENS = 2
+
+
+def _stem(token: str) -> str:
+    """Singulier approximatif (pommes → pomme, noix inchangé)"""
+    return token[:-1] if len(token) > 3 and token.endswith("s") else token
+
+
+def match_nutrient(header: str) -> Optional[str]:
+    """Nutriment désigné par un en-tête de colonne, ou None"""
+    text = f" {normalize_text(header)} "
+    for alias, key in _ALIASES:
+        if f" {alias} " in text:
+            if key == "energie_kcal" and " kj " in text and " kcal " not in text:
+                return "energie_kj"
+            return key
+    return None
+
+
+def table_basis(texts: Iterable[str]) -> Optional[str]:
+    """
+    Quantité de référence ("100 g" ou "100 ml") annoncée par l'en-tête ou la
+    légende d'un tableau ; None si elle n'est pas indiquée ou si le tableau
+    donne aussi des valeurs par portion
+    """
+    text = normalize_text(" ".join(texts))
+    basis = _BASIS.search(text)
+    if basis is None or _PORTION_BASIS.search(text):
+        return None
+    return "100 ml" if basis.group(1) == "ml" else "100 g"
+
+
+def parse_nutrient_table(rows: List[List[str]], caption: str = "") -> List[Tuple[str, str, str, str, str]]:
+    """
+    Faits (aliment, nutriment, valeur, unité, quantité de référence) d'un
+    tableau, si l'une de ses premières lignes est un en-tête nommant au moins
+    deux nutriments et que l'en-tête ou la légende indique des valeurs pour
+    100 g ou 100 ml. Les valeurs sont gardées telles qu'écrites ("0,3", "< 0,5", "traces").
+    """
+    for header_index, header in enumerate(rows[:3]):
+        columns = {i: match_nutrient(cell) for i, cell in enumerate(header) if cell}
+        columns = {i: key for i, key in columns.items() if key is not None}
+        if len(columns) >= 2:
+            break
+    else:
+        return []
+    # Per-portion values must not be presented as values per 100 g
+    basis = table_basis([caption] + [cell or "" for row in rows[:header_index + 1] for cell in row])
+    if basis is None:
+        return []
+
+    food_column = next((i for i in range(len(header)) if i not in columns), None)
+    if food_column is None:
+        return []
+    units = {}
+    for i, key in columns.items():
+        unit = _UNIT.search(header[i])
+        units[i] = unit.group(1).replace("ug", "µg") if unit else NUTRIENTS[key][1]
+        if units[i].lower() == "kj":
+            units[i] = "kJ"
+
+    facts = []
+    for row in rows[header_index + 1:]:
+        if food_column >= len(row) or not row[food_column] or not tokenize(row[food_column]):
+            continue
+        food = row[food_column]
+        for i, key in columns.items():
+            value = row[i].strip() if i < len(row) and row[i] else ""
+            if _VALUE.match(value):
+                facts.append((food, key, value, units[i], basis))
+    return facts
+
+
+def parse_lookup(question: str) -> Optional[Tuple[List[str], Set[str]]]:
+    """
+    Nutriments demandés et mots désignant l'aliment, si la question est une
+    simple recherche dans une table (pour 100 g, sans portion ni autre quantité)
+    """
+    text = f" {normalize_text(question)} "
+    for quantity, _ in _QUANTITY.findall(text):
+        if quantity.replace(" ", "") != "100":
+            return None
+
+    nutrients = []
+    for phrase in _GENERIC:
+        if f" {phrase} " in text:
+            nutrients.extend(MAIN_NUTRIENTS)
+            text = text.replace(f" {phrase} ", " ")
+    for alias, key in _ALIASES:
+        if f" {alias} " in text:
+            if key not in nutrients:
+                nutrients.append(key)
+            text = text.replace(f" {alias} ", " ")
+    if not nutrients:
+        return None
+
+    words = set(tokenize(text)) - _LOOKUP_WORDS
+    if not words or words & _PORTIONS:
+        return None
+    return nutrients, {_stem(word) for word in words}
+
+
+class NutrientFactStore:
+    """
+    Faits nutritionnels d'une collection dans un fichier SQLite, avec un index
+    en mémoire des mots des noms d'aliments (construit à la première recherche)
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Food name → its stemmed words, and word → food names
+        self._foods: Optional[Dict[str, Set[str]]] = None
+        self._postings: Dict[str, Set[str]] = {}
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS nutrient_facts ("
+            "document_id TEXT NOT NULL, page INTEGER NOT NULL, food TEXT NOT NULL, "
+            "nutrient TEXT NOT NULL, value TEXT NOT NULL, unit TEXT NOT NULL, basis TEXT)"
+        )
+        # Facts stored before the reference quantity was recorded have none and are not answered
+        if "basis" not in {row[1] for row in self._execute("PRAGMA table_info(nutrient_facts)")}:
+            self._execute("ALTER TABLE nutrient_facts ADD COLUMN basis TEXT")
+        self._execute("CREATE INDEX IF NOT EXISTS nutrient_facts_food ON nutrient_facts (food, nutrient)")
+        self._execute("CREATE INDEX IF NOT EXISTS nutrient_facts_document ON nutrient_facts (document_id)")
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def replace_document(self, document_id: str, facts: Iterable[Tuple[int, str, str, str, str, str]]) -> int:
+        """
+        Remplace les faits d'un document par `facts` (page, aliment, nutriment,
+        valeur, unité, quantité de référence)
+        """
+        rows = [
+            (document_id, page, food, nutrient, value, unit, basis)
+            for page, food, nutrient, value, unit, basis in facts
+        ]
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                conn.execute("DELETE FROM nutrient_facts WHERE document_id = ?", (document_id,))
+                conn.executemany(
+                    "INSERT INTO nutrient_facts (document_id, page, food, nutrient, value, unit, basis) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+        finally:
+            conn.close()
+        self._invalidate()
+        return len(rows)
+
+    def delete_document(self, document_id: str) -> None:
+        self._execute("DELETE FROM nutrient_facts WHERE document_id = ?", (document_id,))
+        self._invalidate()
+
+    def clear(self) -> None:
+        self._execute("DELETE FROM nutrient_facts")
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        with self._lock:
+            self._foods = None
+            self._postings = {}
+
+    def _load(self) -> Dict[str, Set[str]]:
+        with self._lock:
+            if self._foods is None:
+                foods = {food: {_stem(word) for word in tokenize(food)}
+                         for (food,) in self._execute(
+                             "SELECT DISTINCT food FROM nutrient_facts WHERE basis IS NOT NULL")}
+                postings = defaultdict(set)
+                for food, words in foods.items():
+                    for word in words:
+                        postings[word].add(food)
+                self._foods, self._postings = foods, dict(postings)
+            return self._foods
+
+    def find_food(self, words: Set[str]) -> Optional[str]:
+        """
+        Aliment dont le nom contient tous les mots, avec le moins de mots en
+        plus (au plus MAX_EXTRA_TOKENS) ; None si aucun ou plusieurs ex æquo
+        """
+        foods = self._load()
+        candidates = None
+        for word in words:
+            matches = self._postings.get(word, set())
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return None
+        ranked = sorted((len(foods[food] - words), food) for food in candidates)
+        best_extra, best = ranked[0]
+        if best_extra > MAX_EXTRA_TOKENS or (len(ranked) > 1 and ranked[1][0] == best_extra):
+            return None
+        return best
+
+    def facts(self,
+              food: str,
+              nutrients: List[str]) -> Optional[Tuple[str, int, str, Dict[str, Tuple[str, str]]]]:
+        """
+        Document, page, quantité de référence et valeurs (valeur, unité) des
+        nutriments d'un aliment, s'ils viennent tous d'un même tableau
+        (même page et même quantité de référence)
+        """
+        placeholders = ", ".join("?" for _ in nutrients)
+        rows = self._execute(
+            "SELECT document_id, page, basis, nutrient, value, unit FROM nutrient_facts "
+            f"WHERE food = ? AND basis IS NOT NULL AND nutrient IN ({placeholders}) ORDER BY document_id, page",
+            (food, *nutrients)
+        )
+        by_table: Dict[Tuple[str, int, str], Dict[str, Tuple[str, str]]] = defaultdict(dict)
+        for document_id, page, basis, nutrient, value, unit in rows:
+            by_table[(document_id, page, basis)].setdefault(nutrient, (value, unit))
+        for (document_id, page, basis), values in by_table.items():
+            if len(values) == len(nutrients):
+                return document_id, page, basis, values
+        return None
+
+    def answer(self, question: str) -> Optional[Dict]:
+        """
+        Réponse directe à une question de composition, ou None si elle ne
+        correspond pas exactement à un aliment et à des nutriments de la table
+
+        Returns:
+            {"text", "food", "document_id", "page"}
+        """
+        lookup = parse_lookup(question)
+        if lookup is None:
+            return None
+        nutrients, words = lookup
+        food = self.find_food(words)
+        if food is None:
+            return None
+        found = self.facts(food, nutrients)
+        if found is None:
+            return None
+        document_id, page, basis, values = found
+        parts = [f"{NUTRIENTS[key][0]} : {values[key][0]} {values[key][1]}" for key in nutrients]
+        text = f"Pour {basis} de {food} : {', '.join(parts)} (Source : page {page})."
+        return {"text": text, "food": food, "document_id": document_id, "page": page}
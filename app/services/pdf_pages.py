@@ -0,0 +1,160 @@
+# services/pdf_pages.py
+"""
+Extraction du texte des pages d'un PDF
+
+Le texte est extrait par plages de pages dans un pool de processus (PyMuPDF
+garde le GIL pendant l'extraction) ; les pages sont rendues dans l'ordre, au
+fur et à mesure, avec un nombre borné de plages en cours pour que la mémoire
+ne dépende pas de la taille du document. Les tableaux des pages peuvent être
+extraits au passage, dans les mêmes processus.
+"""
+import itertools
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import fitz
+from langchain_core.documents import Document
+
+from app.services.normalization import normalize_text
+
+# Légende (texte juste au-dessus) et lignes (cellules) de chaque tableau d'une page
+PageTables = List[Tuple[str, List[List[str]]]]
+
+# Hauteur de la zone lue au-dessus d'un tableau pour sa légende (en points)
+CAPTION_HEIGHT = 60
+
+
+def _page_tables(page: "fitz.Page") -> PageTables:
+    if not hasattr(page, "find_tables"):
+        # PyMuPDF < 1.23
+        return []
+    try:
+        found = page.find_tables()
+    except Exception:
+        return []
+    tables = []
+    for table in found.tables:
+        top = table.bbox[1]
+        caption = page.get_text("text", clip=fitz.Rect(page.rect.x0, max(page.rect.y0, top - CAPTION_HEIGHT),
+                                                        page.rect.x1, top))
+        rows = [[" ".join((cell or "").split()) for cell in row] for row in table.extract()]
+        tables.append((" ".join(caption.split()), rows))
+    return tables
+
+
+def _extract_range(file_path: str,
+                   start: int,
+                   stop: int,
+                   table_keywords: Optional[Sequence[str]] = None) -> List[Tuple[str, PageTables]]:
+    """
+    Texte des pages [start, stop) et, si `table_keywords` est donné, tableaux
+    des pages dont le texte contient l'un de ces mots (exécuté dans un processus du pool)
+    """
+    pages = []
+    with fitz.open(file_path) as doc:
+        for number in range(start, stop):
+            page = doc[number]
+            text = page.get_text()
+            tables = []
+            if table_keywords:
+                words = set(normalize_text(text).split())
+                if any(keyword in words for keyword in table_keywords):
+                    tables = _page_tables(page)
+            pages.append((text, tables))
+    return pages
+
+
+def _document_info(file_path: str) -> Tuple[int, Dict]:
+    """Nombre de pages et métadonnées du document"""
+    with fitz.open(file_path) as doc:
+        metadata = {key: value for key, value in (doc.metadata or {}).items() if isinstance(value, (str, int))}
+        return doc.page_count, metadata
+
+
+class PageExtractor:
+    """
+    Pages d'un PDF sous forme de Documents, avec les mêmes métadonnées que
+    PyMuPDFLoader (source, file_path, page, total_pages et celles du PDF).
+    Avec `table_keywords`, les tableaux (légende, lignes) des pages contenant
+    l'un de ces mots (normalisés) sont ajoutés dans metadata["tables"], à
+    retirer avant stockage.
+
+    Args:
+        workers: Processus d'extraction (1 = dans le thread appelant)
+        pages_per_task: Pages extraites par tâche
+        prefetch: Plages en cours par processus
+    """
+    def __init__(self, workers: int, pages_per_task: int = 8, prefetch: int = 2):
+        self.workers = max(1, workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.prefetch = max(1, prefetch)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Started on first use; "spawn" because the parent process runs threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def iter_pages(self,
+                   file_path: str,
+                   table_keywords: Optional[Sequence[str]] = None) -> Iterator[Document]:
+        """Pages du document, dans l'ordre, extraites à la demande"""
+        total_pages, doc_metadata = _document_info(file_path)
+        ranges = [
+            (start, min(start + self.pages_per_task, total_pages))
+            for start in range(0, total_pages, self.pages_per_task)
+        ]
+        if self.workers == 1 or len(ranges) <= 1:
+            pages_by_range = (_extract_range(file_path, start, stop, table_keywords) for start, stop in ranges)
+        else:
+            pages_by_range = self._extract_ordered(file_path, ranges, table_keywords)
+
+        for (start, _), pages in zip(ranges, pages_by_range):
+            for offset, (text, tables) in enumerate(pages):
+                metadata = dict(
+                    doc_metadata,
+                    source=file_path,
+                    file_path=file_path,
+                    page=start + offset,
+                    total_pages=total_pages
+                )
+                if table_keywords:
+                    metadata["tables"] = tables
+                yield Document(page_content=text, metadata=metadata)
+
+    def _extract_ordered(self,
+                         file_path: str,
+                         ranges: List[Tuple[int, int]],
+                         table_keywords: Optional[Sequence[str]]) -> Iterator[List[Tuple[str, PageTables]]]:
+        """Pages de chaque plage, dans l'ordre ; au plus workers × prefetch plages en cours"""
+        pool = self._pool()
+        remaining = iter(ranges)
+        pending: Deque[Future] = deque(
+            pool.submit(_extract_range, file_path, start, stop, table_keywords)
+            for start, stop in itertools.islice(remaining, self.workers * self.prefetch)
+        )
+        try:
+            while pending:
+                pages = pending.popleft().result()
+                for start, stop in itertools.islice(remaining, 1):
+                    pending.append(pool.submit(_extract_range, file_path, start, stop, table_keywords))
+                yield pages
+        finally:
+            # Indexing stopped early: ranges not started yet are dropped
+            for future in pending:
+                future.cancel()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,250 @@
+# services/providers.py
+"""
+Registre des fournisseurs de modèles de chat et d'embeddings, choisis par la configuration
+
+Chat : "openai", "openai_compatible" (serveur local exposant l'API OpenAI,
+ex. vLLM, llama.cpp, Ollama) et "fake" (réponses déterministes en flux, sans réseau).
+Embeddings : "openai", "openai_compatible", "sentence_transformers" (CPU) et
+"hash" (hachage de termes, sans modèle ni réseau).
+"""
+import asyncio
+import hashlib
+import math
+import random
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from app.core.config import settings
+from app.services.bm25_index import tokenize
+
+ChatFactory = Callable[..., BaseChatModel]
+EmbeddingsFactory = Callable[..., Embeddings]
+
+CHAT_PROVIDERS: Dict[str, ChatFactory] = {}
+EMBEDDING_PROVIDERS: Dict[str, EmbeddingsFactory] = {}
+
+
+def register_chat_provider(name: str) -> Callable[[ChatFactory], ChatFactory]:
+    def register(factory: ChatFactory) -> ChatFactory:
+        CHAT_PROVIDERS[name] = factory
+        return factory
+    return register
+
+
+def register_embedding_provider(name: str) -> Callable[[EmbeddingsFactory], EmbeddingsFactory]:
+    def register(factory: EmbeddingsFactory) -> EmbeddingsFactory:
+        EMBEDDING_PROVIDERS[name] = factory
+        return factory
+    return register
+
+
+def build_chat_model(model: str,
+                     temperature: float = 0.7,
+                     streaming: bool = False,
+                     provider: Optional[str] = None,
+                     http_client: Optional[httpx.Client] = None,
+                     http_async_client: Optional[httpx.AsyncClient] = None) -> BaseChatModel:
+    """Modèle de chat du fournisseur `provider` (par défaut LLM_PROVIDER)"""
+    provider = provider or settings.llm_provider
+    if provider not in CHAT_PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {provider} (available: {', '.join(CHAT_PROVIDERS)})")
+    return CHAT_PROVIDERS[provider](
+        model=model,
+        temperature=temperature,
+        streaming=streaming,
+        http_client=http_client,
+        http_async_client=http_async_client
+    )
+
+
+def build_embeddings(provider: Optional[str] = None,
+                     http_client: Optional[httpx.Client] = None,
+                     http_async_client: Optional[httpx.AsyncClient] = None) -> Embeddings:
+    """Modèle d'embeddings du fournisseur `provider` (par défaut EMBEDDING_PROVIDER)"""
+    provider = provider or settings.embedding_provider
+    if provider not in EMBEDDING_PROVIDERS:
+        raise ValueError(
+            f"Unknown embedding provider: {provider} (available: {', '.join(EMBEDDING_PROVIDERS)})"
+        )
+    return EMBEDDING_PROVIDERS[provider](
+        model=settings.embedding_model,
+        http_client=http_client,
+        http_async_client=http_async_client
+    )
+
+
+### Chat ###
+
+
+@register_chat_provider("openai")
+def _openai_chat(model: str, temperature: float, streaming: bool, **clients: Any) -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+
+    if not settings.openai_api_key:
+        raise ValueError("OPENAI_API_KEY n'est pas définie")
+    return ChatOpenAI(
+        temperature=temperature,
+        model_name=model,
+        api_key=settings.openai_api_key,
+        streaming=streaming,
+        **clients
+    )
+
+
+@register_chat_provider("openai_compatible")
+def _openai_compatible_chat(model: str, temperature: float, streaming: bool, **clients: Any) -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+
+    if not settings.llm_base_url:
+        raise ValueError("LLM_BASE_URL n'est pas définie")
+    return ChatOpenAI(
+        temperature=temperature,
+        model_name=model,
+        base_url=settings.llm_base_url,
+        # Local servers usually ignore the key but the client requires one
+        api_key=settings.llm_api_key or "not-needed",
+        streaming=streaming,
+        **clients
+    )
+
+
+@register_chat_provider("fake")
+def _fake_chat(model: str, **_: Any) -> BaseChatModel:
+    return FakeStreamingChatModel(
+        tokens_per_second=settings.fake_llm_tokens_per_second,
+        first_token_latency=settings.fake_llm_first_token_latency,
+        response_tokens=settings.fake_llm_response_tokens
+    )
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    LLM simulé pour les tests de charge : réponse déterministe (fonction du
+    dernier message), premier token après `first_token_latency` secondes,
+    puis `tokens_per_second` tokens par seconde. Aucun appel réseau.
+    """
+    tokens_per_second: float = 50.0
+    first_token_latency: float = 0.2
+    response_tokens: int = 100
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        # The words of the prompt, drawn with a seed derived from the question
+        question = str(messages[-1].content) if messages else ""
+        words = " ".join(str(m.content) for m in messages).split() or ["nutrition"]
+        rng = random.Random(hashlib.sha256(question.encode("utf-8")).digest())
+        return [rng.choice(words) + " " for _ in range(self.response_tokens)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.first_token_latency + len(tokens) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+### Embeddings ###
+
+
+@register_embedding_provider("openai")
+def _openai_embeddings(model: str, **clients: Any) -> Embeddings:
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(model=model, api_key=settings.openai_api_key, **clients)
+
+
+@register_embedding_provider("openai_compatible")
+def _openai_compatible_embeddings(model: str, **clients: Any) -> Embeddings:
+    from langchain_openai import OpenAIEmbeddings
+
+    base_url = settings.embedding_base_url or settings.llm_base_url
+    if not base_url:
+        raise ValueError("EMBEDDING_BASE_URL n'est pas définie")
+    return OpenAIEmbeddings(
+        model=model,
+        base_url=base_url,
+        api_key=settings.llm_api_key or "not-needed",
+        # Local servers take raw text, not tiktoken ids
+        check_embedding_ctx_length=False,
+        **clients
+    )
+
+
+@register_embedding_provider("sentence_transformers")
+def _sentence_transformer_embeddings(model: str, **_: Any) -> Embeddings:
+    return SentenceTransformerEmbeddings(model)
+
+
+@register_embedding_provider("hash")
+def _hash_embeddings(**_: Any) -> Embeddings:
+    return HashEmbeddings(settings.embedding_dimensions)
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    Embeddings calculés localement sur CPU par un modèle sentence-transformers.
+
+    Dépendance optionnelle : sentence-transformers doit être installé.
+    """
+    def __init__(self, model_name: str, batch_size: int = 32):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Embeddings par hachage des termes et bigrammes normalisés : déterministes,
+    sans modèle ni réseau. Les textes partageant des termes restent proches,
+    ce qui suffit aux tests de charge et au fonctionnement hors ligne.
+    """
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def _vector(self, text: str) -> List[float]:
+        terms = tokenize(text)
+        vector = [0.0] * self.dimensions
+        for feature in terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
@@ -1,174 +1,821 @@
+import asyncio
+import contextvars
+import functools
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_openai import OpenAIEmbeddings
-from typing import List
-from chromadb.config import Settings
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, TypeVar, Union
+import httpx
 import os
 import shutil
 from io import BytesIO
+from app.core.config import settings
+from app.core.log import get_logger
+from app.core.metrics import CACHE_LOOKUPS, span
+from app.services.embedding_cache import EmbeddingCache
+from app.services.ingestion_pipeline import IngestionPipeline
+from app.services.pdf_pages import PageExtractor
+from app.services.document_manifest import chunk_id, hash_file, hash_text
+from app.services.nutrient_facts import TABLE_KEYWORDS, parse_nutrient_table
+from app.services.providers import build_embeddings
+from app.services.retrieval import (
+    CrossEncoderReranker,
+    maximal_marginal_relevance,
+    reciprocal_rank_fusion,
+    remove_overlaps,
+)
+from app.services.vector_backends import build_vector_storage
+from app.services.vector_collections import (
+    DEFAULT_COLLECTION,
+    CollectionPool,
+    VectorCollection,
+    validate_collection_name,
+)
+
+T = TypeVar("T")
+
+logger = get_logger(__name__)
+
+# Reçoit (compteur, incrément) pendant l'indexation d'un PDF
+ProgressCallback = Callable[[str, int], None]
+
+
+def _no_progress(counter: str, increment: int) -> None:
+    pass
 
 class RAGService:
-    def __init__(self, persist_dir: str = "./data/vectorstore"):
+    def __init__(self,
+                 persist_dir: str = "./data/vectorstore",
+                 http_client: Optional[httpx.Client] = None,
+                 http_async_client: Optional[httpx.AsyncClient] = None,
+                 vector_backend: Optional[str] = None):
         """
         Initialise le service RAG avec un vector store persistant
         
         Args:
             persist_dir: Chemin où persister le vector store
+            http_client, http_async_client: Clients HTTP (keep-alive) partagés
+                pour les appels à l'API d'embeddings
+            vector_backend: Stockage des vecteurs ("chroma" ou "numpy",
+                par défaut VECTOR_BACKEND)
         """
         self.persist_dir = persist_dir
 
-        self._client = None
-
+        # Les appels bloquants (PDF, Chroma, embeddings) tournent hors de la boucle
+        # asyncio, dans un pool borné ; les ingestions simultanées sont limitées pour
+        # laisser des threads libres aux recherches.
+        if settings.rag_max_workers < 2:
+            # Ingestions keep at least one thread free for searches
+            raise ValueError(f"RAG_MAX_WORKERS must be at least 2, got {settings.rag_max_workers}")
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.rag_max_workers,
+            thread_name_prefix="rag"
+        )
+        self._ingestion_slots = asyncio.Semaphore(
+            min(max(1, settings.rag_max_concurrent_ingestions), settings.rag_max_workers - 1)
+        )
+        # Version de chaque collection, incrémentée à chaque modification
+        # (les réponses en cache tirées d'une version antérieure ne sont plus servies)
+        self._versions: Dict[str, int] = {}
         
         
         # Création du dossier de persistance s'il n'existe pas
         os.makedirs(self.persist_dir, exist_ok=True)
         
-        self.embeddings = OpenAIEmbeddings(
-            api_key=os.getenv("OPENAI_API_KEY")
+        # Fournisseur selon EMBEDDING_PROVIDER
+        self.embeddings = build_embeddings(
+            http_client=http_client,
+            http_async_client=http_async_client
         )
         
+        # Cache des embeddings de requêtes (niveau disque optionnel sous persist_dir)
+        self.embedding_cache = EmbeddingCache(
+            max_size=settings.embedding_cache_size,
+            ttl=settings.embedding_cache_ttl,
+            persist_dir=self.persist_dir if settings.embedding_cache_on_disk else None
+        )
+        
+        # Re-classement local optionnel (chargé au démarrage si RERANKER_MODEL est défini)
+        self.reranker: Optional[CrossEncoderReranker] = None
+
+        # Embeddings des chunks par lots, en parallèle, écrits lot par lot
+        self.ingestion_pipeline = IngestionPipeline(
+            self.embeddings,
+            batch_size=settings.embedding_batch_size,
+            concurrency=settings.embedding_concurrency,
+            max_retries=settings.embedding_max_retries
+        )
+        
+        # Texte des pages extrait en parallèle, par plages, dans un pool de processus
+        self.page_extractor = PageExtractor(settings.pdf_parse_workers, settings.pdf_pages_per_task)
+
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200
         )
         
  
+        # Stockage des vecteurs partagé par toutes les collections (Chroma ou NumPy)
+        self.vector_storage = build_vector_storage(self.persist_dir, vector_backend)
+        self._known_collections = self._list_collections()
+
+        # Collections ouvertes à la demande (index BM25 et manifestes en mémoire)
+        self.collections = CollectionPool(
+            self._open_collection,
+            max_open=settings.collection_pool_max_open,
+            max_bytes=settings.collection_pool_max_bytes
+        )
+
+    def _list_collections(self) -> set:
+        """Noms des collections existantes"""
         try:
-            if os.path.exists(os.path.join(self.persist_dir, "chroma.sqlite3")):
-                self.vector_store = Chroma(
-                    persist_directory=self.persist_dir,
-                    embedding_function=self.embeddings
-                )
-                self._client = self.vector_store._client
-            else:
-                self.vector_store = None
+            return self.vector_storage.list_collections()
         except Exception as e:
-            print(f"Error initializing vector store: {e}")
-            self.vector_store = None
-        
-        # Configure Chroma client settings
-        self._client_settings = Settings(
-            chroma_db_impl="duckdb+parquet",
-            persist_directory=persist_dir,
-            allow_reset=True  # Enable reset functionality
+            logger.error("Error listing vector store collections: %s", e)
+            return set()
+
+    def _open_collection(self, name: str) -> VectorCollection:
+        return VectorCollection(
+            name,
+            self.vector_storage.open,
+            self.persist_dir,
+            exists=name in self._known_collections
         )
-        
-        # Initialize with safe settings
-        self._init_vector_store()
-    
-    def _init_vector_store(self):
-        """Initialize vector store with proper settings"""
+
+    @contextmanager
+    def _using(self, name: str) -> Iterator[VectorCollection]:
+        """Collection ouverte pour la durée d'une opération bloquante"""
+        collection = self.collections.acquire(name)
+        try:
+            yield collection
+        finally:
+            self.collections.release(collection)
+
+    @asynccontextmanager
+    async def _use(self, name: str) -> AsyncIterator[VectorCollection]:
+        """Collection ouverte (hors de la boucle asyncio) pour la durée d'une opération"""
+        collection = await self._run_blocking(self.collections.acquire, name)
         try:
-            if os.path.exists(os.path.join(self.persist_dir, "chroma.sqlite3")):
-                self.vector_store = Chroma(
-                    persist_directory=self.persist_dir,
-                    embedding_function=self.embeddings,
-                    client_settings=self._client_settings
+            yield collection
+        finally:
+            self.collections.release(collection)
+
+    def has_documents(self, collections: Optional[Sequence[str]] = None) -> bool:
+        """Au moins une des collections (par défaut, la collection par défaut) contient des documents"""
+        return any(name in self._known_collections for name in collections or [DEFAULT_COLLECTION])
+
+    def list_collections(self) -> List[str]:
+        """Noms des collections contenant des documents"""
+        return sorted(self._known_collections)
+
+    async def warm_up(self) -> None:
+        """Charge l'index du vector store avant les premières requêtes"""
+        if self.has_documents():
+            # Other collections are opened on first use
+            async with self._use(DEFAULT_COLLECTION) as collection:
+                count = await self._run_blocking(collection.vectors.count)
+                logger.info(
+                    "Vector store ready (%d chunks, %d in the BM25 index, %d collections)",
+                    count, len(collection.bm25_index), len(self._known_collections)
                 )
-            else:
-                self.vector_store = None
-        except Exception as e:
-            print(f"Error initializing vector store: {e}")
-            self.vector_store = None
+        if settings.reranker_model and self.reranker is None:
+            try:
+                self.reranker = await self._run_blocking(CrossEncoderReranker, settings.reranker_model)
+                logger.info("Re-ranker ready (%s)", settings.reranker_model)
+            except ImportError:
+                logger.warning("sentence-transformers is not installed, re-ranking disabled")
+            except Exception as e:
+                logger.error("Error loading re-ranker: %s", e)
+
+    def close(self) -> None:
+        """Arrête les pools de threads et de processus"""
+        for name in self.collections.open_names():
+            with self._using(name) as collection:
+                collection.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.ingestion_pipeline.close()
+        self.page_extractor.close()
        
     
-    async def load_and_index_pdf(self, file_content: bytes, clear_existing: bool = False) -> None:
+    async def load_and_index_pdf(self,
+                                 file_content: Union[bytes, BinaryIO],
+                                 clear_existing: bool = False,
+                                 document_id: Optional[str] = None,
+                                 collection: str = DEFAULT_COLLECTION) -> None:
         """
         Load and index a PDF document.
 
         Args:
-            file_content: Byte content of the PDF file.
+            file_content: Byte content of the PDF file, or a binary file object
+                copied to disk chunk by chunk.
             clear_existing: If True, clears the existing vector store before indexing.
+            document_id: Identifier of the document; defaults to the file hash.
+            collection: Name of the collection receiving the document.
         """
-        if clear_existing and os.path.exists(self.persist_dir):
-            self.clear()
-
         # Create a temporary file to save the PDF content
         with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(file_content)
             tmp_file_path = tmp_file.name
+            if isinstance(file_content, bytes):
+                tmp_file.write(file_content)
+            else:
+                await self._run_blocking(shutil.copyfileobj, file_content, tmp_file, 1024 * 1024)
 
         try:
-            # Use PyMuPDFLoader to load the PDF from the temporary file
-            loader = PyMuPDFLoader(tmp_file_path)
-            documents = loader.load()
+            await self.index_pdf_file(tmp_file_path, clear_existing, document_id=document_id, collection=collection)
+        finally:
+            # Ensure the temporary file is deleted
+            os.remove(tmp_file_path)
+
+    async def index_pdf_file(self,
+                             file_path: str,
+                             clear_existing: bool = False,
+                             progress: Optional[ProgressCallback] = None,
+                             document_id: Optional[str] = None,
+                             filename: Optional[str] = None,
+                             collection: str = DEFAULT_COLLECTION) -> Dict[str, float]:
+        """
+        Index a PDF file already stored on disk.
+
+        Parsing, splitting and embedding run on the RAG thread pool so that the
+        event loop keeps serving streaming responses during large uploads.
+        Re-indexing a document only embeds the pages that changed since the
+        previous upload, and an identical file is not indexed twice.
+
+        Args:
+            file_path: Path of the PDF file.
+            clear_existing: If True, clears the collection before indexing.
+            progress: Optional callback receiving (counter, increment) updates for
+                "pages_parsed", "chunks_total", "chunks_embedded" and "chunks_skipped".
+            document_id: Identifier of the document; defaults to the file hash.
+            filename: Original name of the uploaded file.
+            collection: Name of the collection receiving the document.
+
+        Returns:
+            Indexing statistics (chunks, batches, seconds, chunks_per_second).
+        """
+        validate_collection_name(collection)
+        async with self._ingestion_slots:
+            return await self._run_blocking(
+                self._index_pdf, file_path, clear_existing, progress, document_id, filename, collection
+            )
+
+    def _index_pdf(self,
+                   file_path: str,
+                   clear_existing: bool,
+                   progress: Optional[ProgressCallback],
+                   document_id: Optional[str],
+                   filename: Optional[str],
+                   collection_name: str) -> Dict[str, float]:
+        """Blocking part of index_pdf_file, executed in the thread pool"""
+        with self._using(collection_name) as collection:
+            return self._index_pdf_into(collection, file_path, clear_existing, progress, document_id, filename)
+
+    def _index_pdf_into(self,
+                        collection: VectorCollection,
+                        file_path: str,
+                        clear_existing: bool,
+                        progress: Optional[ProgressCallback],
+                        document_id: Optional[str],
+                        filename: Optional[str]) -> Dict[str, float]:
+        if progress is None:
+            progress = _no_progress
+
+        if clear_existing:
+            self._clear_exclusive(collection)
 
-            # (Optional) Ensure each page has 'page' metadata if not already present
-            # for idx, doc in enumerate(documents):
-            #     if "page" not in doc.metadata:
-            #         doc.metadata["page"] = idx + 1  # 1-based page numbering
+        file_hash = hash_file(file_path)
+        document_id = document_id or file_hash
 
-            # Split the documents
-            splits = self.text_splitter.split_documents(documents)
+        with collection.write_lock.shared(), collection.document_locks[document_id]:
+            try:
+                duplicate = collection.manifests.find_by_file_hash(file_hash)
+                if duplicate is not None:
+                    logger.info("PDF already indexed as document %s, skipping", duplicate["document_id"])
+                    return {"chunks": 0, "batches": 0, "seconds": 0.0, "chunks_per_second": 0.0}
 
+                previous = collection.manifests.get(document_id) or {"pages": {}}
+                pages: Dict[str, Dict] = {}
+                nutrient_facts: List[tuple] = []
 
-            if self.vector_store is None:
-                # Initialize a new vector store from the splitted docs (with metadata)
-                self.vector_store = Chroma.from_documents(
-                    documents=splits,
-                    embedding=self.embeddings,
-                    persist_directory=self.persist_dir
+                # Pages are parsed, split and embedded as a stream of batches
+                chunks = self._iter_new_chunks(
+                    collection, file_path, document_id, previous["pages"], pages, progress, nutrient_facts
+                )
+                stats = self.ingestion_pipeline.run(
+                    chunks, functools.partial(self._write_batch, collection), progress
                 )
-                self._client = self.vector_store._client
-            else:
-                # Add to the existing vector store
-                self.vector_store.add_documents(splits)
 
+                # Chunks of pages that changed or disappeared are removed
+                kept_ids = {cid for page in pages.values() for cid in page["chunk_ids"]}
+                stale_ids = [
+                    cid for page in previous["pages"].values()
+                    for cid in page["chunk_ids"] if cid not in kept_ids
+                ]
+                if stale_ids:
+                    collection.get_or_create_vectors().delete(stale_ids)
+                    collection.bm25_index.remove(stale_ids)
+                collection.bm25_index.save()
+                if settings.answer_cards:
+                    collection.nutrients.replace_document(document_id, nutrient_facts)
 
-        except Exception as e:
-            print(f"Error loading and indexing PDF: {e}")
-            raise e
-        finally:
-            # Ensure the temporary file is deleted
-            os.remove(tmp_file_path)
-    
-    
+                collection.manifests.save(document_id, filename, file_hash, pages)
+                logger.info(
+                    "Indexed %d chunks into %s in %.1fs (%.1f chunks/s), removed %d stale chunks, "
+                    "%d nutrient facts",
+                    stats["chunks"], collection.name, stats["seconds"], stats["chunks_per_second"], len(stale_ids),
+                    len(nutrient_facts)
+                )
+
+                self._corpus_changed(collection.name)
+                return stats
+
+            except Exception as e:
+                logger.error("Error loading and indexing PDF: %s", e)
+                raise e
+
+    def _iter_new_chunks(self,
+                         collection: VectorCollection,
+                         file_path: str,
+                         document_id: str,
+                         previous_pages: Dict[str, Dict],
+                         pages: Dict[str, Dict],
+                         progress: ProgressCallback,
+                         nutrient_facts: List[tuple]) -> Iterator[Document]:
+        """
+        Yield the chunks of a PDF that are not indexed yet, splitting one page
+        at a time as the page extractor delivers them (in order, parsed ahead
+        by its process pool). `pages` is filled with the manifest of each page
+        and `nutrient_facts` with the (page, food, nutrient, value, unit, basis)
+        rows of the nutrient tables of every page.
+
+        Previous pages are matched by content hash, not by number: inserting or
+        removing a page does not re-embed the pages after it.
+        """
+        table_keywords = TABLE_KEYWORDS if settings.answer_cards else None
+        previous_by_hash = {page["hash"]: (key, page) for key, page in previous_pages.items()}
+        for index, page in enumerate(self.page_extractor.iter_pages(file_path, table_keywords)):
+            progress("pages_parsed", 1)
+            page_number = page.metadata.get("page", index)
+            page_key = str(page_number)
+            for caption, table in page.metadata.pop("tables", []):
+                nutrient_facts.extend((page_number, *fact) for fact in parse_nutrient_table(table, caption))
+            page_hash = hash_text(page.page_content)
+
+            # Unchanged page: its chunks are already in the collection
+            previous_key, previous = previous_by_hash.get(page_hash, (None, None))
+            if previous is not None:
+                pages[page_key] = previous
+                progress("chunks_skipped", len(previous["chunk_ids"]))
+                if previous_key != page_key:
+                    self._renumber_chunks(collection, previous["chunk_ids"], page_number)
+                continue
 
+            splits = []
+            for split in self.text_splitter.split_documents([page]):
+                split.id = chunk_id(document_id, page_hash, split.page_content)
+                split.metadata["document_id"] = document_id
+                splits.append(split)
+            # Identical chunks within a page share the same id
+            splits = list({split.id: split for split in splits}.values())
+            pages[page_key] = {"hash": page_hash, "chunk_ids": [split.id for split in splits]}
+            progress("chunks_total", len(splits))
+
+            existing = self._existing_ids(collection, [split.id for split in splits])
+            if existing:
+                progress("chunks_skipped", len(existing))
+            yield from (split for split in splits if split.id not in existing)
+
+    def _renumber_chunks(self, collection: VectorCollection, ids: List[str], page_number: int) -> None:
+        """Met à jour le numéro de page des chunks d'une page déplacée, avec leurs embeddings stockés"""
+        records = collection.vectors.get(ids, include_embeddings=True) if collection.vectors is not None else []
+        if not records:
+            return
+        collection.vectors.upsert(
+            ids=[record["id"] for record in records],
+            embeddings=[record["embedding"] for record in records],
+            documents=[record["text"] for record in records],
+            metadatas=[dict(record["metadata"], page=page_number) for record in records]
+        )
+
+    def _existing_ids(self, collection: VectorCollection, ids: List[str]) -> set:
+        """Ids already present in the collection"""
+        if not ids or collection.vectors is None:
+            return set()
+        return collection.vectors.existing_ids(ids)
+
+    def _write_batch(self,
+                     collection: VectorCollection,
+                     documents: List[Document],
+                     embeddings: List[List[float]]) -> None:
+        """Write a batch of embedded chunks to the collection"""
+        collection.get_or_create_vectors().upsert(
+            ids=[doc.id for doc in documents],
+            embeddings=embeddings,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents]
+        )
+        self._known_collections.add(collection.name)
+        collection.bm25_index.add([doc.id for doc in documents], [doc.page_content for doc in documents])
+
+    async def delete_document(self, document_id: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        """
+        Remove a single document and its chunks from a collection.
+
+        Returns:
+            False if the document is not indexed.
+        """
+        if not self.has_documents([validate_collection_name(collection)]):
+            return False
+        return await self._run_blocking(self._delete_document, document_id, collection)
+
+    def _delete_document(self, document_id: str, collection_name: str) -> bool:
+        with self._using(collection_name) as collection:
+            with collection.write_lock.shared(), collection.document_locks[document_id]:
+                manifest = collection.manifests.get(document_id)
+                if manifest is None:
+                    return False
+                ids = [cid for page in manifest["pages"].values() for cid in page["chunk_ids"]]
+                if ids and collection.vectors is not None:
+                    collection.vectors.delete(ids)
+                collection.bm25_index.remove(ids)
+                collection.bm25_index.save()
+                collection.nutrients.delete_document(document_id)
+                collection.manifests.delete(document_id)
+                self._corpus_changed(collection_name)
+                return True
+
+    async def list_documents(self, collection: str = DEFAULT_COLLECTION) -> List[Dict]:
+        """Documents indexés dans une collection, sans le détail des pages"""
+        if not self.has_documents([validate_collection_name(collection)]):
+            return []
+        async with self._use(collection) as opened:
+            manifests = await self._run_blocking(opened.manifests.list)
+        return [
+            {
+                "document_id": manifest["document_id"],
+                "filename": manifest["filename"],
+                "file_hash": manifest["file_hash"],
+                "indexed_at": manifest["indexed_at"],
+                "pages": len(manifest["pages"]),
+                "chunks": sum(len(page["chunk_ids"]) for page in manifest["pages"].values()),
+            }
+            for manifest in manifests
+        ]
+
+    async def _run_blocking(self, func: Callable[..., T], *args: Any) -> T:
+        """Exécute un appel bloquant dans le pool de threads du RAG (avec le contexte de la requête)"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args))
             
     
-    async def similarity_search(self, query: str, k: int = 4) -> List[dict]:
+    async def similarity_search(self,
+                                query: str,
+                                k: int = 4,
+                                mode: Optional[str] = None,
+                                collection: str = DEFAULT_COLLECTION,
+                                nprobe: Optional[int] = None) -> List[dict]:
         """
         Effectue une recherche par similarité
         
         Args:
             query: Requête de recherche
             k: Nombre de résultats à retourner
+            mode: "vector", "lexical" (BM25, sans appel externe) ou "hybrid"
+                (fusion RRF des deux) ; par défaut RETRIEVAL_MODE.
+                En mode hybride, si le service d'embeddings est lent ou
+                indisponible, seuls les résultats lexicaux sont renvoyés.
+            collection: Nom de la collection interrogée
+            nprobe: Listes de l'index IVF parcourues (backend "numpy" indexé ;
+                par défaut ANN_NPROBE, 0 = recherche exacte)
             
         Returns:
-            Liste de dict, chaque dict contenant le texte et la metadata
+            Liste de dict, chaque dict contenant l'id, le texte, la metadata et la collection du chunk
         """
-        if not self.vector_store:
-            raise ValueError("Vector store not initialized. Please add documents first.")
-            
-        results = self.vector_store.similarity_search(query, k=k)
-        
-        # Return text + metadata for each chunk
-        docs_with_metadata = []
-        for doc in results:
-            # print(f"Metadata document: {doc.metadata}")
-            docs_with_metadata.append({
-                "text": doc.page_content,
-                "metadata": doc.metadata
-            })
-        return docs_with_metadata
+        if not self.has_documents([validate_collection_name(collection)]):
+            raise ValueError(f"Collection {collection} has no documents. Please add documents first.")
+
+        async with self._use(collection) as opened:
+            return await self._similarity_search(opened, query, k, mode or settings.retrieval_mode, nprobe)
+
+    async def _similarity_search(self,
+                                 collection: VectorCollection,
+                                 query: str,
+                                 k: int,
+                                 mode: str,
+                                 nprobe: Optional[int] = None,
+                                 vector_hits: Optional[List[dict]] = None) -> List[dict]:
+        """`vector_hits` : résultats vectoriels déjà calculés (requêtes par lots)"""
+        if mode == "vector":
+            if vector_hits is not None:
+                return vector_hits[:k]
+            return await self._run_blocking(self._search, collection, query, k, nprobe)
+        if mode == "lexical":
+            return await self._run_blocking(self._lexical_search, collection, query, k)
+        if mode != "hybrid":
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+
+        # Each ranking contributes more candidates than k to the fusion
+        fetch_k = k * 2
+        with span("lexical_search"):
+            lexical = await self._run_blocking(collection.bm25_index.search, query, fetch_k)
+        try:
+            vector = vector_hits[:fetch_k] if vector_hits is not None else await asyncio.wait_for(
+                self._run_blocking(self._search, collection, query, fetch_k, nprobe),
+                timeout=settings.embedding_timeout
+            )
+        except Exception as e:
+            logger.warning("Vector search unavailable (%s), using lexical results only", e.__class__.__name__)
+            vector = []
+
+        fused = reciprocal_rank_fusion(
+            [[d["id"] for d in vector], [chunk_id for chunk_id, _ in lexical]],
+            [settings.rrf_vector_weight, settings.rrf_lexical_weight],
+            k=settings.rrf_k
+        )[:k]
+        known = {d["id"]: d for d in vector}
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in known]
+        if missing:
+            known.update({d["id"]: d for d in await self._run_blocking(self._get_chunks, collection, missing)})
+        return [dict(known[chunk_id], score=score) for chunk_id, score in fused if chunk_id in known]
+
+    async def retrieve(self,
+                       query: str,
+                       k: Optional[int] = None,
+                       collections: Optional[Sequence[str]] = None,
+                       nprobe: Optional[int] = None) -> List[dict]:
+        """
+        Sélection des chunks pour le contexte : sur-échantillonnage des
+        candidats, suppression des chunks qui se recouvrent, diversification
+        MMR puis re-classement local optionnel.
+
+        Args:
+            query: Requête de recherche
+            k: Nombre maximal de chunks retournés (par défaut RETRIEVAL_TOP_K)
+            collections: Collections interrogées (par défaut la collection par
+                défaut) ; plusieurs collections sont interrogées en parallèle
+                et leurs classements fusionnés (RRF)
+            nprobe: Listes de l'index IVF parcourues (voir similarity_search)
+
+        Returns:
+            Chunks classés du plus au moins pertinent (même format que similarity_search)
+        """
+        k = k or settings.retrieval_top_k
+        return await self._retrieve_from(query, k, self._searchable(collections), nprobe)
+
+    async def retrieve_many(self,
+                            queries: Sequence[str],
+                            k: Optional[int] = None,
+                            collections: Optional[Sequence[str]] = None,
+                            nprobe: Optional[int] = None) -> List[List[dict]]:
+        """
+        Équivalent de `retrieve` pour un lot de requêtes : les embeddings
+        manquants sont calculés en un seul appel et la recherche vectorielle de
+        chaque collection est une seule requête matricielle ; fusion,
+        diversification et re-classement restent faits requête par requête.
+        En mode hybride, si les embeddings échouent ou dépassent
+        EMBEDDING_TIMEOUT, seuls les résultats lexicaux sont utilisés.
+
+        Returns:
+            Chunks de chaque requête, dans l'ordre des requêtes
+        """
+        k = k or settings.retrieval_top_k
+        names = self._searchable(collections)
+        if not queries or not names:
+            return [[] for _ in queries]
+
+        vector_hits: Dict[str, List[Optional[List[dict]]]] = {name: [None] * len(queries) for name in names}
+        if settings.retrieval_mode != "lexical":
+            hybrid = settings.retrieval_mode == "hybrid"
+            try:
+                embeddings = await asyncio.wait_for(
+                    self._run_blocking(self._embed_queries, list(queries)),
+                    timeout=settings.embedding_timeout
+                )
+            except Exception as e:
+                if not hybrid:
+                    raise
+                # Like the single-query path: empty vector rankings, lexical results only
+                logger.warning("Query embeddings unavailable (%s), using lexical results only", e.__class__.__name__)
+                embeddings = None
+            # Same number of candidates as the single-query path
+            fetch_k = max(settings.retrieval_fetch_k, k) * (2 if hybrid else 1)
+            for name in names:
+                if embeddings is None:
+                    vector_hits[name] = [[] for _ in queries]
+                    continue
+                try:
+                    async with self._use(name) as collection:
+                        vector_hits[name] = await self._run_blocking(
+                            self._search_many, collection, embeddings, fetch_k, nprobe
+                        )
+                except Exception as e:
+                    if not hybrid:
+                        raise
+                    logger.warning("Vector search unavailable (%s), using lexical results only", e.__class__.__name__)
+                    vector_hits[name] = [[] for _ in queries]
+        return list(await asyncio.gather(*(
+            self._retrieve_from(query, k, names, nprobe, {name: vector_hits[name][i] for name in names})
+            for i, query in enumerate(queries)
+        )))
+
+    def _searchable(self, collections: Optional[Sequence[str]]) -> List[str]:
+        """Collections demandées (par défaut la collection par défaut) qui contiennent des documents"""
+        return [
+            name for name in dict.fromkeys(collections or [DEFAULT_COLLECTION])
+            if self.has_documents([validate_collection_name(name)])
+        ]
+
+    async def _retrieve_from(self,
+                             query: str,
+                             k: int,
+                             names: List[str],
+                             nprobe: Optional[int] = None,
+                             vector_hits: Optional[Dict[str, Optional[List[dict]]]] = None) -> List[dict]:
+        """Sélection des chunks dans des collections, fusionnée (RRF) s'il y en a plusieurs"""
+        vector_hits = vector_hits or {}
+        if len(names) <= 1:
+            return await self._retrieve(query, k, names[0], nprobe, vector_hits.get(names[0])) if names else []
+
+        rankings = await asyncio.gather(*(
+            self._retrieve(query, k, name, nprobe, vector_hits.get(name)) for name in names
+        ))
+        chunks = {}
+        for ranking in rankings:
+            for chunk in ranking:
+                chunks.setdefault(chunk["id"], chunk)
+        fused = reciprocal_rank_fusion(
+            [[chunk["id"] for chunk in ranking] for ranking in rankings],
+            [1.0] * len(rankings),
+            k=settings.rrf_k
+        )
+        merged = [chunks[chunk_id] for chunk_id, _ in fused]
+        with span("dedupe"):
+            return remove_overlaps(merged, settings.retrieval_overlap_threshold)[:k]
+
+    async def _retrieve(self,
+                        query: str,
+                        k: int,
+                        collection: str,
+                        nprobe: Optional[int] = None,
+                        vector_hits: Optional[List[dict]] = None) -> List[dict]:
+        """Sélection des chunks dans une collection"""
+        async with self._use(collection) as opened:
+            candidates = await self._similarity_search(
+                opened, query, max(settings.retrieval_fetch_k, k), settings.retrieval_mode, nprobe, vector_hits
+            )
+            with span("dedupe"):
+                candidates = remove_overlaps(candidates, settings.retrieval_overlap_threshold)
+
+            if len(candidates) > k and settings.retrieval_mode != "lexical" and settings.mmr_lambda < 1:
+                # The query embedding is cached by the vector search (read without
+                # counting a second lookup); if it failed, the candidates are kept in fused order
+                query_embedding = self.embedding_cache.peek(query)
+                if query_embedding is not None:
+                    with span("mmr"):
+                        embeddings = await self._run_blocking(
+                            self._get_embeddings, opened, [c["id"] for c in candidates]
+                        )
+                        if len(embeddings) == len(candidates):
+                            selected = maximal_marginal_relevance(
+                                query_embedding, embeddings, k, lambda_mult=settings.mmr_lambda
+                            )
+                            candidates = [candidates[i] for i in selected]
+        candidates = candidates[:k]
+
+        if self.reranker is not None:
+            with span("rerank"):
+                candidates = await self._run_blocking(self.reranker.rerank, query, candidates)
+        return candidates
+
+    async def answer_card(self, question: str, collections: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """
+        Réponse directe à une question de composition nutritionnelle, tirée
+        des tables extraites à l'indexation (voir NutrientFactStore.answer)
+
+        Returns:
+            {"text", "food", "document_id", "page", "collection"}, ou None
+        """
+        for name in dict.fromkeys(collections or [DEFAULT_COLLECTION]):
+            if not self.has_documents([validate_collection_name(name)]):
+                continue
+            async with self._use(name) as collection:
+                card = await self._run_blocking(collection.nutrients.answer, question)
+            if card is not None:
+                return dict(card, collection=name)
+        return None
+
+    async def embed_query(self, query: str) -> List[float]:
+        """Embedding d'une requête (servi depuis le cache si possible)"""
+        return await self._run_blocking(self._reuse_or_embed_query, query)
+
+    def _reuse_or_embed_query(self, query: str) -> List[float]:
+        # Usually already computed by the retrieval of the same request: not a new lookup
+        embedding = self.embedding_cache.peek(query)
+        return embedding if embedding is not None else self._embed_query(query)
+
+    def _search(self, collection: VectorCollection, query: str, k: int, nprobe: Optional[int] = None) -> List[dict]:
+        """Embedding de la requête et recherche vectorielle (bloquant)"""
+        query_embedding = self._embed_query(query)
+        with span("vector_search"):
+            results = collection.vectors.query([query_embedding], k, nprobe=nprobe)[0]
+        # Return id + text + metadata + distance for each chunk
+        return [dict(record, collection=collection.name) for record in results]
+
+    def _search_many(self,
+                     collection: VectorCollection,
+                     embeddings: List[List[float]],
+                     k: int,
+                     nprobe: Optional[int] = None) -> List[List[dict]]:
+        """Recherche vectorielle d'un lot d'embeddings en une requête (bloquant)"""
+        with span("vector_search"):
+            results = collection.vectors.query(embeddings, k, nprobe=nprobe)
+        return [[dict(record, collection=collection.name) for record in records] for records in results]
+
+    def _lexical_search(self, collection: VectorCollection, query: str, k: int) -> List[dict]:
+        """Recherche BM25, sans appel au service d'embeddings (bloquant)"""
+        with span("lexical_search"):
+            ranked = collection.bm25_index.search(query, k)
+        chunks = {d["id"]: d for d in self._get_chunks(collection, [chunk_id for chunk_id, _ in ranked])}
+        return [dict(chunks[chunk_id], score=score) for chunk_id, score in ranked if chunk_id in chunks]
+
+    def _get_chunks(self, collection: VectorCollection, ids: List[str]) -> List[dict]:
+        """Texte et metadata de chunks lus localement"""
+        return [dict(record, collection=collection.name) for record in collection.vectors.get(ids)]
+
+    def _get_embeddings(self, collection: VectorCollection, ids: List[str]) -> List[List[float]]:
+        """Embeddings stockés des chunks, dans l'ordre des ids"""
+        by_id = {record["id"]: record["embedding"] for record in collection.vectors.get(ids, include_embeddings=True)}
+        return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embeddings d'un lot de requêtes : celles absentes du cache en un seul appel"""
+        embeddings = {query: self.embedding_cache.get(query) for query in dict.fromkeys(queries)}
+        missing = [query for query, embedding in embeddings.items() if embedding is None]
+        if len(embeddings) > len(missing):
+            CACHE_LOOKUPS.inc(len(embeddings) - len(missing), cache="embedding", result="hit")
+        if missing:
+            CACHE_LOOKUPS.inc(len(missing), cache="embedding", result="miss")
+            with span("embedding"):
+                computed = self.embeddings.embed_documents(missing)
+            for query, embedding in zip(missing, computed):
+                self.embedding_cache.put(query, embedding)
+                embeddings[query] = embedding
+        return [embeddings[query] for query in queries]
+
+    def _embed_query(self, query: str) -> List[float]:
+        """Embedding d'une requête, servi depuis le cache si possible"""
+        embedding = self.embedding_cache.get(query)
+        if embedding is None:
+            CACHE_LOOKUPS.inc(cache="embedding", result="miss")
+            with span("embedding"):
+                embedding = self.embeddings.embed_query(query)
+            self.embedding_cache.put(query, embedding)
+        else:
+            CACHE_LOOKUPS.inc(cache="embedding", result="hit")
+        return embedding
         
 
-    def clear(self) -> None:
+    def collection_versions(self, collections: Optional[Sequence[str]] = None) -> Dict[str, int]:
+        """Version actuelle de chaque collection (par défaut, de la collection par défaut)"""
+        return {name: self._versions.get(name, 0) for name in collections or [DEFAULT_COLLECTION]}
+
+    def _corpus_changed(self, collection_name: str) -> None:
+        """
+        Le contenu d'une collection a changé : les réponses qui en dépendent
+        sont périmées. Les embeddings de requêtes ne dépendent que du modèle et
+        restent en cache.
+        """
+        self._versions[collection_name] = self._versions.get(collection_name, 0) + 1
+
+    async def clear(self, collection: str = DEFAULT_COLLECTION) -> None:
         """
-        Supprime toutes les données du vector store de manière sécurisée
+        Supprime toutes les données d'une collection de manière sécurisée
+        (les autres collections ne sont pas modifiées ; une collection
+        inexistante n'est pas créée)
         """
+        if not self.has_documents([validate_collection_name(collection)]):
+            return
         try:
-            if self.vector_store is not None:
-                # Proper reset with allowed configuration
-                self.vector_store.delete_collection()
-                self.vector_store = None
-                
-            # Reinitialize with fresh client
-            self._init_vector_store()
-            
+            async with self._use(collection) as opened:
+                await self._run_blocking(self._clear_exclusive, opened)
         except Exception as e:
-            print(f"Error clearing vector store: {e}")
-            raise
\ No newline at end of file
+            logger.error("Error clearing collection %s: %s", collection, e)
+            raise
+
+    def _clear_exclusive(self, collection: VectorCollection) -> None:
+        """Vide une collection une fois finies les indexations et suppressions en cours"""
+        with collection.write_lock.exclusive():
+            self._clear(collection)
+
+    def _clear(self, collection: VectorCollection) -> None:
+        collection.drop_vectors()
+        self._known_collections.discard(collection.name)
+
+        collection.manifests.clear()
+        collection.bm25_index.clear()
+        collection.nutrients.clear()
+        # The vectors are recreated on the next ingestion
+        self._corpus_changed(collection.name)
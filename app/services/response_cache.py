@@ -0,0 +1,185 @@
+# services/response_cache.py
+"""
+Cache des réponses aux questions répétées (correspondance exacte et sémantique)
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.normalization import normalize_text
+
+# Mots qui renvoient à un échange précédent : la question dépend alors de l'historique
+_REFERRING_WORDS = {
+    "ca", "cela", "ceci", "celui", "celle", "ceux", "celles", "elle", "elles", "ils",
+    "lui", "leur", "leurs", "meme", "aussi", "encore", "precedent", "precedente",
+    "it", "that", "this", "they", "them", "those",
+}
+_REFERRING_PREFIXES = ("et ", "mais ", "puis ", "and ", "what about ")
+
+
+class CachedResponse:
+    """Réponse en cache"""
+    __slots__ = ("created_at", "scope", "answer", "embedding")
+
+    def __init__(self, created_at: float, scope: Tuple, answer: str, embedding: Optional[np.ndarray]):
+        self.created_at = created_at
+        # ((collection, version) of each collection searched, ids of the retrieved chunks)
+        self.scope = scope
+        self.answer = answer
+        self.embedding = embedding
+
+
+class ResponseCache:
+    """
+    Cache LRU des réponses, indexé par (question normalisée, collections
+    interrogées et leur version, ids des chunks retrouvés).
+
+    Si `semantic_threshold` > 0, une question absente du cache peut réutiliser
+    la réponse d'une question dont l'embedding a une similarité cosinus
+    supérieure au seuil, posée sur les mêmes collections et pour laquelle les
+    mêmes chunks ont été retrouvés. Modifier une collection change sa version :
+    les réponses qui en dépendent ne sont plus servies (et sortent du LRU),
+    celles des autres collections restent valides.
+    """
+    def __init__(self, max_size: int = 512, ttl: float = 86400.0, semantic_threshold: float = 0.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+        self._entries: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Matrices des embeddings en cache par portée (collections, chunks), reconstruites à la demande
+        self._matrices: Optional[Dict[Tuple, Tuple[List[Tuple], np.ndarray]]] = None
+
+    @staticmethod
+    def is_context_dependent(question: str, has_history: bool) -> bool:
+        """
+        Heuristique : une question courte ou contenant une référence à un échange
+        précédent ("et pour la banane ?", "elle en contient combien ?") dépend de
+        l'historique et ne doit pas être servie depuis le cache
+        """
+        if not has_history:
+            return False
+        normalized = normalize_text(question)
+        words = normalized.split()
+        if len(words) <= 3 or normalized.startswith(_REFERRING_PREFIXES):
+            return True
+        return any(word in _REFERRING_WORDS for word in words)
+
+    @staticmethod
+    def make_scope(chunk_ids: Sequence[str], collections: Mapping[str, int]) -> Tuple:
+        return (tuple(sorted(collections.items())), tuple(chunk_ids))
+
+    @classmethod
+    def make_key(cls, question: str, chunk_ids: Sequence[str], collections: Mapping[str, int]) -> Tuple:
+        return (normalize_text(question), *cls.make_scope(chunk_ids, collections))
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def get(self,
+            question: str,
+            chunk_ids: Sequence[str],
+            collections: Mapping[str, int],
+            embedding: Optional[Sequence[float]] = None) -> Optional[str]:
+        """
+        Réponse en cache pour la question, ou None
+
+        Args:
+            collections: Version de chaque collection interrogée
+        """
+        key = self.make_key(question, chunk_ids, collections)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer
+
+            if embedding is not None and self.semantic_threshold > 0:
+                answer = self._semantic_lookup(
+                    self.make_scope(chunk_ids, collections), np.asarray(embedding, dtype=np.float32), now
+                )
+                if answer is not None:
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return answer
+
+            self.misses += 1
+            return None
+
+    def put(self,
+            question: str,
+            chunk_ids: Sequence[str],
+            collections: Mapping[str, int],
+            answer: str,
+            embedding: Optional[Sequence[float]] = None) -> None:
+        """Enregistre une réponse complète"""
+        scope = self.make_scope(chunk_ids, collections)
+        key = (normalize_text(question), *scope)
+        vector = None
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else None
+        with self._lock:
+            self._entries[key] = CachedResponse(time.monotonic(), scope, answer, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrices = None
+
+    def _semantic_lookup(self, scope: Tuple, embedding: np.ndarray, now: float) -> Optional[str]:
+        """
+        Réponse d'une question proche, parmi celles de la même portée : une
+        réponse tirée d'autres chunks ou d'autres collections n'est jamais servie
+        """
+        norm = np.linalg.norm(embedding)
+        if not norm:
+            return None
+        if self._matrices is None:
+            keys_by_scope: Dict[Tuple, List[Tuple]] = {}
+            for k, e in self._entries.items():
+                if e.embedding is not None:
+                    keys_by_scope.setdefault(e.scope, []).append(k)
+            self._matrices = {
+                s: (keys, np.stack([self._entries[k].embedding for k in keys]))
+                for s, keys in keys_by_scope.items()
+            }
+        if scope not in self._matrices:
+            return None
+
+        keys, matrix = self._matrices[scope]
+        scores = matrix @ (embedding / norm)
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        entry = self._entries.get(keys[best])
+        if entry is None or now - entry.created_at > self.ttl:
+            return None
+        self._entries.move_to_end(keys[best])
+        return entry.answer
+
+    def stats(self) -> Dict[str, float]:
+        """Taux de hits du cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
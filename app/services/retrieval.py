@@ -0,0 +1,124 @@
+# services/retrieval.py
+"""
+Fusion et post-traitement des résultats de recherche
+"""
+from typing import Callable, Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.services.normalization import normalize_text
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]],
+                           weights: Sequence[float],
+                           k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fusionne plusieurs classements d'ids (Reciprocal Rank Fusion) :
+    score(id) = somme des poids / (k + rang)
+
+    Returns:
+        Liste (id, score) triée par score décroissant
+    """
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _shingles(text: str, size: int = 5) -> Set[Tuple[str, ...]]:
+    words = normalize_text(text).split()
+    return {tuple(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+def remove_overlaps(candidates: List[dict], threshold: float = 0.5) -> List[dict]:
+    """
+    Retire les chunks qui recouvrent en grande partie un chunk mieux classé
+    (chevauchement du découpage, ou même passage indexé deux fois).
+
+    Le recouvrement est la part des 5-grammes de mots du plus petit des deux
+    chunks présente dans l'autre.
+    """
+    kept: List[Tuple[dict, Set[Tuple[str, ...]]]] = []
+    for candidate in candidates:
+        shingles = _shingles(candidate["text"])
+        if not any(
+            len(shingles & other) / max(min(len(shingles), len(other)), 1) >= threshold
+            for _, other in kept
+        ):
+            kept.append((candidate, shingles))
+    return [candidate for candidate, _ in kept]
+
+
+def maximal_marginal_relevance(query_embedding: Sequence[float],
+                               embeddings: Sequence[Sequence[float]],
+                               k: int,
+                               lambda_mult: float = 0.7) -> List[int]:
+    """
+    Sélectionne `k` candidats à la fois pertinents et différents les uns des autres
+    (Maximal Marginal Relevance).
+
+    Returns:
+        Indices des candidats retenus, dans l'ordre de sélection
+    """
+    if not len(embeddings):
+        return []
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = matrix @ query
+    similarity = matrix @ matrix.T
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    while len(selected) < min(k, len(matrix)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+
+class CrossEncoderReranker:
+    """
+    Re-classement local (CPU) des candidats par un cross-encoder
+    sentence-transformers, qui note chaque paire (question, chunk).
+
+    Dépendance optionnelle : sentence-transformers doit être installé.
+    """
+    def __init__(self, model_name: str, max_length: int = 512):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+
+    def rerank(self, query: str, candidates: List[dict]) -> List[dict]:
+        if not candidates:
+            return []
+        scores = self.model.predict([(query, c["text"]) for c in candidates])
+        ranked = sorted(zip(candidates, scores), key=lambda item: item[1], reverse=True)
+        return [dict(candidate, rerank_score=float(score)) for candidate, score in ranked]
+
+
+def pack_context(chunks: List[dict],
+                 format_chunk: Callable[[dict], str],
+                 count_tokens: Callable[[str], int],
+                 token_budget: int) -> Tuple[List[dict], str]:
+    """
+    Remplit le budget de tokens du contexte avec les meilleurs chunks, dans
+    l'ordre : un chunk trop long est sauté au profit des suivants.
+
+    Returns:
+        Les chunks retenus et le texte du contexte
+    """
+    packed, parts, used = [], [], 0
+    for chunk in chunks:
+        text = format_chunk(chunk)
+        tokens = count_tokens(text)
+        if used + tokens > token_budget:
+            continue
+        packed.append(chunk)
+        parts.append(text)
+        used += tokens
+    return packed, "\n\n".join(parts)
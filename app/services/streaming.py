@@ -0,0 +1,100 @@
+# services/streaming.py
+"""
+Flux Server-Sent Events des réponses : tokens regroupés en trames, contre-pression
+et arrêt de la génération quand le client se déconnecte
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from app.core.log import get_logger
+from app.core.metrics import ACTIVE_STREAMS
+
+logger = get_logger(__name__)
+
+# Événement produit par LLMService.stream_events : ("token" | "sources" | "done" | "error", données)
+StreamEvent = Tuple[str, Any]
+
+_END = object()
+
+
+def sse_frame(event: str, data: Any) -> str:
+    """Trame SSE d'un événement, données encodées en JSON sur une ligne"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def sse_stream(events: AsyncIterator[StreamEvent],
+                     is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                     max_chars: int = 64,
+                     max_delay: float = 0.05,
+                     queue_size: int = 32) -> AsyncIterator[str]:
+    """
+    Convertit un flux d'événements en trames SSE.
+
+    Les tokens consécutifs sont regroupés dans une même trame jusqu'à
+    `max_chars` caractères ou `max_delay` secondes après le premier token en
+    attente. Les événements sont lus par une tâche dédiée à travers une file
+    bornée : si le client lit lentement, la file se remplit et la lecture du
+    flux du LLM se suspend. Si le client se déconnecte (ou si la réponse est
+    annulée), la tâche est annulée, ce qui ferme l'appel au LLM.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def produce() -> None:
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(("error", {"message": str(e)}))
+        # Not reached when cancelled: nobody reads the queue any more
+        await queue.put(_END)
+
+    producer = asyncio.create_task(produce())
+    ACTIVE_STREAMS.inc()
+    loop = asyncio.get_running_loop()
+    buffer: List[str] = []
+    buffered_chars = 0
+    deadline = 0.0
+
+    def flush() -> str:
+        nonlocal buffered_chars
+        frame = sse_frame("token", {"text": "".join(buffer)})
+        buffer.clear()
+        buffered_chars = 0
+        return frame
+
+    try:
+        while True:
+            timeout = max(deadline - loop.time(), 0) if buffer else None
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield flush()
+            else:
+                if item is _END:
+                    if buffer:
+                        yield flush()
+                    break
+                event, data = item
+                if event == "token":
+                    if not buffer:
+                        deadline = loop.time() + max_delay
+                    buffer.append(data)
+                    buffered_chars += len(data)
+                    if buffered_chars < max_chars:
+                        continue
+                    yield flush()
+                else:
+                    if buffer:
+                        yield flush()
+                    yield sse_frame(event, data)
+
+            if is_disconnected is not None and await is_disconnected():
+                logger.info("Client disconnected, cancelling generation")
+                break
+    finally:
+        ACTIVE_STREAMS.dec()
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        if hasattr(events, "aclose"):
+            await events.aclose()
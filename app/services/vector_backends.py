@@ -0,0 +1,669 @@
+# services/vector_backends.py
+"""
+Stockage des vecteurs d'une collection, interchangeable par la configuration
+
+"chroma" : collections Chroma (SQLite + index HNSW) d'un client persistant partagé.
+"numpy" : embeddings normalisés en float32 (ou quantifiés en int8) dans un
+fichier projeté en mémoire, textes et metadata dans un journal JSONL ; le top-k
+est un produit matriciel suivi d'un `argpartition`.
+"""
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.log import get_logger
+from app.services.ann_index import IVFIndex
+
+logger = get_logger(__name__)
+
+# Collection utilisée quand la requête n'en précise pas
+DEFAULT_COLLECTION = "default"
+
+# Nom de la collection Chroma par défaut (celui utilisé par défaut par langchain)
+DEFAULT_CHROMA_NAME = "langchain"
+
+# Préfixe des collections Chroma nommées (Chroma impose 3 à 63 caractères)
+CHROMA_PREFIX = "col_"
+
+# Record returned by searches and lookups: {"id", "text", "metadata"} plus
+# "distance" (searches) or "embedding" (lookups that ask for it)
+VectorRecord = Dict[str, Any]
+
+
+def collection_directory(persist_dir: str, name: str) -> str:
+    """
+    Dossier d'une collection : la collection par défaut garde les emplacements
+    historiques (racine du dossier de persistance), les autres ont leur sous-dossier
+    """
+    return persist_dir if name == DEFAULT_COLLECTION else os.path.join(persist_dir, "collections", name)
+
+
+def chroma_name(name: str) -> str:
+    return DEFAULT_CHROMA_NAME if name == DEFAULT_COLLECTION else f"{CHROMA_PREFIX}{name}"
+
+
+def collection_name(chroma_collection: str) -> Optional[str]:
+    """Nom de la collection correspondant à une collection Chroma (None si étrangère)"""
+    if chroma_collection == DEFAULT_CHROMA_NAME:
+        return DEFAULT_COLLECTION
+    if chroma_collection.startswith(CHROMA_PREFIX):
+        return chroma_collection[len(CHROMA_PREFIX):]
+    return None
+
+
+class VectorBackend(ABC):
+    """Vecteurs, textes et metadata des chunks d'une collection"""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def upsert(self,
+               ids: List[str],
+               embeddings: Sequence[Sequence[float]],
+               documents: List[str],
+               metadatas: List[Dict]) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def existing_ids(self, ids: List[str]) -> set:
+        ...
+
+    @abstractmethod
+    def get(self, ids: List[str], include_embeddings: bool = False) -> List[VectorRecord]:
+        """Chunks trouvés parmi `ids` (l'ordre n'est pas garanti)"""
+
+    @abstractmethod
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], List[str]]]:
+        """Ids et textes de tous les chunks, par lots"""
+
+    @abstractmethod
+    def query(self, embeddings: Sequence[Sequence[float]], k: int, **options: Any) -> List[List[VectorRecord]]:
+        """`k` plus proches chunks de chaque embedding (recherche par lot)"""
+
+    @abstractmethod
+    def drop(self) -> None:
+        """Supprime définitivement les données de la collection"""
+
+    def flush(self) -> None:
+        pass
+
+    def memory_bytes(self) -> int:
+        """Mémoire estimée tenue par le processus (hors pages projetées du disque)"""
+        return 0
+
+
+### Chroma ###
+
+
+class ChromaVectors(VectorBackend):
+    def __init__(self, client, name: str):
+        self._client = client
+        self.name = name
+        # Embeddings are always computed by the application: no Chroma embedding function
+        self._collection = client.get_or_create_collection(name=name, embedding_function=None)
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        self._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids: List[str]) -> None:
+        if ids:
+            self._collection.delete(ids=ids)
+
+    def existing_ids(self, ids: List[str]) -> set:
+        if not ids:
+            return set()
+        return set(self._collection.get(ids=ids, include=[])["ids"])
+
+    def get(self, ids: List[str], include_embeddings: bool = False) -> List[VectorRecord]:
+        if not ids:
+            return []
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        results = self._collection.get(ids=ids, include=include)
+        records = [
+            {"id": chunk_id, "text": text, "metadata": metadata or {}}
+            for chunk_id, text, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+        if include_embeddings:
+            for record, embedding in zip(records, results["embeddings"]):
+                record["embedding"] = embedding
+        return records
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], List[str]]]:
+        offset = 0
+        while True:
+            results = self._collection.get(include=["documents"], limit=batch_size, offset=offset)
+            if not results["ids"]:
+                break
+            yield results["ids"], results["documents"]
+            offset += len(results["ids"])
+
+    def query(self, embeddings, k: int, **options: Any) -> List[List[VectorRecord]]:
+        results = self._collection.query(
+            query_embeddings=[list(map(float, e)) for e in embeddings],
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                {"id": chunk_id, "text": text, "metadata": metadata or {}, "distance": distance}
+                for chunk_id, text, metadata, distance in zip(ids, documents, metadatas, distances)
+            ]
+            for ids, documents, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+
+    def drop(self) -> None:
+        self._client.delete_collection(self.name)
+
+
+class ChromaStorage:
+    """
+    Client Chroma persistant partagé par toutes les collections ; au-delà de
+    `memory_limit_bytes`, Chroma décharge les index HNSW les moins récemment utilisés
+    """
+    def __init__(self, persist_dir: str, memory_limit_bytes: int = 0):
+        import chromadb
+        from chromadb.config import Settings
+
+        chroma_settings = {"allow_reset": True, "anonymized_telemetry": False}
+        if memory_limit_bytes > 0:
+            chroma_settings.update(
+                chroma_segment_cache_policy="LRU",
+                chroma_memory_limit_bytes=memory_limit_bytes
+            )
+        self._client = chromadb.PersistentClient(path=persist_dir, settings=Settings(**chroma_settings))
+
+    def list_collections(self) -> set:
+        """Noms des collections existantes"""
+        names = {getattr(c, "name", c) for c in self._client.list_collections()}
+        return {name for name in map(collection_name, names) if name is not None}
+
+    def open(self, name: str, directory: str) -> VectorBackend:
+        """Ouvre la collection, en la créant si nécessaire"""
+        return ChromaVectors(self._client, chroma_name(name))
+
+
+### NumPy ###
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectors(VectorBackend):
+    """
+    Vecteurs normalisés dans un fichier projeté en mémoire (`vectors.f32`, ou
+    `vectors.i8` et `scales.f32` quantifiés en int8 avec une échelle par ligne),
+    textes et metadata dans un journal JSONL rejoué à l'ouverture.
+
+    Les lignes supprimées sont réutilisées ; la recherche calcule les scores
+    (produit scalaire = cosinus) par blocs de lignes puis garde le top-k avec
+    `argpartition`. Les distances renvoyées sont des L2 au carré, comme Chroma.
+
+    Si un index IVF a été construit (`build_ann_index`, ou par la ligne de
+    commande de app/services/ann_index.py dans un autre processus), seules les
+    lignes des `nprobe` listes les plus proches sont évaluées. L'index sur
+    disque est rechargé quand il change ; les lignes qui n'y sont pas encore
+    affectées (ajoutées pendant ou après sa construction) le sont au chargement,
+    et les lignes ajoutées ensuite à la volée.
+    """
+    HEADER = "header.json"
+    LOG = "records.jsonl"
+    # Rows scored per matrix product (bounds the temporary float32 copy of int8 blocks)
+    BLOCK_ROWS = 16384
+
+    def __init__(self, directory: str, dtype: str = "float32"):
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._load(dtype)
+
+    def _load(self, dtype: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        header = self._read_header()
+        self.dtype = header.get("dtype", dtype)
+        self.dimensions: Optional[int] = header.get("dimensions")
+        self.capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._alive = np.zeros(0, dtype=bool)
+
+        # Row → record, id → row
+        self._ids: List[Optional[str]] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict]] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._log_records = 0
+        self._text_bytes = 0
+
+        if self.dimensions is not None:
+            self._map(header.get("capacity", 0))
+            self._replay()
+        self.ann: Optional[IVFIndex] = None
+        self._ann_stamp = None
+        self._refresh_ann()
+
+    def _refresh_ann(self) -> None:
+        """(Re)charge l'index IVF s'il a changé sur disque et y affecte les lignes manquantes"""
+        stamp = IVFIndex.stamp(self.directory)
+        if stamp == self._ann_stamp:
+            return
+        self._ann_stamp = stamp
+        self.ann = IVFIndex.load(self.directory) if stamp is not None else None
+        if self.ann is None:
+            return
+        missing = self.ann.unassigned(np.flatnonzero(self._alive[:len(self._ids)]))
+        for start in range(0, len(missing), self.BLOCK_ROWS):
+            block_rows = missing[start:start + self.BLOCK_ROWS]
+            self.ann.add(block_rows, self._read_vectors(block_rows))
+        self.ann.flush()
+        if len(missing):
+            logger.info("Assigned %d rows missing from the ANN index of %s", len(missing), self.directory)
+
+    # Files
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_header(self) -> Dict:
+        try:
+            with open(self._path(self.HEADER), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_header(self) -> None:
+        tmp_path = self._path(self.HEADER + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dimensions": self.dimensions, "dtype": self.dtype, "capacity": self.capacity}, f)
+        os.replace(tmp_path, self._path(self.HEADER))
+
+    @property
+    def _vector_file(self) -> str:
+        return self._path("vectors.f32" if self.dtype == "float32" else "vectors.i8")
+
+    def _map(self, capacity: int) -> None:
+        """Projette (en les agrandissant si besoin) les fichiers de vecteurs sur `capacity` lignes"""
+        if self._vectors is not None:
+            self._vectors.flush()
+        self.capacity = capacity
+        files = [(self._vector_file, np.dtype(self.dtype), (capacity, self.dimensions))]
+        if self.dtype == "int8":
+            files.append((self._path("scales.f32"), np.dtype(np.float32), (capacity,)))
+        mapped = []
+        for path, dtype, shape in files:
+            size = int(np.prod(shape)) * dtype.itemsize
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            mapped.append(np.memmap(path, dtype=dtype, mode="r+", shape=shape) if capacity else None)
+        self._vectors = mapped[0]
+        self._scales = mapped[1] if len(mapped) > 1 else None
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive[:capacity]
+        self._alive = alive
+
+    def _ensure_capacity(self, rows: int) -> None:
+        if rows <= self.capacity:
+            return
+        capacity = max(self.capacity, 1024)
+        while capacity < rows:
+            capacity *= 2
+        self._map(capacity)
+        self._write_header()
+
+    def _replay(self) -> None:
+        """Reconstruit l'état des lignes à partir du journal"""
+        try:
+            f = open(self._path(self.LOG), "r+b")
+        except FileNotFoundError:
+            return
+        with f:
+            end = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                end += len(line)
+                self._log_records += 1
+                if record["op"] == "put":
+                    self._set_row(record["row"], record["id"], record["text"], record["metadata"])
+                else:
+                    self._clear_row(record["id"])
+            if f.seek(0, os.SEEK_END) > end:
+                # Partial write of an interrupted batch: drop it before new records are appended
+                logger.warning("Dropping an incomplete record at the end of %s", self._path(self.LOG))
+                f.truncate(end)
+        self._free = [row for row in range(len(self._ids)) if self._ids[row] is None]
+        # The log only grows: rewrite it when most of it is obsolete
+        if self._log_records > 2 * len(self._rows) + 1000:
+            self._compact()
+
+    def _compact(self) -> None:
+        tmp_path = self._path(self.LOG + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for chunk_id, row in self._rows.items():
+                f.write(self._put_line(row))
+        os.replace(tmp_path, self._path(self.LOG))
+        self._log_records = len(self._rows)
+
+    def _put_line(self, row: int) -> str:
+        return json.dumps({
+            "op": "put",
+            "row": row,
+            "id": self._ids[row],
+            "text": self._documents[row],
+            "metadata": self._metadatas[row],
+        }, ensure_ascii=False) + "\n"
+
+    def _append_log(self, lines: List[str]) -> None:
+        with open(self._path(self.LOG), "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+        self._log_records += len(lines)
+
+    # Rows
+
+    def _set_row(self, row: int, chunk_id: str, text: str, metadata: Dict) -> None:
+        while len(self._ids) <= row:
+            self._ids.append(None)
+            self._documents.append(None)
+            self._metadatas.append(None)
+        previous = self._rows.get(chunk_id)
+        if previous is not None and previous != row:
+            self._clear_row(chunk_id)
+        if self._ids[row] is not None and self._ids[row] != chunk_id:
+            self._rows.pop(self._ids[row], None)
+        self._text_bytes += len(text) - len(self._documents[row] or "")
+        self._ids[row] = chunk_id
+        self._documents[row] = text
+        self._metadatas[row] = metadata
+        self._rows[chunk_id] = row
+        if row < self.capacity:
+            self._alive[row] = True
+
+    def _clear_row(self, chunk_id: str) -> Optional[int]:
+        row = self._rows.pop(chunk_id, None)
+        if row is None:
+            return None
+        self._text_bytes -= len(self._documents[row] or "")
+        self._ids[row] = None
+        self._documents[row] = None
+        self._metadatas[row] = None
+        if row < self.capacity:
+            self._alive[row] = False
+        return row
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "float32":
+            return vectors, None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    # VectorBackend
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        if not ids:
+            return
+        # An id repeated within the batch keeps its last occurrence (one row per id)
+        last = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = list(last.values())
+            ids = list(last)
+            embeddings = [embeddings[i] for i in keep]
+            documents = [documents[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+                self._write_header()
+            elif vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != {self.dimensions}")
+            # An index built by another process must see the new rows
+            self._refresh_ann()
+
+            rows = []
+            next_row = len(self._ids)
+            for chunk_id in ids:
+                row = self._rows.get(chunk_id)
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        row = next_row
+                        next_row += 1
+                rows.append(row)
+            self._ensure_capacity(next_row)
+
+            encoded, scales = self._encode(vectors)
+            self._vectors[rows] = encoded
+            if scales is not None:
+                self._scales[rows] = scales
+            # Vectors reach the disk before the log makes the rows visible after a restart
+            self._vectors.flush()
+            if self._scales is not None:
+                self._scales.flush()
+
+            if self.ann is not None:
+                self.ann.add(np.asarray(rows), vectors)
+                self.ann.flush()
+            for row, chunk_id, text, metadata in zip(rows, ids, documents, metadatas):
+                self._set_row(row, chunk_id, text, metadata or {})
+            self._append_log([self._put_line(row) for row in rows])
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            lines = []
+            for chunk_id in ids:
+                row = self._clear_row(chunk_id)
+                if row is not None:
+                    self._free.append(row)
+                    lines.append(json.dumps({"op": "del", "id": chunk_id}) + "\n")
+            if lines:
+                self._append_log(lines)
+
+    def existing_ids(self, ids: List[str]) -> set:
+        with self._lock:
+            return {chunk_id for chunk_id in ids if chunk_id in self._rows}
+
+    def _record(self, row: int) -> VectorRecord:
+        return {"id": self._ids[row], "text": self._documents[row], "metadata": self._metadatas[row] or {}}
+
+    def _vector(self, row: int) -> np.ndarray:
+        vector = np.asarray(self._vectors[row], dtype=np.float32)
+        return vector * self._scales[row] if self._scales is not None else vector
+
+    def get(self, ids: List[str], include_embeddings: bool = False) -> List[VectorRecord]:
+        with self._lock:
+            records = []
+            for chunk_id in ids:
+                row = self._rows.get(chunk_id)
+                if row is None:
+                    continue
+                record = self._record(row)
+                if include_embeddings:
+                    record["embedding"] = self._vector(row).tolist()
+                records.append(record)
+            return records
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], List[str]]]:
+        with self._lock:
+            items = [(chunk_id, self._documents[row]) for chunk_id, row in self._rows.items()]
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            yield [chunk_id for chunk_id, _ in batch], [text for _, text in batch]
+
+    def scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Cosinus entre les lignes (toutes, ou `rows` triées) et les requêtes
+        normalisées, shape (lignes, requêtes) ; lignes supprimées à -inf
+        """
+        with self._lock:
+            vectors, scales, alive = self._vectors, self._scales, self._alive
+            used = len(self._ids)
+        if rows is None:
+            rows = np.arange(used)
+        scores = np.empty((len(rows), len(queries)), dtype=np.float32)
+        for start in range(0, len(rows), self.BLOCK_ROWS):
+            block_rows = rows[start:start + self.BLOCK_ROWS]
+            if len(block_rows) and block_rows[-1] - block_rows[0] == len(block_rows) - 1:
+                # Contiguous rows: a view of the mapped file, no gather
+                block = vectors[block_rows[0]:block_rows[-1] + 1]
+            else:
+                block = vectors[block_rows]
+            block_scores = np.asarray(block, dtype=np.float32) @ queries.T
+            if scales is not None:
+                block_scores *= scales[block_rows][:, None]
+            scores[start:start + len(block_rows)] = block_scores
+        scores[~alive[rows]] = -np.inf
+        return scores
+
+    def top_k(self, queries: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> List[List[VectorRecord]]:
+        """Top-k par requête parmi `rows` (toutes les lignes par défaut)"""
+        if self.dimensions is None or not self._rows:
+            return [[] for _ in queries]
+        scores = self.scores(queries, rows)
+        if rows is None:
+            rows = np.arange(len(scores))
+        k = min(k, len(scores))
+        if k <= 0:
+            return [[] for _ in queries]
+        # Unordered top-k of each column, then sorted
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        results = []
+        with self._lock:
+            for column in range(len(queries)):
+                candidates = top[:, column]
+                candidates = candidates[np.argsort(-scores[candidates, column], kind="stable")]
+                records = []
+                for index in candidates:
+                    score = scores[index, column]
+                    row = rows[index]
+                    if score == -np.inf or self._ids[row] is None:
+                        continue
+                    records.append(dict(self._record(row), distance=max(float(2 - 2 * score), 0.0)))
+                results.append(records)
+        return results
+
+    def query(self, embeddings, k: int, nprobe: Optional[int] = None, **options: Any) -> List[List[VectorRecord]]:
+        """
+        Top-k de chaque embedding ; avec un index IVF, parmi les `nprobe`
+        listes les plus proches (par défaut ANN_NPROBE, 0 = recherche exacte)
+        """
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if nprobe is None:
+            nprobe = settings.ann_nprobe
+        with self._lock:
+            self._refresh_ann()
+            ann = self.ann
+        if ann is None or nprobe <= 0:
+            return self.top_k(queries, k)
+        return [
+            self.top_k(query[None], k, rows)[0]
+            for query, rows in zip(queries, ann.candidates(queries, nprobe))
+        ]
+
+    def iter_vectors(self, batch_size: int = 16384) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Lignes vivantes et leurs vecteurs (float32 normalisés), par blocs"""
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:len(self._ids)])
+        for start in range(0, len(rows), batch_size):
+            block_rows = rows[start:start + batch_size]
+            yield block_rows, self._read_vectors(block_rows)
+
+    def _read_vectors(self, rows: np.ndarray) -> np.ndarray:
+        block = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            block *= self._scales[rows][:, None]
+        return block
+
+    def build_ann_index(self, nlist: int, iterations: int = 20, sample_size: int = 100000) -> IVFIndex:
+        """Construit (ou reconstruit) l'index IVF à partir des vecteurs existants"""
+        with self._lock:
+            self.ann = IVFIndex.build(self.directory, self.iter_vectors(), nlist, iterations, sample_size)
+            self._ann_stamp = IVFIndex.stamp(self.directory)
+            return self.ann
+
+    def drop(self) -> None:
+        with self._lock:
+            self._vectors = None
+            self._scales = None
+            self.ann = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._load(self.dtype)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self.ann is not None:
+                self.ann.flush()
+            if self._vectors is not None:
+                self._vectors.flush()
+            if self._scales is not None:
+                self._scales.flush()
+
+    def memory_bytes(self) -> int:
+        # Texts and metadata are held in memory; vectors are paged in from the file
+        return self._text_bytes + 300 * len(self._rows) + self.capacity
+
+
+class NumpyStorage:
+    """Un dossier `vectors` par collection, dans le dossier de la collection"""
+    def __init__(self, persist_dir: str, dtype: str = "float32"):
+        self.persist_dir = persist_dir
+        self.dtype = dtype
+
+    def _vectors_dir(self, directory: str) -> str:
+        return os.path.join(directory, "vectors")
+
+    def list_collections(self) -> set:
+        names = set()
+        collections_dir = os.path.join(self.persist_dir, "collections")
+        candidates = [DEFAULT_COLLECTION]
+        if os.path.isdir(collections_dir):
+            candidates += os.listdir(collections_dir)
+        for name in candidates:
+            directory = self._vectors_dir(collection_directory(self.persist_dir, name))
+            if os.path.exists(os.path.join(directory, NumpyVectors.LOG)):
+                names.add(name)
+        return names
+
+    def open(self, name: str, directory: str) -> VectorBackend:
+        return NumpyVectors(self._vectors_dir(directory), self.dtype)
+
+
+VECTOR_BACKENDS: Dict[str, Callable[[str], Any]] = {
+    "chroma": lambda persist_dir: ChromaStorage(persist_dir, settings.vector_memory_limit_bytes),
+    "numpy": lambda persist_dir: NumpyStorage(persist_dir, settings.vector_dtype),
+}
+
+
+def build_vector_storage(persist_dir: str, backend: Optional[str] = None):
+    """Stockage des vecteurs choisi par `backend` (par défaut VECTOR_BACKEND)"""
+    backend = backend or settings.vector_backend
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend: {backend} (available: {', '.join(VECTOR_BACKENDS)})")
+    return VECTOR_BACKENDS[backend](persist_dir)
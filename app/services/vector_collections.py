@@ -0,0 +1,216 @@
+# services/vector_collections.py
+"""
+Collections nommées (par tenant ou par ensemble de documents), ouvertes à la
+demande et gardées dans un LRU borné
+"""
+import os
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.core.log import get_logger
+from app.services.bm25_index import BM25Index
+from app.services.document_manifest import ManifestStore
+from app.services.nutrient_facts import NutrientFactStore
+from app.services.vector_backends import DEFAULT_COLLECTION, VectorBackend, collection_directory
+
+logger = get_logger(__name__)
+
+COLLECTION_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9](?:[a-zA-Z0-9_-]{0,46}[a-zA-Z0-9])?$")
+
+
+def validate_collection_name(name: str) -> str:
+    """Vérifie un nom de collection (lettres, chiffres, "_" et "-", 48 caractères au plus)"""
+    if not COLLECTION_NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid collection name: {name!r}")
+    return name
+
+
+class SharedLock:
+    """
+    Verrou partagé entre les écritures d'une collection (indexations et
+    suppressions de documents, en parallèle) et exclusif pour la vider
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive)
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._shared -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive)
+            # New writers wait from now on, running ones finish first
+            self._exclusive = True
+            self._condition.wait_for(lambda: self._shared == 0)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
+
+
+class VectorCollection:
+    """
+    État d'une collection ouverte : vecteurs (backend de VECTOR_BACKEND), index
+    BM25, manifestes des documents et tables nutritionnelles extraites. La collection par défaut garde les
+    emplacements historiques (racine du dossier de persistance) ; les autres
+    ont leur sous-dossier.
+    """
+    def __init__(self,
+                 name: str,
+                 open_backend: Callable[[str, str], VectorBackend],
+                 persist_dir: str,
+                 exists: bool):
+        self.name = name
+        self._open_backend = open_backend
+        self.directory = collection_directory(persist_dir, name)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.bm25_index = BM25Index(os.path.join(self.directory, "bm25_index.json"))
+        self.manifests = ManifestStore(os.path.join(self.directory, "manifests"))
+        self.nutrients = NutrientFactStore(os.path.join(self.directory, "nutrient_facts.sqlite3"))
+        self.document_locks = defaultdict(threading.Lock)
+        # Shared by document writes, exclusive to clear the collection
+        self.write_lock = SharedLock()
+        self._store_lock = threading.Lock()
+        # Number of operations currently using the collection (not evictable while > 0)
+        self.users = 0
+
+        self.vectors: Optional[VectorBackend] = self._open_backend(name, self.directory) if exists else None
+        if self.vectors is not None and not len(self.bm25_index):
+            self._rebuild_bm25_index()
+
+    def get_or_create_vectors(self) -> VectorBackend:
+        """Open the vector backend, creating the collection on first ingestion"""
+        # Concurrent ingestions must not both create the collection
+        with self._store_lock:
+            if self.vectors is None:
+                self.vectors = self._open_backend(self.name, self.directory)
+            return self.vectors
+
+    def drop_vectors(self) -> None:
+        with self._store_lock:
+            if self.vectors is not None:
+                self.vectors.drop()
+                self.vectors = None
+
+    def _rebuild_bm25_index(self, batch_size: int = 1000) -> None:
+        """Construit l'index BM25 d'une collection indexée avant son introduction"""
+        for ids, documents in self.vectors.iter_documents(batch_size):
+            self.bm25_index.add(ids, documents)
+        self.bm25_index.save()
+
+    def memory_bytes(self) -> int:
+        # Chroma's HNSW index is held under its own memory limit
+        vectors = self.vectors.memory_bytes() if self.vectors is not None else 0
+        return self.bm25_index.memory_bytes() + vectors
+
+    def close(self) -> None:
+        self.bm25_index.save()
+        if self.vectors is not None:
+            self.vectors.flush()
+
+
+class CollectionPool:
+    """
+    LRU des collections ouvertes, borné en nombre et en mémoire estimée.
+
+    Une collection est ouverte à sa première utilisation ; les moins récemment
+    utilisées sont fermées au-delà des limites, sauf si une opération est en cours.
+    """
+    def __init__(self,
+                 opener: Callable[[str], VectorCollection],
+                 max_open: int = 16,
+                 max_bytes: int = 256 * 1024 * 1024):
+        self._opener = opener
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self._open: "OrderedDict[str, VectorCollection]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._opening: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self.evictions = 0
+
+    def acquire(self, name: str) -> VectorCollection:
+        """Collection ouverte (à rendre avec `release`) ; l'ouvre si nécessaire (bloquant)"""
+        with self._opening[name]:
+            with self._lock:
+                collection = self._open.get(name)
+                if collection is not None:
+                    self._open.move_to_end(name)
+                    collection.users += 1
+                    return collection
+            # Opening reads the BM25 index and manifests from disk: outside the pool lock
+            collection = self._opener(name)
+            with self._lock:
+                self._open[name] = collection
+                collection.users += 1
+                evicted = self._evict()
+        self._close(evicted)
+        return collection
+
+    def release(self, collection: VectorCollection) -> None:
+        with self._lock:
+            collection.users -= 1
+            evicted = self._evict()
+        self._close(evicted)
+
+    def discard(self, name: str) -> None:
+        """Oublie une collection supprimée"""
+        with self._lock:
+            self._open.pop(name, None)
+
+    def _evict(self) -> List[VectorCollection]:
+        """Retire du LRU les collections à fermer (sous le verrou du pool)"""
+        evicted = []
+        total = sum(c.memory_bytes() for c in self._open.values())
+        for name in list(self._open):
+            if len(self._open) <= self.max_open and total <= self.max_bytes:
+                break
+            collection = self._open[name]
+            # Held until it is closed: an acquire of the same name waits to reopen it from disk
+            if collection.users > 0 or not self._opening[name].acquire(blocking=False):
+                continue
+            del self._open[name]
+            total -= collection.memory_bytes()
+            evicted.append(collection)
+            self.evictions += 1
+        return evicted
+
+    def _close(self, evicted: List[VectorCollection]) -> None:
+        """Persiste et ferme les collections retirées, hors du verrou du pool"""
+        for collection in evicted:
+            try:
+                collection.close()
+            finally:
+                self._opening[collection.name].release()
+            logger.info("Collection %s closed (least recently used)", collection.name)
+
+    def open_names(self) -> List[str]:
+        with self._lock:
+            return list(self._open)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "open": len(self._open),
+                "max_open": self.max_open,
+                "memory_bytes": sum(c.memory_bytes() for c in self._open.values()),
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,406 @@
+"""
+Banc d'essai de bout en bout : chat, recherche et ingestion
+
+L'application FastAPI est servie par uvicorn dans le processus, avec le LLM
+simulé, des embeddings par hachage et MongoDB remplacé par un service en
+mémoire : aucun appel réseau externe, résultats reproductibles.
+
+Mesures :
+- ingestion d'un PDF par l'endpoint d'upload : pages/s, chunks/s, pic de RSS ;
+- chat SSE avec N sessions concurrentes : temps jusqu'au premier token,
+  tokens/s, latence totale (p50/p95/p99), débit en requêtes/s ;
+- recherche (similarity_search et retrieve) : requêtes/s et latences selon
+  la taille du corpus.
+
+Les résultats sont écrits en JSON (avec le commit courant) pour comparer les versions.
+
+Usage :
+    python -m benchmarks.e2e --sessions 20 --questions 5 --pages 100 \\
+        --corpus-sizes 1000 5000 20000 --output benchmarks/results/latest.json
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("EMBEDDING_PROVIDER", "hash")
+os.environ.setdefault("SESSION_STORE_BACKEND", "memory")
+# All simulated users share one client address
+os.environ.setdefault("RATE_LIMIT_SESSION_PER_MINUTE", "0")
+os.environ.setdefault("RATE_LIMIT_CLIENT_PER_MINUTE", "0")
+
+import httpx
+import uvicorn
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.core.resources import Resources
+from app.main import create_app
+from app.services.admission import build_admission_controller
+from app.services.ingestion_jobs import InMemoryJobStore, IngestionQueue
+from app.services.llm_service import LLMService
+from app.services.memory import build_session_store
+from app.services.rag_service import RAGService
+from app.services.vector_collections import DEFAULT_COLLECTION
+from benchmarks.stand_ins import InMemoryMongoService
+from benchmarks.upload_latency import make_pdf
+
+VOCABULARY = (
+    "protéines lipides glucides fibres calcium fer magnésium potassium sodium zinc "
+    "vitamine_a vitamine_b12 vitamine_c vitamine_d lentilles pois_chiches riz pâtes pain "
+    "lait yaourt fromage oeuf poulet boeuf saumon thon pomme banane orange épinards brocoli "
+    "carotte amandes noix huile_olive beurre sucre sel énergie kcal grammes portion apport "
+    "recommandé journalier adulte enfant sportif grossesse"
+).split()
+
+
+class BenchmarkResources(Resources):
+    """Ressources de l'application avec des services locaux (MongoDB en mémoire)"""
+    def __init__(self, data_dir: str, mongo_latency: float = 0.0):
+        super().__init__()
+        self.data_dir = data_dir
+        self.mongo_latency = mongo_latency
+
+    async def startup(self) -> None:
+        self.mongo_service = InMemoryMongoService(self.mongo_latency)
+        self.rag_service = RAGService(persist_dir=os.path.join(self.data_dir, "vectorstore"))
+        self.llm_service = LLMService(
+            self.mongo_service,
+            self.rag_service,
+            session_store=build_session_store(self.mongo_service)
+        )
+        self.admission = build_admission_controller()
+        self.ingestion_queue = IngestionQueue(
+            self.rag_service,
+            InMemoryJobStore(),
+            workers=settings.ingestion_workers,
+            upload_dir=os.path.join(self.data_dir, "uploads")
+        )
+        await self.warm_up()
+        await self.ingestion_queue.start()
+
+
+def _statm_mb(pid: str) -> float:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def _descendants(pid: int) -> List[int]:
+    """Processus descendants de `pid`, d'après /proc"""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces: the parent pid is the 2nd field after it
+        children.setdefault(int(stat.rsplit(")", 1)[1].split()[1]), []).append(int(entry))
+    found, pending = [], [pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+class PeakRSS:
+    """
+    Échantillonne la mémoire résidente du processus et de ses descendants
+    (processus d'extraction des PDF) et garde le maximum. Les pages partagées
+    entre processus sont comptées dans chacun.
+    """
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.start_mb = self.current_mb()
+        self.peak_mb = self.start_mb
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def current_mb() -> float:
+        try:
+            total = _statm_mb("self")
+        except OSError:
+            # No /proc (macOS): peaks since process start, in bytes on macOS; only the
+            # children already waited for are counted
+            return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                    + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 2 ** 20
+        for pid in _descendants(os.getpid()):
+            try:
+                total += _statm_mb(str(pid))
+            except OSError:
+                # Exited since the scan
+                pass
+        return total
+
+    async def _sample(self) -> None:
+        while True:
+            self.peak_mb = max(self.peak_mb, self.current_mb())
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self) -> "PeakRSS":
+        self._task = asyncio.create_task(self._sample())
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._task.cancel()
+        self.peak_mb = max(self.peak_mb, self.current_mb())
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 et moyenne, en millisecondes"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000
+
+    return {
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "mean_ms": statistics.fmean(values) * 1000,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@asynccontextmanager
+async def serve(app) -> AsyncIterator[str]:
+    """Lance l'application avec uvicorn dans la boucle courante"""
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+            raise RuntimeError("Server failed to start")
+        await asyncio.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def bench_ingestion(client: httpx.AsyncClient, pages: int) -> Dict:
+    """Upload d'un PDF généré puis attente de la fin de l'indexation"""
+    pdf = make_pdf(pages)
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        response = await client.post(
+            "/chat/documents/upload_pdf",
+            files={"file": ("benchmark.pdf", pdf, "application/pdf")}
+        )
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        while True:
+            job = (await client.get(f"/chat/documents/jobs/{job_id}")).json()
+            if job["status"] in ("done", "failed"):
+                break
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - start
+    if job["status"] == "failed":
+        raise RuntimeError(f"Ingestion failed: {job.get('error')}")
+    return {
+        "pages": pages,
+        "pdf_bytes": len(pdf),
+        "seconds": elapsed,
+        "pages_per_second": pages / elapsed,
+        "chunks": job["chunks_total"],
+        "chunks_per_second": job["chunks_per_second"],
+        "rss_start_mb": rss.start_mb,
+        "rss_peak_mb": rss.peak_mb,
+    }
+
+
+async def chat_request(client: httpx.AsyncClient, session_id: str, question: str) -> Dict:
+    """Une question en SSE : temps jusqu'au premier token, durée et nombre de tokens"""
+    start = time.perf_counter()
+    first_token = None
+    tokens = 0
+    buffer = ""
+    async with client.stream("POST", "/chat/chat/rag", json={"message": question, "session_id": session_id}) as response:
+        response.raise_for_status()
+        async for text in response.aiter_text():
+            buffer += text
+            while "\n\n" in buffer:
+                frame, buffer = buffer.split("\n\n", 1)
+                lines = dict(line.split(": ", 1) for line in frame.split("\n") if ": " in line)
+                if lines.get("event") == "error":
+                    raise RuntimeError(json.loads(lines["data"])["message"])
+                if lines.get("event") == "token":
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    tokens += len(json.loads(lines["data"])["text"].split())
+    total = time.perf_counter() - start
+    return {"ttft": first_token or total, "total": total, "tokens": tokens}
+
+
+async def bench_chat(client: httpx.AsyncClient, sessions: int, questions: int) -> Dict:
+    """`sessions` conversations concurrentes de `questions` questions chacune"""
+    results: List[Dict] = []
+
+    async def conversation(i: int) -> None:
+        for j in range(questions):
+            # Distinct questions: every answer is generated, none comes from the cache
+            topic = " ".join(random.Random(i * 1000 + j).sample(VOCABULARY, 3))
+            results.append(await chat_request(client, f"bench-{i}", f"Quel est l'apport en {topic} ? ({i}.{j})"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    rates = [r["tokens"] / (r["total"] - r["ttft"]) for r in results if r["total"] > r["ttft"]]
+    return {
+        "sessions": sessions,
+        "requests": len(results),
+        "requests_per_second": len(results) / elapsed,
+        "ttft": latency_summary([r["ttft"] for r in results]),
+        "latency": latency_summary([r["total"] for r in results]),
+        "tokens_per_second_per_stream": statistics.fmean(rates) if rates else 0.0,
+        "tokens_per_second_total": sum(r["tokens"] for r in results) / elapsed,
+    }
+
+
+def synthetic_chunks(count: int, seed: int = 0) -> List[Document]:
+    rng = random.Random(seed)
+    return [
+        Document(
+            page_content=" ".join(rng.choices(VOCABULARY, k=120)),
+            metadata={"page": i // 4, "document_id": "synthetic"},
+            id=f"synthetic-{i}"
+        )
+        for i in range(count)
+    ]
+
+
+async def measure_queries(search: Callable[[str], Awaitable[List[dict]]],
+                          queries: int,
+                          concurrency: int) -> Dict:
+    rng = random.Random(queries)
+    pending = [" ".join(rng.sample(VOCABULARY, 4)) + f" {i}" for i in range(queries)]
+    latencies: List[float] = []
+
+    async def worker() -> None:
+        while pending:
+            query = pending.pop()
+            start = time.perf_counter()
+            await search(query)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"qps": queries / elapsed, "latency": latency_summary(latencies)}
+
+
+async def bench_retrieval(corpus_sizes: List[int], queries: int, concurrency: int) -> List[Dict]:
+    """Débit de recherche pour chaque taille de corpus (chunks synthétiques)"""
+    results = []
+    for size in corpus_sizes:
+        with tempfile.TemporaryDirectory() as persist_dir:
+            rag = RAGService(persist_dir=persist_dir)
+            try:
+                start = time.perf_counter()
+                with rag._using(DEFAULT_COLLECTION) as collection:
+                    await rag._run_blocking(
+                        rag.ingestion_pipeline.run,
+                        synthetic_chunks(size),
+                        functools.partial(rag._write_batch, collection),
+                        lambda *_: None
+                    )
+                    collection.bm25_index.save()
+                indexing_seconds = time.perf_counter() - start
+                results.append({
+                    "chunks": size,
+                    "indexing_seconds": indexing_seconds,
+                    "similarity_search": await measure_queries(rag.similarity_search, queries, concurrency),
+                    "retrieve": await measure_queries(rag.retrieve, queries, concurrency),
+                })
+            finally:
+                rag.close()
+        print(f"Retrieval benchmark done for {size} chunks")
+    return results
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args: argparse.Namespace) -> Dict:
+    report = {
+        "commit": current_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "llm_provider": settings.llm_provider,
+            "embedding_provider": settings.embedding_provider,
+            "retrieval_mode": settings.retrieval_mode,
+            "fake_llm_tokens_per_second": settings.fake_llm_tokens_per_second,
+            "fake_llm_first_token_latency": settings.fake_llm_first_token_latency,
+            "fake_llm_response_tokens": settings.fake_llm_response_tokens,
+            "mongo_latency_ms": args.mongo_ms,
+        },
+    }
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        app = create_app(lambda: BenchmarkResources(data_dir, args.mongo_ms / 1000))
+        async with serve(app) as base_url:
+            limits = httpx.Limits(max_connections=args.sessions + 10)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+                report["ingestion"] = await bench_ingestion(client, args.pages)
+                print(f"Ingestion: {report['ingestion']['pages_per_second']:.1f} pages/s")
+                report["chat"] = await bench_chat(client, args.sessions, args.questions)
+                print(f"Chat: p50 TTFT {report['chat']['ttft']['p50_ms']:.0f} ms")
+
+    report["retrieval"] = await bench_retrieval(args.corpus_sizes, args.queries, args.concurrency)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="sessions de chat concurrentes")
+    parser.add_argument("--questions", type=int, default=5, help="questions par session")
+    parser.add_argument("--pages", type=int, default=100, help="pages du PDF ingéré")
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--queries", type=int, default=500, help="requêtes par taille de corpus")
+    parser.add_argument("--concurrency", type=int, default=8, help="recherches concurrentes")
+    parser.add_argument("--mongo-ms", type=float, default=2.0, help="latence simulée de MongoDB")
+    parser.add_argument("--output", default=None, help="fichier JSON (par défaut benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"{(report['commit'] or 'unknown')[:12]}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
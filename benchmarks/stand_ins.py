@@ -0,0 +1,138 @@
+"""
+Services locaux remplaçant MongoDB pour les benchmarks (aucun serveur requis)
+"""
+import asyncio
+import copy
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.models.conversation import Message
+from app.services.mongo_service import decode_cursor, encode_cursor, session_title
+
+
+class InMemoryMongoService:
+    """
+    Même interface que MongoService, conversations gardées en mémoire.
+    `latency` simule la durée d'un aller-retour vers le serveur (en secondes).
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.conversations: Dict[str, Dict] = {}
+
+    async def _round_trip(self) -> None:
+        await asyncio.sleep(self.latency)
+
+    def _conversation(self, session_id: str) -> Dict:
+        now = datetime.utcnow()
+        conversation = self.conversations.setdefault(session_id, {
+            "session_id": session_id,
+            "messages": [],
+            "message_count": 0,
+            "created_at": now,
+        })
+        conversation["updated_at"] = now
+        return conversation
+
+    @staticmethod
+    def _page(messages: List[Dict], start: int, message_count: int) -> Dict:
+        return {
+            "items": copy.deepcopy(messages),
+            "next_cursor": encode_cursor({"b": start}) if start > 0 else None,
+            "message_count": message_count,
+        }
+
+    async def ping(self) -> None:
+        await self._round_trip()
+
+    async def ensure_indexes(self) -> None:
+        await self._round_trip()
+
+    async def save_message(self, session_id: str, role: str, content: str) -> bool:
+        await self._round_trip()
+        conversation = self._conversation(session_id)
+        conversation["messages"].append(Message(role=role, content=content).model_dump())
+        conversation["message_count"] += 1
+        if role == "user" and not conversation.get("title"):
+            conversation["title"] = session_title(content)
+        return True
+
+    async def append_message_and_get_history(self, session_id: str, role: str, content: str, limit: int) -> Dict:
+        await self.save_message(session_id, role, content)
+        conversation = self.conversations[session_id]
+        return {
+            "messages": copy.deepcopy(conversation["messages"][-limit:]),
+            "message_count": conversation["message_count"],
+            "summary": conversation.get("summary"),
+            "summarized_count": conversation.get("summarized_count", 0),
+            "title": conversation.get("title"),
+        }
+
+    async def get_messages_range(self, session_id: str, skip: int, limit: int) -> List[Dict]:
+        await self._round_trip()
+        conversation = self.conversations.get(session_id)
+        return copy.deepcopy(conversation["messages"][skip:skip + limit]) if conversation and limit > 0 else []
+
+    async def update_summary(self, session_id: str, summary: str,
+                             previous_count: int, summarized_count: int) -> bool:
+        await self._round_trip()
+        conversation = self.conversations.get(session_id)
+        if not conversation or conversation.get("summarized_count", 0) != previous_count:
+            return False
+        conversation["summary"] = summary
+        conversation["summarized_count"] = summarized_count
+        return True
+
+    async def get_conversation_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict]:
+        await self._round_trip()
+        conversation = self.conversations.get(session_id)
+        if not conversation:
+            return []
+        messages = conversation["messages"] if limit is None else conversation["messages"][-limit:]
+        return copy.deepcopy(messages)
+
+    async def get_history_page(self, session_id: str, limit: int, cursor: Optional[str] = None) -> Dict:
+        await self._round_trip()
+        conversation = self.conversations.get(session_id)
+        if not conversation:
+            return {"items": [], "next_cursor": None, "message_count": 0}
+        messages = conversation["messages"]
+        end = len(messages) if cursor is None else decode_cursor(cursor)["b"]
+        start = max(end - limit, 0)
+        return self._page(messages[start:end], start, conversation["message_count"])
+
+    async def delete_conversation(self, session_id: str) -> bool:
+        await self._round_trip()
+        return self.conversations.pop(session_id, None) is not None
+
+    async def list_sessions(self, limit: int, cursor: Optional[str] = None) -> Dict:
+        await self._round_trip()
+        ordered = sorted(
+            self.conversations.values(),
+            key=lambda c: (c["updated_at"], c["session_id"]),
+            reverse=True
+        )
+        if cursor is not None:
+            position = decode_cursor(cursor)
+            last = (datetime.fromisoformat(position["u"]), position["i"])
+            ordered = [c for c in ordered if (c["updated_at"], c["session_id"]) < last]
+        page = ordered[:limit]
+        next_cursor = None
+        if len(ordered) > limit:
+            next_cursor = encode_cursor({"u": page[-1]["updated_at"].isoformat(), "i": page[-1]["session_id"]})
+        fields = ("session_id", "title", "message_count", "created_at", "updated_at")
+        return {"items": [{f: c.get(f) for f in fields} for c in page], "next_cursor": next_cursor}
+
+    async def create_empty_session(self, session_id: str) -> bool:
+        await self._round_trip()
+        created = session_id not in self.conversations
+        self._conversation(session_id)
+        return created
+
+    async def rename_session(self, old_session_id: str, new_session_id: str) -> bool:
+        await self._round_trip()
+        conversation = self.conversations.pop(old_session_id, None)
+        if conversation is None:
+            return False
+        conversation["session_id"] = new_session_id
+        self.conversations[new_session_id] = conversation
+        return True
@@ -0,0 +1,122 @@
+"""
+Mesure du temps jusqu'au premier token (TTFT) de `LLMService.stream_response`
+
+MongoDB, la recherche et le LLM sont remplacés par des services simulés avec des
+latences fixes : le TTFT mesuré est comparé à celui d'un enchaînement séquentiel
+des mêmes étapes (écriture + lecture de l'historique, recherche, premier token).
+Le LLM est le fournisseur simulé de app/services/providers.py.
+
+Usage :
+    python -m benchmarks.ttft_overlap --mongo-ms 40 --retrieval-ms 120 --llm-ms 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+# Every request must reach the LLM: no semantic response-cache matches
+os.environ["RESPONSE_CACHE_SEMANTIC_THRESHOLD"] = "0"
+
+from app.services.embedding_cache import EmbeddingCache
+from app.services.llm_service import LLMService
+from app.services.providers import FakeStreamingChatModel, HashEmbeddings
+from benchmarks.stand_ins import InMemoryMongoService
+
+
+class StubRAGService:
+    """Recherche simulée renvoyant des chunks fixes"""
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.embedding_cache = EmbeddingCache(max_size=16, ttl=60)
+        self.embeddings = HashEmbeddings(dimensions=64)
+
+    def has_documents(self, collections: Optional[List[str]] = None) -> bool:
+        return True
+
+    def collection_versions(self, collections: Optional[List[str]] = None) -> Dict[str, int]:
+        return {name: 0 for name in collections or ["default"]}
+
+    async def answer_card(self, question: str, collections: Optional[List[str]] = None) -> Optional[dict]:
+        return None
+
+    async def retrieve(self, query: str, k: Optional[int] = None,
+                       collections: Optional[List[str]] = None,
+                       nprobe: Optional[int] = None) -> List[dict]:
+        await asyncio.sleep(self.latency)
+        return [
+            {"id": f"chunk-{i}", "text": f"Extrait {i} sur les protéines végétales.", "metadata": {"page": i}}
+            for i in range(4)
+        ]
+
+    async def embed_query(self, query: str) -> List[float]:
+        return self.embeddings.embed_query(query)
+
+
+async def sequential_ttft(mongo: InMemoryMongoService, rag: StubRAGService, llm: FakeStreamingChatModel,
+                          session_id: str, question: str) -> float:
+    """Enchaînement séquentiel des mêmes étapes, sans recouvrement"""
+    start = time.perf_counter()
+    await mongo.append_message_and_get_history(session_id, "user", question, limit=21)
+    await rag.retrieve(question)
+    async for _ in llm.astream(question):
+        return time.perf_counter() - start
+    return time.perf_counter() - start
+
+
+async def overlapped_ttft(service: LLMService, session_id: str, question: str) -> Tuple[float, float]:
+    """TTFT et durée totale de `stream_response`"""
+    start = time.perf_counter()
+    first = None
+    async for _ in service.stream_response(question, session_id):
+        if first is None:
+            first = time.perf_counter() - start
+    return first or 0.0, time.perf_counter() - start
+
+
+def summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": statistics.median(values) * 1000,
+        "mean_ms": statistics.fmean(values) * 1000,
+    }
+
+
+async def main(mongo_ms: float, retrieval_ms: float, llm_ms: float, requests: int) -> dict:
+    mongo = InMemoryMongoService(mongo_ms / 1000)
+    rag = StubRAGService(retrieval_ms / 1000)
+    llm = FakeStreamingChatModel(first_token_latency=llm_ms / 1000, tokens_per_second=200, response_tokens=20)
+
+    service = LLMService(mongo, rag)
+    service.llm = llm
+
+    sequential, overlapped, total = [], [], []
+    for i in range(requests):
+        # Distinct questions and sessions, semantic matching disabled: no response cache hits
+        question = f"Combien de protéines dans {i} portions de lentilles ?"
+        sequential.append(await sequential_ttft(mongo, rag, llm, f"seq-{i}", question))
+        ttft, elapsed = await overlapped_ttft(service, f"ovl-{i}", question)
+        overlapped.append(ttft)
+        total.append(elapsed)
+    await service.close()
+
+    return {
+        "requests": requests,
+        "stage_latency_ms": {"mongo": mongo_ms, "retrieval": retrieval_ms, "llm_first_token": llm_ms},
+        "sequential_ttft": summary(sequential),
+        "overlapped_ttft": summary(overlapped),
+        "overlapped_total": summary(total),
+        "ttft_saved_ms": (statistics.median(sequential) - statistics.median(overlapped)) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mongo-ms", type=float, default=40)
+    parser.add_argument("--retrieval-ms", type=float, default=120)
+    parser.add_argument("--llm-ms", type=float, default=300)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.mongo_ms, args.retrieval_ms, args.llm_ms, args.requests)), indent=2))
@@ -0,0 +1,116 @@
+"""
+Test de charge : latence des tokens de chats concurrents pendant un upload de PDF
+
+Lance N chats simulés (recherche + flux de tokens) avant puis pendant l'indexation
+d'un PDF volumineux, et compare le p99 de l'intervalle entre deux tokens.
+Les embeddings sont simulés (latence réseau fixe) : aucun appel OpenAI.
+
+Usage :
+    python -m benchmarks.upload_latency --pages 200 --chats 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import fitz
+from langchain_core.embeddings import Embeddings
+
+from app.services.rag_service import RAGService
+
+
+class SlowFakeEmbeddings(Embeddings):
+    """Embeddings déterministes avec une latence réseau simulée"""
+    def __init__(self, latency: float = 0.05, size: int = 64):
+        self.latency = latency
+        self.size = size
+
+    def _vector(self, text: str) -> List[float]:
+        return [((hash(text) >> i) & 0xFF) / 255.0 for i in range(self.size)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+def make_pdf(pages: int) -> bytes:
+    """Génère un PDF de test contenant du texte sur chaque page"""
+    doc = fitz.open()
+    line = "Les protéines, lipides et glucides apportent l'énergie de l'alimentation. "
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), f"Page {i + 1}. " + line * 40, fontsize=9)
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+async def simulated_chat(rag: RAGService, question: str, tokens: int, gaps: List[float]) -> None:
+    """Recherche puis flux de tokens ; enregistre le retard de chaque token"""
+    await rag.similarity_search(question)
+    interval = 0.005
+    last = time.perf_counter()
+    for _ in range(tokens):
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        gaps.append(now - last - interval)
+        last = now
+
+
+async def run_chats(rag: RAGService, chats: int, tokens: int) -> List[float]:
+    gaps: List[float] = []
+    await asyncio.gather(*(
+        simulated_chat(rag, f"question {i} sur les protéines", tokens, gaps)
+        for i in range(chats)
+    ))
+    return gaps
+
+
+def percentile(values: List[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[int(q) - 1] * 1000 if len(values) > 1 else 0.0
+
+
+async def main(pages: int, chats: int, tokens: int) -> dict:
+    with tempfile.TemporaryDirectory() as persist_dir:
+        rag = RAGService(persist_dir=persist_dir)
+        rag.embeddings = rag.ingestion_pipeline.embeddings = SlowFakeEmbeddings()
+        pdf = make_pdf(pages)
+
+        # Corpus initial pour que les recherches aient un vector store
+        await rag.load_and_index_pdf(make_pdf(2))
+
+        baseline = await run_chats(rag, chats, tokens)
+
+        upload = asyncio.create_task(rag.load_and_index_pdf(pdf))
+        await asyncio.sleep(0)
+        during_upload = await run_chats(rag, chats, tokens)
+        await upload
+
+    return {
+        "pages": pages,
+        "chats": chats,
+        "tokens_per_chat": tokens,
+        "baseline_p50_ms": percentile(baseline, 50),
+        "baseline_p99_ms": percentile(baseline, 99),
+        "upload_p50_ms": percentile(during_upload, 50),
+        "upload_p99_ms": percentile(during_upload, 99),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.pages, args.chats, args.tokens)), indent=2))
@@ -0,0 +1,158 @@
+"""
+Comparaison des backends de vecteurs : Chroma, NumPy float32 et NumPy int8
+
+Chaque backend est mesuré dans un processus séparé (RSS comparables) sur les
+mêmes embeddings aléatoires normalisés :
+- indexation (upserts par lots de 64) et réouverture de la collection ;
+- requêtes une par une : requêtes/s et latences p50/p95/p99 ;
+- requêtes par lots (`--batch-size`) : requêtes/s ;
+- recall@k par rapport à la recherche exacte ;
+- RSS après chargement et pic pendant les requêtes.
+
+Usage :
+    python -m benchmarks.vector_backends --chunks 20000 --dimensions 1536 --queries 1000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.vector_backends import ChromaStorage, NumpyStorage
+from benchmarks.e2e import PeakRSS, current_commit, latency_summary
+
+BACKENDS = {
+    "chroma": lambda persist_dir: ChromaStorage(persist_dir),
+    "numpy": lambda persist_dir: NumpyStorage(persist_dir, "float32"),
+    "numpy-int8": lambda persist_dir: NumpyStorage(persist_dir, "int8"),
+}
+
+
+def dataset(chunks: int, dimensions: int, queries: int, seed: int = 0):
+    """Embeddings normalisés et requêtes proches de chunks tirés au hasard"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(chunks, dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    targets = rng.integers(0, chunks, size=queries)
+    query_vectors = vectors[targets] + rng.normal(scale=0.05, size=(queries, dimensions)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors
+
+
+def peak_rss_mb() -> float:
+    """Pic de RSS du processus (en Ko sous Linux, en octets sous macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    scores = vectors @ queries.T
+    top = np.argpartition(-scores, k - 1, axis=0)[:k]
+    return [{f"c{row}" for row in top[:, column]} for column in range(len(queries))]
+
+
+def run_backend(name: str, args: argparse.Namespace) -> Dict:
+    vectors, queries = dataset(args.chunks, args.dimensions, args.queries)
+    ids = [f"c{i}" for i in range(args.chunks)]
+    result: Dict = {"backend": name}
+
+    with tempfile.TemporaryDirectory() as persist_dir:
+        directory = os.path.join(persist_dir, "default")
+        start = time.perf_counter()
+        backend = BACKENDS[name](persist_dir).open("default", directory)
+        for offset in range(0, args.chunks, 64):
+            batch = slice(offset, offset + 64)
+            backend.upsert(
+                ids[batch],
+                vectors[batch].tolist(),
+                [f"chunk {i}" for i in range(offset, min(offset + 64, args.chunks))],
+                [{"page": i % 300} for i in range(offset, min(offset + 64, args.chunks))]
+            )
+        backend.flush()
+        result["indexing_seconds"] = time.perf_counter() - start
+        del backend
+
+        start = time.perf_counter()
+        backend = BACKENDS[name](persist_dir).open("default", directory)
+        backend.query(queries[:1].tolist(), args.k)
+        result["open_seconds"] = time.perf_counter() - start
+        result["rss_after_load_mb"] = PeakRSS.current_mb()
+
+        latencies = []
+        found = []
+        start = time.perf_counter()
+        for query in queries:
+            query_start = time.perf_counter()
+            found.append(backend.query([query.tolist()], args.k)[0])
+            latencies.append(time.perf_counter() - query_start)
+        elapsed = time.perf_counter() - start
+        result["single"] = {"qps": len(queries) / elapsed, "latency": latency_summary(latencies)}
+
+        start = time.perf_counter()
+        for offset in range(0, len(queries), args.batch_size):
+            backend.query(queries[offset:offset + args.batch_size].tolist(), args.k)
+        result["batch"] = {
+            "batch_size": args.batch_size,
+            "qps": len(queries) / (time.perf_counter() - start),
+        }
+        # Includes the dataset itself, identical for every backend
+        result["rss_peak_mb"] = peak_rss_mb()
+
+    expected = exact_top_k(vectors, queries, args.k)
+    result[f"recall_at_{args.k}"] = float(np.mean([
+        len(expected[i] & {record["id"] for record in records}) / args.k
+        for i, records in enumerate(found)
+    ]))
+    return result
+
+
+def main(args: argparse.Namespace) -> Dict:
+    report = {
+        "commit": current_commit(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("run", "output")},
+        "backends": [],
+    }
+    for name in args.backends:
+        # A fresh process per backend: RSS is not shared between them
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.vector_backends", "--run", name]
+            + [f"--{key.replace('_', '-')}={value}" for key, value in vars(args).items()
+               if key in ("chunks", "dimensions", "queries", "batch_size", "k")],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        report["backends"].append(result)
+        print(f"{name}: {result['single']['qps']:.0f} queries/s, "
+              f"p50 {result['single']['latency']['p50_ms']:.2f} ms, "
+              f"RSS {result['rss_peak_mb']:.0f} MB")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--run", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_backend(args.run, args)))
+        sys.exit(0)
+
+    report = main(args)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
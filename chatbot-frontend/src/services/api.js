@@ -10,12 +10,13 @@ export const chatApi = {
   //   });
   //   return response.data;
   // },
-  sendMessage: async (message, sessionId, onChunkReceived) => {
+  sendMessage: async (message, sessionId, onChunkReceived, onSources, onQueued) => {
     try {
       const response = await fetch(`${API_URL}/chat/chat/rag`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Accept': 'text/event-stream',
         },
         body: JSON.stringify({
           message: message,
@@ -23,29 +24,66 @@ export const chatApi = {
         }),
       });
 
+      // Rate limited (429) or server busy (503): nothing was streamed
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        const retryAfter = response.headers.get('Retry-After');
+        const detail = body.detail || response.statusText;
+        onChunkReceived(`Error: ${detail}${retryAfter ? ` (retry in ${retryAfter}s)` : ''}`);
+        return;
+      }
+
       const reader = response.body.getReader();
       const decoder = new TextDecoder();
-      
+      let buffer = '';
+
+      // Server-Sent Events: frames are separated by a blank line
+      const handleFrame = (frame) => {
+        let event = 'message';
+        const dataLines = [];
+        for (const line of frame.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+        }
+        if (!dataLines.length) return;
+        const data = JSON.parse(dataLines.join('\n'));
+        if (event === 'token') onChunkReceived(data.text);
+        else if (event === 'sources' && onSources) onSources(data);
+        else if (event === 'queued' && onQueued) onQueued(data.position);
+        else if (event === 'error') onChunkReceived(`\n\nError: ${data.message}`);
+      };
+
       while (true) {
         const { done, value } = await reader.read();
         if (done) break;
-        const chunk = decoder.decode(value);
-        onChunkReceived(chunk);
+        buffer += decoder.decode(value, { stream: true });
+        let separator;
+        while ((separator = buffer.indexOf('\n\n')) !== -1) {
+          handleFrame(buffer.slice(0, separator));
+          buffer = buffer.slice(separator + 2);
+        }
       }
+      if (buffer.trim()) handleFrame(buffer);
     } catch (error) {
       console.error('Error sending message:', error);
       throw error;
     }
   },
 
-  getHistory: async (sessionId) => {
-    const response = await axios.get(`${API_URL}/chat/history/${sessionId}`);
-    return response.data;
+  // Latest messages of the session (the endpoint is paginated, newest page first)
+  getHistory: async (sessionId, limit = 200) => {
+    const response = await axios.get(`${API_URL}/chat/history/${sessionId}`, {
+      params: { limit }
+    });
+    return response.data.items;
   },
 
-  getAllSessions: async () => {
-    const response = await axios.get(`${API_URL}/chat/sessions`);
-    return response.data;
+  // Most recently active sessions: one page, so loading time does not grow with the number of sessions
+  getAllSessions: async (limit = 50) => {
+    const response = await axios.get(`${API_URL}/chat/sessions`, {
+      params: { limit }
+    });
+    return response.data.items.map((session) => session.session_id);
   },
 
   createSession: async () => {
@@ -69,6 +107,23 @@ export const chatApi = {
         'Content-Type': 'multipart/form-data'
       }
     });
+
+    // Indexing runs in the background: poll the job until it completes
+    const jobId = response.data.job_id;
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      const job = await chatApi.getIngestionJob(jobId);
+      if (job.status === 'done') return job;
+      if (job.status === 'failed') {
+        const error = new Error(job.error || 'Indexing failed');
+        error.response = { data: { detail: job.error || 'Indexing failed' } };
+        throw error;
+      }
+    }
+  },
+
+  getIngestionJob: async (jobId) => {
+    const response = await axios.get(`${API_URL}/chat/documents/jobs/${jobId}`);
     return response.data;
   }
  };
\ No newline at end of file